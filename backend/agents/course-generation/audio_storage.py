@@ -0,0 +1,179 @@
+"""
+Audio Storage
+=============
+Content-addressed storage for generated TTS audio. Files are keyed by a hash
+of the script and voice, so identical scripts are synthesised and stored once.
+The local filesystem backend is the default; other backends (e.g. an object
+store) implement the same small interface.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def audio_key(script: str, voice_id: str, model_id: str) -> str:
+    """Content address for one synthesised script"""
+    return hashlib.sha256(f"{voice_id}\n{model_id}\n{script.strip()}".encode("utf-8")).hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=` range into inclusive (start, end); None means the whole file.
+
+    Raises ValueError for unsatisfiable or malformed ranges.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(f"Unsupported range: {header}")
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+
+class AudioStorage(ABC):
+    """Backend interface for stored audio"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def save(self, key: str, segments: Iterable[bytes]) -> int:
+        """Write the segments in order as one object; returns the byte count"""
+
+    @abstractmethod
+    def read(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield bytes start..end (inclusive)"""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LocalAudioStorage(AudioStorage):
+    """Files under root/<2-char prefix>/<key>.mp3, served by this service.
+
+    Without a base_url, url() is the path relative to this service ("/audio/<key>.mp3").
+    """
+
+    def __init__(self, root: Path, base_url: str = ""):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+        self.writes = 0
+        self.dedup_hits = 0
+
+    def path(self, key: str) -> Path:
+        if not _KEY_RE.match(key):
+            raise ValueError(f"Invalid audio key: {key}")
+        return self.root / key[:2] / f"{key}.mp3"
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def size(self, key: str) -> int:
+        return self.path(key).stat().st_size
+
+    def save(self, key: str, segments: Iterable[bytes]) -> int:
+        path = self.path(key)
+        if path.exists():
+            self.dedup_hits += 1
+            return path.stat().st_size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name so concurrent writers of the same key don't collide
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        written = 0
+        try:
+            with open(tmp, "wb") as f:
+                for segment in segments:
+                    f.write(segment)
+                    written += len(segment)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.writes += 1
+        return written
+
+    def read(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(self.path(key), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/audio/{key}.mp3"
+
+    def stats(self) -> dict:
+        return {"backend": "local", "writes": self.writes, "dedup_hits": self.dedup_hits}
+
+
+def create_audio_storage_from_env(data_dir: Path) -> AudioStorage:
+    """AUDIO_STORAGE_BACKEND=local (default); AUDIO_STORAGE_PATH, AUDIO_PUBLIC_BASE_URL"""
+    backend = os.getenv("AUDIO_STORAGE_BACKEND", "local").lower()
+    if backend != "local":
+        raise ValueError(f"Unknown AUDIO_STORAGE_BACKEND: {backend}")
+    root = Path(os.getenv("AUDIO_STORAGE_PATH", data_dir / "audio"))
+    base_url = os.getenv("AUDIO_PUBLIC_BASE_URL", "")
+    if not base_url:
+        logger.warning("⚠️ AUDIO_PUBLIC_BASE_URL is not set - audio URLs are stored relative to this service")
+    return LocalAudioStorage(root, base_url)
+
+
+async def iterate_file(storage: AudioStorage, key: str, start: int, end: int):
+    """Async wrapper over storage.read that keeps disk reads off the event loop.
+
+    The reader is closed (releasing its file) however iteration ends, including a client
+    disconnecting mid-range; the lock makes the close wait for a read still running in its thread.
+    """
+    reader = storage.read(key, start, end)
+    lock = threading.Lock()
+
+    def step() -> Optional[bytes]:
+        with lock:
+            return next(reader, None)
+
+    def close() -> None:
+        with lock:
+            reader.close()
+
+    try:
+        while True:
+            chunk = await asyncio.to_thread(step)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await asyncio.to_thread(close)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmark
+==================
+Runs the full generate_in_parallel pipeline for N concurrent courses against
+local stub servers (benchmarks/stub_servers.py) instead of Gemini, Groq,
+ElevenLabs, Brave and Supabase, so orchestration changes can be measured
+offline and reproducibly. Reports wall time, course latency, throughput,
+per-stage latency and the critical path (the chain of stages that determined
+each course's end time).
+
+    python benchmarks/pipeline.py --courses 20 --concurrency 5
+    python benchmarks/pipeline.py --profile slow_gemini.json --set gemini.rate_limit=0.1 --set text_scale=0.25
+
+A profile is a JSON object mirroring StubConfig, e.g.
+{"gemini": {"median_ms": 1500, "sigma": 0.5, "rate_limit": 0.05}, "list_items": 8}.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from stub_servers import StubConfig, StubServer  # noqa: E402
+
+DEFAULT_TOPICS = ["Python decorators", "SQL joins", "Rust ownership", "Kubernetes networking", "Linear regression"]
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def stub_environment(stub: StubServer, data_dir: str) -> dict:
+    """Point every provider at the stub and keep state in a throwaway directory"""
+    env = {
+        **stub.env(),
+        "SUPABASE_SERVICE_ROLE_KEY": "stub",
+        "GEMINI_API_KEY_1": "stub-1",
+        "GEMINI_API_KEY_2": "stub-2",
+        "GEMINI_API_KEY_3": "stub-3",
+        "GROQ_API_KEY_1": "stub",
+        "ELEVENLABS_API_KEY": "stub",
+        "BRAVE_SEARCH_API_KEY": "stub",
+        "COURSE_GEN_DATA_DIR": data_dir,
+        "LLM_CACHE_BACKEND": "none",
+        "TOPIC_REUSE_ENABLED": "false",
+    }
+    for i in range(1, 11):
+        env[f"GEMINI_CHAPTER_KEY_{i}"] = f"stub-chapter-{i}"
+    return env
+
+
+class StageRecorder:
+    """Wraps main.run_stage / main.commit_course_content to time each stage per course"""
+
+    def __init__(self, main):
+        self.main = main
+        self.spans = defaultdict(list)  # course_id -> [(stage, start, end)]
+        self._run_stage = main.run_stage
+        self._commit = main.commit_course_content
+
+    def __enter__(self):
+        async def run_stage(course_id, stage, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await self._run_stage(course_id, stage, *args, **kwargs)
+            finally:
+                self.spans[course_id].append((stage, start, time.perf_counter()))
+
+        async def commit_course_content(course_id, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await self._commit(course_id, *args, **kwargs)
+            finally:
+                self.spans[course_id].append(("commit", start, time.perf_counter()))
+
+        self.main.run_stage = run_stage
+        self.main.commit_course_content = commit_course_content
+        return self
+
+    def __exit__(self, *exc):
+        self.main.run_stage = self._run_stage
+        self.main.commit_course_content = self._commit
+
+
+def stage_name(stage: str) -> str:
+    # "chapter:3" -> "chapter"
+    return stage.split(":", 1)[0]
+
+
+def critical_path(spans, start: float, end: float) -> list:
+    """Walk back from the course end, each time taking the stage that finished last before the cursor"""
+    path, cursor = [], end
+    remaining = sorted(spans, key=lambda span: span[2])
+    while remaining:
+        candidates = [span for span in remaining if span[2] <= cursor + 1e-6]
+        if not candidates:
+            break
+        stage, stage_start, _ = candidates[-1]
+        path.append(stage_name(stage))
+        cursor = stage_start
+        remaining = [span for span in remaining if span[2] <= cursor + 1e-6]
+        if cursor <= start:
+            break
+    return list(reversed(path))
+
+
+async def drive(main, args):
+    """Generate args.courses courses, at most args.concurrency at a time"""
+    topics = args.topics or DEFAULT_TOPICS
+    semaphore = asyncio.Semaphore(args.concurrency)
+    courses, failures = [], 0
+
+    async def one(index: int):
+        nonlocal failures
+        topic = topics[index % len(topics)]
+        async with semaphore:
+            course_id = await main.create_course(topic, "benchmark-user")
+            await main.create_generation_job(course_id, "benchmark-user")
+            start = time.perf_counter()
+            try:
+                await main.generate_in_parallel(course_id, topic, "benchmark-user", bypass_cache=True)
+            except Exception as e:
+                failures += 1
+                print(f"  ✗ {topic}: {e}")
+                return
+            courses.append((course_id, start, time.perf_counter()))
+
+    print(f"▶ {args.courses} courses, concurrency {args.concurrency}")
+    with StageRecorder(main) as recorder:
+        wall_start = time.perf_counter()
+        try:
+            await asyncio.gather(*[one(i) for i in range(args.courses)])
+            await main.progress_reporter.flush_all()
+        finally:
+            wall = time.perf_counter() - wall_start
+            await main.postgrest.aclose()
+            await main.tts.aclose()
+            await main.brave.aclose()
+            main.CPU_POOL.shutdown()
+    return wall, courses, failures, recorder
+
+
+async def run(args) -> dict:
+    config = StubConfig.from_dict(json.loads(Path(args.profile).read_text())) if args.profile else StubConfig()
+    for override in args.set:
+        path, _, value = override.partition("=")
+        config.set(path, value)
+    if args.seed is not None:
+        config.seed = args.seed
+
+    stub = StubServer(config)
+    await stub.start()
+    try:
+        data_dir = tempfile.mkdtemp(prefix="course-gen-bench-")
+        os.environ.update(stub_environment(stub, data_dir))
+        for name, value in args.env:
+            os.environ[name] = value
+        main = importlib.import_module("main")
+        wall, courses, failures, recorder = await drive(main, args)
+    finally:
+        await stub.stop()
+
+    durations = [end - start for _, start, end in courses]
+    timelines = [main.JOB_QUEUE.load_timeline(course_id) for course_id, _, _ in courses]
+    costs = [timeline["totals"]["cost_usd"] for timeline in timelines if timeline]
+    stage_latency = defaultdict(list)
+    paths = Counter()
+    for course_id, start, end in courses:
+        spans = recorder.spans[course_id]
+        for stage, stage_start, stage_end in spans:
+            stage_latency[stage_name(stage)].append(stage_end - stage_start)
+        paths[" → ".join(critical_path(spans, start, end))] += 1
+
+    return {
+        "courses": args.courses,
+        "concurrency": args.concurrency,
+        "failed": failures,
+        "wall_s": round(wall, 2),
+        "throughput_per_min": round(len(courses) / wall * 60, 2) if wall else 0.0,
+        "course_p50_s": round(percentile(durations, 50), 2),
+        "course_p95_s": round(percentile(durations, 95), 2),
+        "course_mean_s": round(statistics.mean(durations), 2) if durations else 0.0,
+        "api_cost_per_course_usd": round(statistics.mean(costs), 4) if costs else 0.0,
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_s": round(percentile(values, 50), 2),
+                "p95_s": round(percentile(values, 95), 2),
+                "max_s": round(max(values), 2),
+            }
+            for stage, values in sorted(stage_latency.items())
+        },
+        "critical_paths": dict(paths.most_common(3)),
+        "stubs": stub.stats(),
+        "llm_router": main.LLM_ROUTER.stats()["providers"],
+        "cpu_pool": main.CPU_POOL.stats(),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\nwall {report['wall_s']}s | {report['throughput_per_min']} courses/min | "
+          f"course p50 {report['course_p50_s']}s p95 {report['course_p95_s']}s | "
+          f"${report['api_cost_per_course_usd']}/course | failed {report['failed']}")
+    print(f"\n{'stage':>14} | {'count':>6} | {'p50_s':>8} | {'p95_s':>8} | {'max_s':>8}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:>14} | {row['count']:>6} | {row['p50_s']:>8.2f} | {row['p95_s']:>8.2f} | {row['max_s']:>8.2f}")
+    print("\ncritical paths:")
+    for path, count in report["critical_paths"].items():
+        print(f"  {count:>4} × {path}")
+    stubs = report["stubs"]
+    print("\nstub requests:", ", ".join(f"{k}={v}" for k, v in sorted(stubs["requests"].items())))
+    if stubs["rate_limited"]:
+        print("injected 429s:", ", ".join(f"{k}={v}" for k, v in sorted(stubs["rate_limited"].items())))
+
+
+def env_pair(value: str):
+    name, _, setting = value.partition("=")
+    return name, setting
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("topics", nargs="*")
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--profile", help="JSON file with StubConfig fields")
+    parser.add_argument("--set", action="append", default=[], metavar="PATH=VALUE",
+                        help="override a stub setting, e.g. gemini.median_ms=500 or text_scale=0.25")
+    parser.add_argument("--env", action="append", default=[], type=env_pair, metavar="NAME=VALUE",
+                        help="service setting for the run, e.g. PRACTICE_FUSION=true")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Practice Fusion Benchmark
+=========================
+Compares fused practice generation (one structured call for flashcards, MCQs
+and word games) against the three separate calls on latency, failure rate and
+LLM request count. Runs against the providers configured in .env with the LLM
+cache bypassed, so every run is a real call:
+
+    python benchmarks/practice_fusion.py --runs 10 --concurrency 2 "Python decorators" "SQL joins"
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+from llm_cache import cache_bypass  # noqa: E402
+
+SECTIONS = ("flashcards", "mcqs", "word_games")
+
+
+async def separate(course_id: str, topic: str) -> dict:
+    flashcards, mcqs, word_games = await asyncio.gather(
+        main.generate_flashcards(course_id, topic),
+        main.generate_mcqs(course_id, topic),
+        main.generate_word_games(course_id, topic),
+    )
+    return {"flashcards": flashcards, "mcqs": mcqs, "word_games": word_games}
+
+
+async def fused(course_id: str, topic: str) -> dict:
+    return await main.generate_practice_set(course_id, topic)
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_mode(name: str, produce, topics, runs: int, concurrency: int) -> dict:
+    calls = {"count": 0}
+    original = main.call_llm
+
+    async def counting(*args, **kwargs):
+        calls["count"] += 1
+        return await original(*args, **kwargs)
+
+    main.call_llm = counting
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures, incomplete, items = [], 0, 0, []
+
+    async def one(topic: str):
+        nonlocal failures, incomplete
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await produce(str(uuid.uuid4()), topic)
+            except Exception as e:
+                failures += 1
+                print(f"  ✗ [{name}] {topic}: {e}")
+                return
+            latencies.append(time.perf_counter() - start)
+            if not all(result.get(section) for section in SECTIONS):
+                incomplete += 1
+            items.append(sum(len(result.get(section, [])) for section in SECTIONS))
+
+    cache_bypass.set(True)
+    wall_start = time.perf_counter()
+    try:
+        await asyncio.gather(*[one(topic) for _ in range(runs) for topic in topics])
+    finally:
+        main.call_llm = original
+    total = runs * len(topics)
+    return {
+        "mode": name,
+        "runs": total,
+        "wall_s": time.perf_counter() - wall_start,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "mean_s": statistics.mean(latencies) if latencies else 0.0,
+        "failure_rate": failures / total if total else 0.0,
+        "incomplete_rate": incomplete / total if total else 0.0,
+        "requests_per_run": calls["count"] / total if total else 0.0,
+        "items_per_run": statistics.mean(items) if items else 0.0,
+    }
+
+
+def print_table(results) -> None:
+    columns = ["mode", "runs", "wall_s", "p50_s", "p95_s", "mean_s", "failure_rate", "incomplete_rate", "requests_per_run", "items_per_run"]
+    print("\n" + " | ".join(f"{c:>16}" for c in columns))
+    for result in results:
+        cells = [f"{result[c]:>16.2f}" if isinstance(result[c], float) else f"{result[c]:>16}" for c in columns]
+        print(" | ".join(cells))
+
+
+async def run(args) -> None:
+    results = []
+    for name, produce in (("separate", separate), ("fused", fused)):
+        if args.mode in (name, "both"):
+            print(f"▶ {name}: {args.runs} x {len(args.topics)} topics, concurrency {args.concurrency}")
+            results.append(await run_mode(name, produce, args.topics, args.runs, args.concurrency))
+    print_table(results)
+    await main.postgrest.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("topics", nargs="+")
+    parser.add_argument("--runs", type=int, default=5, help="runs per topic and mode")
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--mode", choices=["both", "separate", "fused"], default="both")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,380 @@
+"""
+Stub Provider Servers
+=====================
+One local HTTP server that imitates every external API course generation
+talks to: Gemini (generateContent, streamGenerateContent and JSON mode with a
+responseSchema), Groq chat completions, ElevenLabs text-to-speech, Brave
+search and an in-memory Supabase PostgREST (tables plus the
+commit_course_content / delete_courses RPCs).
+
+Each service has a latency profile (lognormal time-to-first-byte plus a
+generation rate), a 429 injection probability, and payload sizes that scale
+with what the prompt asks for.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORDS = (
+    "data model system value function process design pattern example result method "
+    "structure concept practice network memory query layer request state object"
+).split()
+_WORD_COUNT_RE = re.compile(r"(\d+)\s*(?:-\s*(\d+))?\s*words")
+
+
+@dataclass
+class ServiceProfile:
+    median_ms: float = 300.0  # time to first byte
+    sigma: float = 0.3  # lognormal spread of the TTFB
+    rate_limit: float = 0.0  # probability of answering 429
+    units_per_second: float = 0.0  # generation rate (words for LLMs, chars for TTS); 0 = instant
+
+    def ttfb(self, rng: random.Random) -> float:
+        return self.median_ms / 1000 * rng.lognormvariate(0, self.sigma)
+
+    def generation_time(self, units: int) -> float:
+        return units / self.units_per_second if self.units_per_second else 0.0
+
+
+@dataclass
+class StubConfig:
+    gemini: ServiceProfile = field(default_factory=lambda: ServiceProfile(900, 0.35, 0.0, 120))
+    groq: ServiceProfile = field(default_factory=lambda: ServiceProfile(250, 0.3, 0.0, 400))
+    elevenlabs: ServiceProfile = field(default_factory=lambda: ServiceProfile(400, 0.3, 0.0, 1500))
+    brave: ServiceProfile = field(default_factory=lambda: ServiceProfile(350, 0.3, 0.0, 0))
+    supabase: ServiceProfile = field(default_factory=lambda: ServiceProfile(25, 0.3, 0.0, 0))
+    text_scale: float = 1.0  # multiplies the word counts prompts ask for
+    default_words: int = 300  # free-text length when the prompt names none
+    list_items: int = 10  # items per generated JSON array
+    outline_chapters: int = 6
+    audio_bytes_per_char: int = 250
+    seed: Optional[int] = None
+
+    def set(self, path: str, value: str) -> None:
+        """Apply a dotted override such as `gemini.median_ms=500`"""
+        target, _, name = path.rpartition(".")
+        obj = getattr(self, target) if target else self
+        current = getattr(obj, name)
+        setattr(obj, name, type(current)(value) if current is not None else int(value))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StubConfig":
+        config = cls()
+        for key, value in data.items():
+            if isinstance(value, dict):
+                setattr(config, key, ServiceProfile(**{**asdict(getattr(config, key)), **value}))
+            else:
+                setattr(config, key, value)
+        return config
+
+
+def _filler(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(max(1, words)))
+
+
+def _requested_words(prompt: str, config: StubConfig) -> int:
+    match = _WORD_COUNT_RE.search(prompt)
+    words = int(match.group(2) or match.group(1)) if match else config.default_words
+    return max(20, int(words * config.text_scale))
+
+
+def _from_schema(schema: dict, rng: random.Random, config: StubConfig, name: str = "") -> object:
+    """Synthesise a value matching a Gemini responseSchema"""
+    kind = schema.get("type", "STRING").upper()
+    if kind == "OBJECT":
+        return {prop: _from_schema(sub, rng, config, prop) for prop, sub in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        items = schema.get("items", {})
+        if name == "chapters":
+            count = config.outline_chapters
+        elif items.get("type", "STRING").upper() == "STRING":
+            count = 4 if name == "options" else 3  # options, distractors, objectives...
+        else:
+            count = config.list_items
+        count = max(count, schema.get("minItems", 0))
+        return [_from_schema(items, rng, config) for _ in range(count)]
+    if kind == "INTEGER":
+        return rng.randint(5, 20)
+    if kind == "NUMBER":
+        return round(rng.uniform(0, 1), 2)
+    if kind == "BOOLEAN":
+        return True
+    return _filler(rng, 8)
+
+
+def _universal_item(rng: random.Random) -> dict:
+    """One object carrying every field the generators' item schemas use (extras are ignored)"""
+    return {
+        "question": _filler(rng, 8),
+        "answer": _filler(rng, 12),
+        "options": [_filler(rng, 3) for _ in range(4)],
+        "correct": _filler(rng, 3),
+        "explanation": _filler(rng, 10),
+        "word": rng.choice(_WORDS),
+        "incorrect": [_filler(rng, 4) for _ in range(3)],
+        "topic": _filler(rng, 3),
+        "description": _filler(rng, 10),
+        "title": _filler(rng, 4),
+    }
+
+
+def _match(row: dict, params) -> bool:
+    for column, condition in params.items():
+        if column in ("select", "order", "limit", "offset", "on_conflict"):
+            continue
+        value = row.get(column)
+        if condition.startswith("eq."):
+            if str(value) != condition[3:]:
+                return False
+        elif condition.startswith("in.("):
+            if str(value) not in condition[4:-1].split(","):
+                return False
+        elif condition == "is.null":
+            if value is not None:
+                return False
+        elif condition == "not.is.null":
+            if value is None:
+                return False
+    return True
+
+
+class StubState:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.tables: Dict[str, List[dict]] = defaultdict(list)
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.rate_limited: Dict[str, int] = defaultdict(int)
+        self.bytes_out: Dict[str, int] = defaultdict(int)
+
+    async def admit(self, service: str) -> Optional[Response]:
+        """Count the request, sleep its TTFB and maybe inject a 429"""
+        profile: ServiceProfile = getattr(self.config, service)
+        self.requests[service] += 1
+        await asyncio.sleep(profile.ttfb(self.rng))
+        if profile.rate_limit and self.rng.random() < profile.rate_limit:
+            self.rate_limited[service] += 1
+            return JSONResponse({"error": {"code": 429, "message": "Resource exhausted (stub)"}}, status_code=429)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "rate_limited": dict(self.rate_limited),
+            "bytes_out": dict(self.bytes_out),
+            "rows": {table: len(rows) for table, rows in self.tables.items()},
+        }
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Course generation provider stubs")
+    state = StubState(config)
+    app.state.stub = state
+
+    # ---- Gemini ----
+
+    @app.post("/gemini/models/{model_action}")
+    async def gemini(model_action: str, request: Request):
+        if (rejected := await state.admit("gemini")):
+            return rejected
+        body = await request.json()
+        prompt = body["contents"][0]["parts"][0]["text"]
+        schema = body.get("generationConfig", {}).get("responseSchema")
+        if schema:
+            text = json.dumps(_from_schema(schema, state.rng, config))
+        else:
+            text = " ".join(f"<p>{_filler(state.rng, 60)}</p>" for _ in range(_requested_words(prompt, config) // 60 + 1))
+        duration = config.gemini.generation_time(len(text.split()))
+        state.bytes_out["gemini"] += len(text)
+
+        if model_action.endswith(":streamGenerateContent"):
+            async def events():
+                pieces = max(1, len(text) // 400)
+                step = len(text) // pieces + 1
+                for i in range(0, len(text), step):
+                    await asyncio.sleep(duration / pieces)
+                    chunk = {"candidates": [{"content": {"parts": [{"text": text[i:i + step]}]}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(duration)
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}],
+                "usageMetadata": {"promptTokenCount": len(prompt.split()), "candidatesTokenCount": len(text.split())}}
+
+    # ---- Groq ----
+
+    @app.post("/groq/chat/completions")
+    async def groq(request: Request):
+        if (rejected := await state.admit("groq")):
+            return rejected
+        body = await request.json()
+        prompt = body["messages"][-1]["content"]
+        if body.get("response_format", {}).get("type") == "json_object":
+            items = [_universal_item(state.rng) for _ in range(config.list_items)]
+            payload = {"items": items} if '"items"' in prompt else {
+                "flashcards": items, "mcqs": items, "word_games": items
+            }
+            text = json.dumps(payload)
+        else:
+            text = _filler(state.rng, _requested_words(prompt, config))
+        await asyncio.sleep(config.groq.generation_time(len(text.split())))
+        state.bytes_out["groq"] += len(text)
+        return {"choices": [{"message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split())}}
+
+    # ---- ElevenLabs ----
+
+    @app.post("/elevenlabs/text-to-speech/{voice_id}")
+    async def elevenlabs(voice_id: str, request: Request):
+        if (rejected := await state.admit("elevenlabs")):
+            return rejected
+        text = (await request.json())["text"]
+        await asyncio.sleep(config.elevenlabs.generation_time(len(text)))
+        # MPEG-1 layer III frame sync followed by silence
+        audio = b"\xff\xfb\x90\x00" + bytes(max(0, len(text) * config.audio_bytes_per_char - 4))
+        state.bytes_out["elevenlabs"] += len(audio)
+        return Response(audio, media_type="audio/mpeg")
+
+    # ---- Brave ----
+
+    @app.get("/brave/web/search")
+    async def brave(q: str = ""):
+        if (rejected := await state.admit("brave")):
+            return rejected
+        results = [
+            {"title": f"{q} {_filler(state.rng, 4)}", "url": f"https://docs{i}.example.com/{uuid.uuid4().hex[:8]}",
+             "description": _filler(state.rng, 20)}
+            for i in range(10)
+        ]
+        return {"web": {"results": results}}
+
+    # ---- Supabase PostgREST ----
+
+    @app.post("/supabase/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        if (rejected := await state.admit("supabase")):
+            return rejected
+        args = await request.json()
+        if function == "commit_course_content":
+            course_id = args["p_course_id"]
+            counts = {}
+            for table, rows in args["p_content"].items():
+                state.tables[table] = [r for r in state.tables[table] if r.get("course_id") != course_id]
+                state.tables[table].extend({"id": str(uuid.uuid4()), **row, "course_id": course_id} for row in rows)
+                counts[table] = len(rows)
+            for course in state.tables["courses"]:
+                if course.get("id") == course_id:
+                    course.update(args.get("p_course_fields") or {})
+            return counts
+        if function == "delete_courses":
+            ids = set(args["p_course_ids"])
+            counts = {}
+            for table, rows in state.tables.items():
+                if table == "courses":
+                    continue
+                counts[table] = sum(1 for r in rows if r.get("course_id") in ids)
+                state.tables[table] = [r for r in rows if r.get("course_id") not in ids]
+            deleted = [c["id"] for c in state.tables["courses"] if c.get("id") in ids]
+            state.tables["courses"] = [c for c in state.tables["courses"] if c.get("id") not in ids]
+            return {"deleted": deleted, "rows": counts}
+        return JSONResponse({"message": f"function {function} not found"}, status_code=404)
+
+    @app.api_route("/supabase/rest/v1/{table}", methods=["GET", "POST", "PATCH", "DELETE"])
+    async def table(table: str, request: Request):
+        if (rejected := await state.admit("supabase")):
+            return rejected
+        params = dict(request.query_params)
+        prefer = request.headers.get("prefer", "")
+        rows = state.tables[table]
+
+        if request.method == "GET":
+            return [r for r in rows if _match(r, params)]
+
+        if request.method == "POST":
+            body = await request.json()
+            new_rows = [{"id": str(uuid.uuid4()), **r} for r in (body if isinstance(body, list) else [body])]
+            if "merge-duplicates" in prefer and params.get("on_conflict"):
+                keys = params["on_conflict"].split(",")
+                for new in new_rows:
+                    existing = next((r for r in rows if all(str(r.get(k)) == str(new.get(k)) for k in keys)), None)
+                    if existing:
+                        existing.update({k: v for k, v in new.items() if k != "id"})
+                    else:
+                        rows.append(new)
+            else:
+                rows.extend(new_rows)
+            if "return=representation" in prefer:
+                return JSONResponse(new_rows, status_code=201)
+            return Response(status_code=201)
+
+        if request.method == "PATCH":
+            body = await request.json()
+            updated = [r for r in rows if _match(r, params)]
+            for r in updated:
+                r.update(body)
+            if "return=representation" in prefer:
+                return JSONResponse(updated)
+            return Response(status_code=204)
+
+        kept = [r for r in rows if not _match(r, params)]
+        removed = [r for r in rows if _match(r, params)]
+        state.tables[table] = kept
+        headers = {"Content-Range": f"*/{len(removed)}"}
+        if "return=representation" in prefer:
+            return JSONResponse(removed, headers=headers)
+        return Response(status_code=204, headers=headers)
+
+    return app
+
+
+class StubServer:
+    """Runs the stub app with uvicorn inside the current event loop"""
+
+    def __init__(self, config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_stub_app(config)
+        self.host = host
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._task: Optional[asyncio.Task] = None
+        self.port = port
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._server.serve())
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if self._task.done() or time.monotonic() > deadline:
+                raise RuntimeError("Stub server failed to start")
+            await asyncio.sleep(0.05)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.should_exit = True
+        if self._task:
+            await self._task
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the service at this stub"""
+        return {
+            "GEMINI_BASE_URL": f"{self.base_url}/gemini",
+            "GROQ_BASE_URL": f"{self.base_url}/groq",
+            "ELEVENLABS_BASE_URL": f"{self.base_url}/elevenlabs",
+            "BRAVE_BASE_URL": f"{self.base_url}/brave",
+            "SUPABASE_URL": f"{self.base_url}/supabase",
+        }
+
+    def stats(self) -> dict:
+        return self.app.state.stub.stats()
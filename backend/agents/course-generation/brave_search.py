@@ -0,0 +1,68 @@
+"""
+Brave Search Client
+===================
+One pooled HTTP client for every Brave web search, instead of a new
+connection (TLS handshake included) per course. Query parameters are passed
+to httpx, so topics containing spaces, "&", "#" or "+" (C++, C#) are encoded
+rather than corrupting the URL.
+"""
+
+import logging
+import time
+from typing import List, Optional
+
+import httpx
+
+from http_pool import LazyAsyncClient, pool_limits
+from timeline import record_span, span_status
+
+logger = logging.getLogger(__name__)
+
+
+class BraveSearch:
+    """Pooled Brave web search"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = "https://api.search.brave.com/res/v1",
+        timeout: float = 15.0,
+        max_connections: int = 10,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._http = LazyAsyncClient(
+            headers={"X-Subscription-Token": self.api_key or "", "Accept": "application/json"},
+            timeout=self.timeout,
+            limits=pool_limits(self.max_connections),
+        )
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._http.get()
+
+    async def web_search(self, query: str, count: int = 5) -> List[dict]:
+        """Web results ({"title", "url", "description", ...}); raises httpx errors"""
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(f"{self.base_url}/web/search", params={"q": query, "count": count})
+        except httpx.TransportError:
+            self.failures += 1
+            record_span("brave", "web_search", start, status="error", key=self.api_key)
+            raise
+        record_span("brave", "web_search", start, status=span_status(response), key=self.api_key)
+        if response.status_code != 200:
+            self.failures += 1
+            response.raise_for_status()
+        return response.json().get("web", {}).get("results", [])[:count]
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "failures": self.failures}
@@ -0,0 +1,192 @@
+"""
+CPU Post-processing Pool
+========================
+HTML post-processing and JSON repair/validation of multi-thousand-word LLM
+outputs are pure CPU work; run on the event loop they stall progress writes
+and every other job in the process. CPUPool sends them to a process pool
+instead. Submissions are bounded (workers + max_queued in flight), so a burst
+of finished chapters waits its turn instead of piling up in the executor, and
+the time spent queued and running is recorded per function.
+
+With workers=0 the work runs in a thread (asyncio.to_thread), which keeps the
+loop responsive but shares the GIL; useful where processes are unavailable.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import types
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def _timed(fn: Callable, args: tuple):
+    """Runs in the worker: the result plus wall and CPU seconds spent on it"""
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = fn(*args)
+    return result, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+class _FunctionStats:
+    __slots__ = ("calls", "failures", "wait_s", "run_s", "cpu_s", "max_run_s")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "wait_ms": round(self.wait_s * 1000, 1),
+            "run_ms": round(self.run_s * 1000, 1),
+            "cpu_ms": round(self.cpu_s * 1000, 1),
+            "avg_run_ms": round(self.run_s / self.calls * 1000, 2) if self.calls else 0.0,
+            "max_run_ms": round(self.max_run_s * 1000, 1),
+        }
+
+
+class CPUPool:
+    """Bounded process pool for CPU-bound post-processing (functions and arguments must pickle;
+    functions must live in an importable module, not in __main__)"""
+
+    def __init__(self, workers: int, max_queued: int = 0, start_method: Optional[str] = None,
+                 preload: Sequence[str] = ()):
+        self.workers = max(0, workers)
+        self.max_queued = max(0, max_queued) if max_queued else max(self.workers, 1) * 4
+        self.start_method = start_method
+        self.preload = list(preload)  # modules the forkserver imports once, before forking workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._stats = defaultdict(_FunctionStats)
+        self.queued = 0  # waiting for a slot
+        self.running = 0  # submitted to the executor
+        self.max_queue_depth = 0
+        self.thread_fallbacks = 0  # ran in a thread because the pool broke
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor, _ = self._launch()
+        return self._executor
+
+    def _launch(self) -> tuple:
+        """A new executor with all of its worker processes started; returns it and their warm-up futures"""
+        context = multiprocessing.get_context(self.start_method) if self.start_method else None
+        if self.start_method == "forkserver" and self.preload:
+            # Instead of the default ['__main__'], which is the whole service
+            context.set_forkserver_preload(self.preload)
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        # Under spawn/forkserver each worker re-runs the parent's __main__ (worker.py: all of main.py,
+        # its clients and queue). Workers are started here, against a bare __main__, so they don't.
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            futures: List[Future] = [executor.submit(_warm) for _ in range(self.workers)]
+        finally:
+            sys.modules["__main__"] = main
+        return executor, futures
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:  # needs the event loop run() is called from
+            self._slots = asyncio.Semaphore((self.workers or 1) + self.max_queued)
+        return self._slots
+
+    async def start(self) -> None:
+        """Start the worker processes up front instead of on the first chapter"""
+        if not self.workers or self._executor is not None:
+            return
+        try:
+            self._executor, futures = self._launch()
+            await asyncio.gather(*[asyncio.wrap_future(f) for f in futures])
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            logger.error(f"❌ CPU pool failed to start ({e}); post-processing runs in threads")
+            self.shutdown()
+            self.workers = 0
+            return
+        logger.info(f"🧮 CPU pool started ({self.workers} processes, {self.max_queued} queued max)")
+
+    async def run(self, fn: Callable, *args):
+        """fn(*args) off the event loop; waits for a slot when the pool is saturated"""
+        stats = self._stats[fn.__name__]
+        queued_at = time.perf_counter()
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued + self.running)
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        stats.wait_s += time.perf_counter() - queued_at
+        self.running += 1
+        try:
+            result, run_s, cpu_s = await self._submit(fn, args)
+        except Exception:
+            stats.failures += 1
+            raise
+        finally:
+            self.running -= 1
+            self.slots.release()
+        stats.calls += 1
+        stats.run_s += run_s
+        stats.cpu_s += cpu_s
+        stats.max_run_s = max(stats.max_run_s, run_s)
+        return result
+
+    async def _submit(self, fn: Callable, args: tuple):
+        if not self.workers:
+            return await asyncio.to_thread(_timed, fn, args)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, _timed, fn, args)
+        except BrokenProcessPool:
+            # A worker died (OOM, killed); replace the pool and don't lose this call
+            logger.warning("⚠️ CPU pool broke, restarting it; running this call in a thread")
+            self.shutdown()
+            self.thread_fallbacks += 1
+            return await asyncio.to_thread(_timed, fn, args)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "mode": "process" if self.workers else "thread",
+            "max_queued": self.max_queued,
+            "queued": self.queued,
+            "running": self.running,
+            "max_queue_depth": self.max_queue_depth,
+            "thread_fallbacks": self.thread_fallbacks,
+            "functions": {name: s.as_dict() for name, s in sorted(self._stats.items())},
+        }
+
+
+def create_cpu_pool_from_env(preload: Sequence[str] = ()) -> CPUPool:
+    """POSTPROCESS_WORKERS (default: CPUs - 1, at most 4; 0 = thread), POSTPROCESS_MAX_QUEUED,
+    POSTPROCESS_START_METHOD (fork/forkserver/spawn; default forkserver where available).
+    `preload` names the modules of the functions the pool runs."""
+    default_workers = min(4, max(1, (os.cpu_count() or 2) - 1))
+    start_method = os.getenv("POSTPROCESS_START_METHOD")
+    if not start_method and "forkserver" in multiprocessing.get_all_start_methods():
+        # Forked from a clean server process rather than from the threaded service
+        start_method = "forkserver"
+    return CPUPool(
+        workers=int(os.getenv("POSTPROCESS_WORKERS", str(default_workers))),
+        max_queued=int(os.getenv("POSTPROCESS_MAX_QUEUED", "0")),
+        start_method=start_method,
+        preload=preload,
+    )
@@ -0,0 +1,239 @@
+"""
+HTML Post-processing
+====================
+Generated chapters and articles are cleaned in a single pass over the text
+with one precompiled tokenizer: markdown artefacts (code fences, ``**``,
+``#`` headers) are stripped, a heading or leading line repeating the chapter
+title is dropped, tags are reduced to a whitelist (unknown tags are unwrapped,
+script-like tags are removed with their content, attributes are filtered and
+unbalanced tags are closed), h2/h3 headings get anchor ids and form the table
+of contents, and words are counted for the reading time.
+
+Text inside <pre>/<code> is left alone, so ``**kwargs`` and ``# comments``
+survive. Everything here is pure and synchronous; callers run it off the
+event loop.
+"""
+
+import html as html_entities
+import re
+from typing import Dict, List, Optional
+
+ALLOWED_TAGS = frozenset({
+    "p", "h2", "h3", "h4", "strong", "em", "b", "i", "u", "ul", "ol", "li", "pre", "code",
+    "table", "thead", "tbody", "tr", "th", "td", "blockquote", "br", "hr", "a", "span", "sup", "sub",
+})
+VOID_TAGS = frozenset({"br", "hr"})
+# Removed together with everything inside them
+DROP_CONTENT_TAGS = frozenset({"script", "style", "iframe", "object", "embed", "noscript", "head", "svg", "form"})
+# Markdown-style titles come back as <h1>; the page already shows one
+RENAMED_TAGS = {"h1": "h2"}
+TOC_TAGS = frozenset({"h2", "h3"})
+# Opening one of these ends an open <p> (as in a browser)
+BLOCK_TAGS = frozenset({"p", "h2", "h3", "h4", "ul", "ol", "pre", "table", "blockquote", "hr"})
+ALLOWED_ATTRIBUTES = {
+    "a": frozenset({"href", "title"}),
+    "code": frozenset({"class"}),
+    "pre": frozenset({"class"}),
+    "th": frozenset({"colspan", "rowspan"}),
+    "td": frozenset({"colspan", "rowspan"}),
+}
+PROSE_WORDS_PER_MINUTE = 200
+CODE_WORDS_PER_MINUTE = 100
+
+# One alternation, scanned once: comments, tags, code fences, bold markers, markdown
+# headers. The leading lookahead lets the engine skip plain text a character class at a time.
+_TOKEN_RE = re.compile(
+    r"(?=[<`*#])(?:"
+    r"(?P<comment><!--.*?(?:-->|\Z))"
+    r"|<(?P<close>/?)(?P<tag>[a-zA-Z][a-zA-Z0-9]*)(?P<attrs>[^<>]*)>"
+    r"|(?P<fence>```[a-zA-Z]*)"
+    r"|(?P<bold>\*\*)"
+    r"|(?P<header>#{1,6}[ \t]+)"  # only at a line start, checked by the caller
+    r")",
+    re.DOTALL,
+)
+_DECLARATION_RE = re.compile(r"<![^>]*>")
+_ATTR_RE = re.compile(r"""([a-zA-Z_:][-a-zA-Z0-9_:.]*)\s*(?:=\s*("[^"]*"|'[^']*'|[^\s"'=<>`]+))?""")
+_SAFE_HREF_RE = re.compile(r"^(?:https?:|mailto:|#|/)", re.IGNORECASE)
+_TAG_TEXT_RE = re.compile(r"<[^>]*>")
+_SPACE_RE = re.compile(r"\s+")
+_SLUG_STRIP_RE = re.compile(r"[^\w\s-]")
+_SLUG_SPACE_RE = re.compile(r"[\s_-]+")
+_ENTITY_RE = re.compile(r"&(?:[a-zA-Z]+|#\d+|#x[0-9a-fA-F]+);")
+
+
+def _normalise(text: str) -> str:
+    return _SPACE_RE.sub(" ", _ENTITY_RE.sub(" ", _TAG_TEXT_RE.sub("", text))).strip().casefold()
+
+
+def _slug(text: str, used: Dict[str, int]) -> str:
+    slug = _SLUG_SPACE_RE.sub("-", _SLUG_STRIP_RE.sub("", _normalise(text))).strip("-") or "section"
+    count = used.get(slug, 0)
+    used[slug] = count + 1
+    return slug if count == 0 else f"{slug}-{count + 1}"
+
+
+def _attributes(tag: str, raw: str) -> str:
+    allowed = ALLOWED_ATTRIBUTES.get(tag)
+    if not allowed or not raw.strip():
+        return ""
+    kept = []
+    for name, value in _ATTR_RE.findall(raw):
+        name = name.lower()
+        if name not in allowed or not value:
+            continue
+        value = value.strip("\"'")
+        if name == "href" and not _SAFE_HREF_RE.match(value):
+            continue
+        kept.append(f'{name}="{value.replace(chr(34), "&quot;")}"')
+    return (" " + " ".join(kept)) if kept else ""
+
+
+def reading_minutes(prose_words: int, code_words: int) -> int:
+    minutes = prose_words / PROSE_WORDS_PER_MINUTE + code_words / CODE_WORDS_PER_MINUTE
+    return max(1, round(minutes))
+
+
+def postprocess_html(text: str, title: Optional[str] = None) -> dict:
+    """Clean generated HTML in one pass.
+
+    Returns {"html", "toc": [{"id", "title", "level"}], "words", "reading_minutes"}.
+    A trailing, unterminated tag (a streamed chapter cut mid-tag) is dropped.
+    """
+    text = _DECLARATION_RE.sub("", text)
+    title_key = _normalise(title) if title else None
+    out: List[str] = []
+    stack: List[str] = []  # open whitelisted tags
+    heading: Optional[list] = None  # [tag, start index in out] while inside an h2/h3/h4
+    toc: List[dict] = []
+    slugs: Dict[str, int] = {}
+    prose_words = code_words = 0
+    code_depth = 0  # open <pre>/<code>; markdown is literal inside them
+    drop_until: Optional[str] = None  # closing tag ending a dropped script/style block
+    title_dropped = title_key is None
+    at_start = True
+
+    def emit_text(segment: str) -> None:
+        nonlocal prose_words, code_words, at_start, title_dropped
+        if not segment:
+            return
+        if at_start:
+            stripped = segment.lstrip()
+            if not stripped:
+                out.append(segment)
+                return
+            at_start = False
+            # Title repeated as a plain first line
+            if not title_dropped and heading is None:
+                first_line, newline, rest = stripped.partition("\n")
+                if newline and _normalise(first_line) == title_key:
+                    title_dropped = True
+                    segment = rest.lstrip()
+                    if not segment:
+                        return
+        words = len(segment.split())
+        if code_depth:
+            code_words += words
+        else:
+            prose_words += words
+        out.append(segment)
+
+    def open_tag(tag: str, attrs: str) -> None:
+        nonlocal code_depth, heading, at_start
+        at_start = False
+        if stack and ((tag in BLOCK_TAGS and stack[-1] == "p") or (tag == "li" and stack[-1] == "li")):
+            close_tag(stack[-1])
+        if tag in VOID_TAGS:
+            out.append(f"<{tag}>")
+            return
+        if tag in ("pre", "code"):
+            code_depth += 1
+        if tag in ("h2", "h3", "h4") and heading is None:
+            heading = [tag, len(out)]
+            out.append("")  # placeholder for the opening tag, filled in on close
+        else:
+            out.append(f"<{tag}{_attributes(tag, attrs)}>")
+        stack.append(tag)
+
+    def close_tag(tag: str) -> None:
+        nonlocal code_depth
+        if tag in VOID_TAGS or tag not in stack:
+            return
+        # Close anything left open inside it (unbalanced model output)
+        while stack:
+            open_ = stack.pop()
+            if open_ in ("pre", "code"):
+                code_depth -= 1
+            if heading is not None and open_ == heading[0]:
+                finish_heading(open_)
+            else:
+                out.append(f"</{open_}>")
+            if open_ == tag:
+                break
+
+    def finish_heading(tag: str) -> None:
+        nonlocal heading, title_dropped
+        start = heading[1]
+        inner = "".join(out[start + 1:])
+        heading = None
+        key = _normalise(inner)
+        if not title_dropped and key == title_key and tag == "h2":
+            title_dropped = True
+            del out[start:]
+            return
+        if tag in TOC_TAGS and key:
+            anchor = _slug(inner, slugs)
+            toc.append({"id": anchor, "title": html_entities.unescape(_SPACE_RE.sub(" ", _TAG_TEXT_RE.sub("", inner)).strip()),
+                        "level": int(tag[1])})
+            out[start] = f'<{tag} id="{anchor}">'
+        else:
+            out[start] = f"<{tag}>"
+        out.append(f"</{tag}>")
+
+    position = 0
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup  # "attrs" for tags, else the artefact's group name
+        if drop_until is not None:
+            if kind == "attrs" and match.group("close") and match.group("tag").lower() == drop_until:
+                drop_until = None
+                position = match.end()
+            continue
+        if kind != "attrs":
+            if code_depth:
+                continue  # fences, ** and # inside code are content
+            if kind == "header" and match.start() and text[match.start() - 1] != "\n":
+                continue  # a # mid-line is text
+            emit_text(text[position:match.start()])
+            position = match.end()
+            continue  # comment or markdown artefact: dropped
+        emit_text(text[position:match.start()])
+        position = match.end()
+        tag = match.group("tag").lower()
+        tag = RENAMED_TAGS.get(tag, tag)
+        if tag in DROP_CONTENT_TAGS:
+            if not match.group("close") and not match.group("attrs").rstrip().endswith("/"):
+                drop_until = tag
+            continue
+        if tag not in ALLOWED_TAGS:
+            continue  # unwrapped: the tag goes, its text stays
+        if match.group("close"):
+            close_tag(tag)
+        else:
+            open_tag(tag, match.group("attrs"))
+
+    if drop_until is None:
+        tail = text[position:]
+        cut = tail.rfind("<")
+        if cut != -1 and ">" not in tail[cut:] and (cut + 1 == len(tail) or tail[cut + 1] in "/!" or tail[cut + 1].isalpha()):
+            tail = tail[:cut]
+        emit_text(tail)
+    while stack:
+        close_tag(stack[-1])
+
+    html = "".join(out).strip()
+    return {
+        "html": html,
+        "toc": toc,
+        "words": prose_words + code_words,
+        "reading_minutes": reading_minutes(prose_words, code_words),
+    }
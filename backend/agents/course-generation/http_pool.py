@@ -0,0 +1,36 @@
+"""
+Pooled HTTP Clients
+===================
+The service's outbound APIs (PostgREST, ElevenLabs, Brave) each keep one
+pooled httpx client for the life of the process. An httpx.AsyncClient binds
+to the event loop that first uses it, so LazyAsyncClient only builds it on
+first use (module-level services are constructed at import time, before any
+loop runs) and builds a fresh one after aclose().
+"""
+
+from typing import Optional
+
+import httpx
+
+
+def pool_limits(max_connections: int) -> httpx.Limits:
+    """Keep every pooled connection alive between requests"""
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+
+class LazyAsyncClient:
+    """An httpx.AsyncClient with fixed options, created on first use"""
+
+    def __init__(self, **options):
+        self.options = options
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def get(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(**self.options)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
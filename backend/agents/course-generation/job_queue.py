@@ -0,0 +1,602 @@
+"""
+Generation Job Queue
+====================
+Durable SQLite-backed queue for course generation jobs plus a pool of async
+workers that consume it. Jobs survive restarts: a job whose worker stops
+heartbeating is reclaimed by another worker and resumes from its last stage
+checkpoint. Several processes can share the same queue file (WAL mode).
+
+Admission control: at most `max_inflight` jobs run at once across all
+workers and at most `max_per_user` per user. Waiting jobs are served in fair
+order (round-robin across users, FIFO within a user), so one user's burst
+can't push everyone else to the back of the queue.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def fair_order(queued: List[tuple], running_by_user: Dict[str, int]) -> List[tuple]:
+    """Order queued (..., user_id, created_at) rows round-robin across users.
+
+    A user's k-th waiting job is in round k + (jobs that user already has
+    running); rounds are served in order, oldest first within a round.
+    """
+    seen = defaultdict(int)
+    ranked = []
+    for row in sorted(queued, key=lambda r: r[-1]):
+        user_id = row[-2]
+        ranked.append((running_by_user.get(user_id, 0) + seen[user_id], row[-1], row))
+        seen[user_id] += 1
+    return [row for _, _, row in sorted(ranked, key=lambda item: item[:2])]
+
+
+class JobQueue:
+    """Persistent job table, stage checkpoints and worker registry"""
+
+    def __init__(self, path: Path, lease_seconds: int = 60, max_attempts: int = 3,
+                 max_inflight: int = 0, max_per_user: int = 0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.max_inflight = max_inflight  # 0 = only bounded by the number of workers
+        self.max_per_user = max_per_user  # 0 = unlimited
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS generation_jobs (
+                id TEXT PRIMARY KEY,
+                course_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                options TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_generation_jobs_status ON generation_jobs(status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_generation_jobs_course ON generation_jobs(course_id);
+            CREATE TABLE IF NOT EXISTS generation_checkpoints (
+                course_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (course_id, stage)
+            );
+            CREATE TABLE IF NOT EXISTS generation_stage_failures (
+                course_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL,
+                PRIMARY KEY (course_id, stage)
+            );
+            CREATE TABLE IF NOT EXISTS generation_timelines (
+                course_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS generation_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                course_id TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_generation_events_course ON generation_events(course_id, id);
+            CREATE TABLE IF NOT EXISTS generation_workers (
+                worker_id TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                started_at REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                busy INTEGER NOT NULL DEFAULT 0
+            );
+            """
+        )
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    # ---- jobs ----
+
+    def enqueue(self, course_id: str, user_id: str, topic: str, options: Optional[dict] = None) -> str:
+        job_id = str(uuid.uuid4())
+        self._execute(
+            "INSERT INTO generation_jobs (id, course_id, user_id, topic, options, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, course_id, user_id, topic, json.dumps(options or {}), time.time()),
+        )
+        return job_id
+
+    def _running_by_user(self, now: float) -> Dict[str, int]:
+        return dict(self._conn.execute(
+            """SELECT user_id, COUNT(*) FROM generation_jobs
+               WHERE status IN ('running', 'cancelling') AND heartbeat_at >= ? GROUP BY user_id""",
+            (now - self.lease_seconds,),
+        ).fetchall())
+
+    def _next_job(self, now: float) -> Optional[tuple]:
+        """The job to run next under the admission limits (caller holds the write transaction)"""
+        # A cancelled job whose worker died has nothing left to stop
+        self._conn.execute(
+            "UPDATE generation_jobs SET status = 'cancelled', finished_at = ? WHERE status = 'cancelling' AND heartbeat_at < ?",
+            (now, now - self.lease_seconds),
+        )
+        # Jobs whose worker died were already admitted: reclaim them first
+        row = self._conn.execute(
+            """SELECT id, course_id, user_id, topic, options, attempts FROM generation_jobs
+               WHERE status = 'running' AND heartbeat_at < ?
+               ORDER BY created_at ASC LIMIT 1""",
+            (now - self.lease_seconds,),
+        ).fetchone()
+        if row is not None:
+            return row
+        running = self._running_by_user(now)
+        if self.max_inflight and sum(running.values()) >= self.max_inflight:
+            return None
+        queued = self._conn.execute(
+            """SELECT id, course_id, topic, options, attempts, user_id, created_at FROM generation_jobs
+               WHERE status = 'queued'"""
+        ).fetchall()
+        for job_id, course_id, topic, options, attempts, user_id, _ in fair_order(queued, running):
+            if not self.max_per_user or running.get(user_id, 0) < self.max_per_user:
+                return job_id, course_id, user_id, topic, options, attempts
+        return None
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """Atomically take the next admissible job (fair order), or one whose lease has expired"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._next_job(now)
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job_id, course_id, user_id, topic, options, attempts = row
+                if attempts >= self.max_attempts:
+                    self._conn.execute(
+                        "UPDATE generation_jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                        ("Worker lease expired too many times", now, job_id),
+                    )
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    """UPDATE generation_jobs
+                       SET status = 'running', worker_id = ?, attempts = attempts + 1,
+                           started_at = COALESCE(started_at, ?), heartbeat_at = ?
+                       WHERE id = ?""",
+                    (worker_id, now, now, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {
+            "id": job_id,
+            "course_id": course_id,
+            "user_id": user_id,
+            "topic": topic,
+            "options": json.loads(options),
+            "attempt": attempts + 1,
+        }
+
+    def heartbeat(self, job_id: str, worker_id: str) -> None:
+        self._execute(
+            "UPDATE generation_jobs SET heartbeat_at = ? WHERE id = ? AND worker_id = ? AND status IN ('running', 'cancelling')",
+            (time.time(), job_id, worker_id),
+        )
+
+    def release(self, job_id: str) -> None:
+        """Put a claimed job that never started back in the queue, without using up an attempt"""
+        self._execute(
+            """UPDATE generation_jobs SET status = 'queued', worker_id = NULL, attempts = attempts - 1
+               WHERE id = ? AND status = 'running'""",
+            (job_id,),
+        )
+
+    def active_job(self, course_id: str) -> Optional[str]:
+        """Id of a queued, running or cancelling job for this course, if any"""
+        row = self._execute(
+            "SELECT id FROM generation_jobs WHERE course_id = ? AND status IN ('queued', 'running', 'cancelling') LIMIT 1",
+            (course_id,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def cancel(self, course_ids: List[str]) -> Dict[str, str]:
+        """Cancel the courses' jobs: queued ones immediately, running ones are flagged for their worker.
+
+        Returns {course_id: "queued" | "running"} for the jobs that were cancelled.
+        """
+        if not course_ids:
+            return {}
+        now = time.time()
+        marks = ",".join("?" * len(course_ids))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT id, course_id, status FROM generation_jobs WHERE course_id IN ({marks}) AND status IN ('queued', 'running')",
+                    course_ids,
+                ).fetchall()
+                for job_id, _, status in rows:
+                    if status == "queued":
+                        self._conn.execute(
+                            "UPDATE generation_jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (now, job_id)
+                        )
+                    else:
+                        self._conn.execute("UPDATE generation_jobs SET status = 'cancelling' WHERE id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {course_id: status for _, course_id, status in rows}
+
+    def cancelling(self, course_ids: List[str]) -> set:
+        """Which of these courses have a cancellation waiting for their worker"""
+        if not course_ids:
+            return set()
+        marks = ",".join("?" * len(course_ids))
+        rows = self._execute(
+            f"SELECT course_id FROM generation_jobs WHERE course_id IN ({marks}) AND status = 'cancelling'", course_ids
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def queued_count(self, user_id: str) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM generation_jobs WHERE user_id = ? AND status = 'queued'", (user_id,)
+        ).fetchone()[0]
+
+    def _slots(self, now: float) -> int:
+        workers = self._execute(
+            "SELECT COUNT(*) FROM generation_workers WHERE last_seen > ?", (now - self.lease_seconds,)
+        ).fetchone()[0]
+        if self.max_inflight:
+            return min(self.max_inflight, workers) if workers else self.max_inflight
+        return max(1, workers)
+
+    def average_duration(self, default: float = 40.0, sample: int = 20) -> float:
+        """Mean run time of recently completed jobs"""
+        rows = self._execute(
+            """SELECT finished_at - started_at FROM generation_jobs
+               WHERE status = 'completed' AND started_at IS NOT NULL
+               ORDER BY finished_at DESC LIMIT ?""",
+            (sample,),
+        ).fetchall()
+        return sum(r[0] for r in rows) / len(rows) if rows else default
+
+    def queue_position(self, course_id: str) -> Optional[dict]:
+        """Where a course's job stands: running, or its place in the fair order with an estimated start"""
+        now = time.time()
+        # One read transaction, so a worker claiming the job can't slip between the two reads
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    """SELECT id, status FROM generation_jobs
+                       WHERE course_id = ? AND status IN ('queued', 'running')
+                       ORDER BY created_at DESC LIMIT 1""",
+                    (course_id,),
+                ).fetchone()
+                running = self._running_by_user(now)
+                queued = self._conn.execute(
+                    "SELECT id, user_id, created_at FROM generation_jobs WHERE status = 'queued'"
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        if row is None:
+            return None
+        job_id, status = row
+        order = [r[0] for r in fair_order(queued, running)]
+        if status == "running" or job_id not in order:
+            return {"jobId": job_id, "status": "running", "position": 0, "estimated_start_seconds": 0}
+        ahead = order.index(job_id)
+        slots = self._slots(now)
+        free = max(0, slots - sum(running.values()))
+        # Jobs ahead fill the free slots first, then start one wave per average run time
+        waves = 0 if ahead < free else (ahead - free) // slots + 1
+        return {
+            "jobId": job_id,
+            "status": "queued",
+            "position": ahead + 1,
+            "queued": len(order),
+            "running": sum(running.values()),
+            "estimated_start_seconds": round(waves * self.average_duration()),
+        }
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        self._execute(
+            "UPDATE generation_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, error, time.time(), job_id),
+        )
+
+    # ---- checkpoints ----
+
+    def save_checkpoint(self, course_id: str, stage: str, data) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO generation_checkpoints (course_id, stage, data, updated_at) VALUES (?, ?, ?, ?)",
+            (course_id, stage, json.dumps(data), time.time()),
+        )
+        self._execute(
+            "DELETE FROM generation_stage_failures WHERE course_id = ? AND stage = ?", (course_id, stage)
+        )
+
+    def record_failure(self, course_id: str, stage: str, error: str) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO generation_stage_failures (course_id, stage, error, failed_at) VALUES (?, ?, ?, ?)",
+            (course_id, stage, error, time.time()),
+        )
+
+    def load_failures(self, course_id: str) -> Dict[str, str]:
+        rows = self._execute(
+            "SELECT stage, error FROM generation_stage_failures WHERE course_id = ?", (course_id,)
+        ).fetchall()
+        return dict(rows)
+
+    def load_checkpoints(self, course_id: str) -> Dict[str, object]:
+        rows = self._execute(
+            "SELECT stage, data FROM generation_checkpoints WHERE course_id = ?", (course_id,)
+        ).fetchall()
+        return {stage: json.loads(data) for stage, data in rows}
+
+    def load_checkpoint(self, course_id: str, stage: str):
+        row = self._execute(
+            "SELECT data FROM generation_checkpoints WHERE course_id = ? AND stage = ?", (course_id, stage)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def prune_checkpoints(self, course_id: str, keep: tuple = ()) -> None:
+        """Drop a finished course's stage checkpoints and failures except `keep`; the timeline stays"""
+        marks = ",".join("?" * len(keep))
+        self._execute(
+            f"DELETE FROM generation_checkpoints WHERE course_id = ? AND stage NOT IN ({marks})", (course_id, *keep)
+        )
+        self._execute("DELETE FROM generation_stage_failures WHERE course_id = ?", (course_id,))
+
+    def resumable(self, course_id: str) -> bool:
+        """Whether the course has stage checkpoints beyond its outline (an unfinished run)"""
+        return self._execute(
+            "SELECT 1 FROM generation_checkpoints WHERE course_id = ? AND stage != 'outline' LIMIT 1", (course_id,)
+        ).fetchone() is not None
+
+    def clear_checkpoints(self, course_id: str) -> None:
+        self._execute("DELETE FROM generation_checkpoints WHERE course_id = ?", (course_id,))
+        self._execute("DELETE FROM generation_stage_failures WHERE course_id = ?", (course_id,))
+        self._execute("DELETE FROM generation_timelines WHERE course_id = ?", (course_id,))
+
+    # ---- timelines ----
+
+    def save_timeline(self, course_id: str, timeline: dict) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO generation_timelines (course_id, data, updated_at) VALUES (?, ?, ?)",
+            (course_id, json.dumps(timeline), time.time()),
+        )
+
+    def load_timeline(self, course_id: str) -> Optional[dict]:
+        row = self._execute("SELECT data FROM generation_timelines WHERE course_id = ?", (course_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ---- progress events ----
+
+    def append_events(self, origin: str, events: List[tuple], retention_seconds: float = 3600) -> None:
+        """Log (course_id, event) pairs published by `origin` for subscribers in other processes"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO generation_events (course_id, origin, data, created_at) VALUES (?, ?, ?, ?)",
+                    [(course_id, origin, json.dumps(event), now) for course_id, event in events],
+                )
+                self._conn.execute("DELETE FROM generation_events WHERE created_at < ?", (now - retention_seconds,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def last_event_id(self, course_id: str) -> int:
+        return self._execute(
+            "SELECT COALESCE(MAX(id), 0) FROM generation_events WHERE course_id = ?", (course_id,)
+        ).fetchone()[0]
+
+    def events_since(self, course_id: str, after_id: int, exclude_origin: Optional[str] = None) -> tuple:
+        """(last id seen, events logged for the course after `after_id` not published by exclude_origin)"""
+        rows = self._execute(
+            "SELECT id, origin, data FROM generation_events WHERE course_id = ? AND id > ? ORDER BY id",
+            (course_id, after_id),
+        ).fetchall()
+        last_id = rows[-1][0] if rows else after_id
+        return last_id, [json.loads(data) for _, origin, data in rows if origin != exclude_origin]
+
+    # ---- workers ----
+
+    def register_worker(self, worker_id: str) -> None:
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO generation_workers (worker_id, host, pid, started_at, last_seen, busy) VALUES (?, ?, ?, ?, ?, 0)",
+            (worker_id, socket.gethostname(), os.getpid(), now, now),
+        )
+
+    def touch_worker(self, worker_id: str, busy: bool) -> None:
+        self._execute(
+            "UPDATE generation_workers SET last_seen = ?, busy = ? WHERE worker_id = ?",
+            (time.time(), int(busy), worker_id),
+        )
+
+    def unregister_worker(self, worker_id: str) -> None:
+        self._execute("DELETE FROM generation_workers WHERE worker_id = ?", (worker_id,))
+
+    def stats(self) -> dict:
+        now = time.time()
+        counts = dict(self._execute("SELECT status, COUNT(*) FROM generation_jobs GROUP BY status").fetchall())
+        oldest = self._execute(
+            "SELECT MIN(created_at) FROM generation_jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+        alive, busy = self._execute(
+            "SELECT COUNT(*), COALESCE(SUM(busy), 0) FROM generation_workers WHERE last_seen > ?",
+            (now - self.lease_seconds,),
+        ).fetchone()
+        return {
+            "depth": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "completed": counts.get("completed", 0),
+            "failed": counts.get("failed", 0),
+            "cancelled": counts.get("cancelled", 0),
+            "oldest_queued_seconds": round(now - oldest, 1) if oldest else 0,
+            "max_inflight": self.max_inflight,
+            "max_per_user": self.max_per_user,
+            "waiting_users": self._execute(
+                "SELECT COUNT(DISTINCT user_id) FROM generation_jobs WHERE status = 'queued'"
+            ).fetchone()[0],
+            "workers": alive,
+            "busy_workers": busy,
+            "utilisation": round(busy / alive, 2) if alive else 0.0,
+        }
+
+
+class WorkerPool:
+    """N async workers in this process pulling jobs from a JobQueue"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[dict], Awaitable[None]],
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 10.0,
+        cancel_check_interval: float = 2.0,
+        shutdown_grace: float = 0.0,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.cancel_check_interval = cancel_check_interval
+        self.shutdown_grace = shutdown_grace
+        self.prefix = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._running_jobs: Dict[str, dict] = {}
+        self._job_tasks: Dict[str, asyncio.Task] = {}
+        self._cancelled: set = set()  # job ids already told to stop (a second cancel would interrupt cleanup)
+        self._tasks = []
+        self._stopping = asyncio.Event()
+
+    async def start(self) -> None:
+        for i in range(self.concurrency):
+            worker_id = f"{self.prefix}-{i}"
+            await asyncio.to_thread(self.queue.register_worker, worker_id)
+            self._tasks.append(asyncio.create_task(self._worker(worker_id)))
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+        logger.info(f"👷 Started {self.concurrency} generation workers ({self.prefix})")
+
+    async def stop(self) -> None:
+        """Stop polling; in-flight jobs get `shutdown_grace` seconds to finish, the rest are
+        interrupted (not cancelled) and left to be reclaimed after their lease"""
+        self._stopping.set()
+        jobs = list(self._job_tasks.values())
+        if jobs and self.shutdown_grace > 0:
+            logger.info(f"⏳ Waiting up to {self.shutdown_grace}s for {len(jobs)} in-flight jobs")
+            await asyncio.wait(jobs, timeout=self.shutdown_grace)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for i in range(self.concurrency):
+            await asyncio.to_thread(self.queue.unregister_worker, f"{self.prefix}-{i}")
+
+    async def _worker(self, worker_id: str) -> None:
+        while not self._stopping.is_set():
+            job = await asyncio.to_thread(self.queue.claim, worker_id)
+            if job is not None and self._stopping.is_set():
+                # Claimed while stopping: hand it back rather than start it
+                await asyncio.to_thread(self.queue.release, job["id"])
+                break
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            self._running_jobs[worker_id] = job
+            await asyncio.to_thread(self.queue.touch_worker, worker_id, True)
+            logger.info(f"👷 [{worker_id}] Running job {job['id']} for course {job['course_id']} (attempt {job['attempt']})")
+            # Own task, so a cancelled job doesn't take the worker loop down with it
+            task = asyncio.create_task(self.handler(job))
+            self._job_tasks[worker_id] = task
+            try:
+                await task
+                await asyncio.to_thread(self.queue.finish, job["id"], "completed")
+            except asyncio.CancelledError:
+                if self._stopping.is_set():
+                    raise
+                logger.info(f"🛑 [{worker_id}] Job {job['id']} cancelled")
+                await asyncio.to_thread(self.queue.finish, job["id"], "cancelled")
+            except Exception as e:
+                logger.error(f"💥 [{worker_id}] Job {job['id']} failed: {e}")
+                await asyncio.to_thread(self.queue.finish, job["id"], "failed", str(e))
+            finally:
+                self._running_jobs.pop(worker_id, None)
+                self._job_tasks.pop(worker_id, None)
+                self._cancelled.discard(job["id"])
+                await asyncio.to_thread(self.queue.touch_worker, worker_id, False)
+
+    def cancel_local(self, course_id: str) -> Optional[asyncio.Task]:
+        """Cancel the course's job if a worker of this pool runs it; returns the job task"""
+        for worker_id, job in list(self._running_jobs.items()):
+            task = self._job_tasks.get(worker_id)
+            if job["course_id"] == course_id and task is not None:
+                if job["id"] not in self._cancelled:
+                    self._cancelled.add(job["id"])
+                    task.cancel()
+                return task
+        return None
+
+    async def _heartbeat(self) -> None:
+        last_beat = time.monotonic()
+        while True:
+            await asyncio.sleep(min(self.cancel_check_interval, self.heartbeat_interval))
+            try:
+                # Cancellations requested through the queue (e.g. by another process)
+                courses = [job["course_id"] for job in self._running_jobs.values()]
+                for course_id in await asyncio.to_thread(self.queue.cancelling, courses):
+                    self.cancel_local(course_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Cancellation check failed: {e}")
+            if time.monotonic() - last_beat < self.heartbeat_interval:
+                continue
+            last_beat = time.monotonic()
+            for i in range(self.concurrency):
+                worker_id = f"{self.prefix}-{i}"
+                job = self._running_jobs.get(worker_id)
+                try:
+                    await asyncio.to_thread(self.queue.touch_worker, worker_id, job is not None)
+                    if job:
+                        await asyncio.to_thread(self.queue.heartbeat, job["id"], worker_id)
+                except Exception as e:
+                    logger.warning(f"⚠️ Worker heartbeat failed: {e}")
+
+    def stats(self) -> dict:
+        busy = len(self._running_jobs)
+        return {
+            "size": self.concurrency,
+            "busy": busy,
+            "utilisation": round(busy / self.concurrency, 2) if self.concurrency else 0.0,
+            "courses": [job["course_id"] for job in self._running_jobs.values()],
+        }
@@ -0,0 +1,307 @@
+"""
+LLM Result Cache
+================
+Content-addressed cache for Gemini and Groq responses.
+
+Entries are keyed by a hash of the prompt (whitespace collapsed), the model
+and the service pool, so the same prompt sent for the same purpose is only
+paid for once. Backends are pluggable (SQLite or plain files on disk) and both apply a
+TTL and size-based LRU eviction.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Set to True for the duration of a request that must skip the cache
+cache_bypass: ContextVar[bool] = ContextVar("cache_bypass", default=False)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalise_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share a key; case is significant"""
+    return _WHITESPACE_RE.sub(" ", prompt).strip()
+
+
+def make_cache_key(prompt: str, model: str, service: str) -> str:
+    """Build the content address for a prompt/model/service triple"""
+    material = "\x1f".join([service, model, normalise_prompt(prompt)])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """Storage interface for cached LLM responses"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Single-file SQLite cache with TTL and LRU eviction by total size.
+
+    Like DiskCacheBackend, writes keep a running total and the table is only summed
+    and swept for expired rows when that total passes max_bytes or every sweep_seconds.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, ttl_seconds: int, sweep_seconds: float = 600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None  # bytes in the table as of the last sweep, plus writes since
+        self._next_sweep = 0.0
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            if self._total is not None:
+                self._total += size - (replaced[0] if replaced else 0)
+            if self._total is None or self._total > self.max_bytes or now >= self._next_sweep:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under the low-water mark"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at ASC").fetchall():
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                total -= size
+                if total <= target:
+                    break
+        self._total = total
+        self._next_sweep = now + self.sweep_seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._total = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        return {"backend": "sqlite", "entries": count, "bytes": total, "max_bytes": self.max_bytes}
+
+
+class DiskCacheBackend(CacheBackend):
+    """One JSON file per entry; mtime is its created_at (for the TTL) and atime its last access (for LRU).
+
+    Writes keep a running total of the cache size. The directory is only scanned
+    when that total passes max_bytes (then trimmed to 90% of it, so the next
+    writes don't scan again) or every sweep_seconds. The periodic scan drops
+    expired entries and resyncs the total with writes from other processes.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, ttl_seconds: int, sweep_seconds: float = 600):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None  # bytes on disk as of the last scan, plus writes since
+        self._next_sweep = 0.0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if self.ttl_seconds and time.time() - entry["created_at"] > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path, (time.time(), entry["created_at"]))
+        return entry["value"]
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        created_at = time.time()
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"created_at": created_at, "value": value}, f)
+        os.utime(tmp, (created_at, created_at))
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        added = tmp.stat().st_size - replaced
+        os.replace(tmp, path)
+        now = time.time()
+        with self._lock:
+            if self._total is not None:
+                self._total += added
+            if self._total is None or self._total > self.max_bytes or now >= self._next_sweep:
+                self._evict(now)
+
+    def _entries(self) -> list:
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones until under the low-water mark"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size, _ in entries)
+        target = self.max_bytes if total <= self.max_bytes else int(self.max_bytes * 0.9)
+        # Least recently used first; expired entries can be anywhere in that order
+        for _, created_at, size, path in entries:
+            expired = self.ttl_seconds and now - created_at > self.ttl_seconds
+            if not expired and total <= target:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+        self._total = total
+        self._next_sweep = now + self.sweep_seconds
+
+    def clear(self) -> None:
+        for *_, path in self._entries():
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._total = 0
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "backend": "disk",
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+class LLMCache:
+    """Async front-end for a cache backend; blocking I/O runs in a thread"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, prompt: str, model: str, service: str) -> Optional[dict]:
+        if cache_bypass.get():
+            return None
+        key = make_cache_key(prompt, model, service)
+        try:
+            value = await asyncio.to_thread(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache read failed: {e}")
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, prompt: str, model: str, service: str, response: dict) -> None:
+        key = make_cache_key(prompt, model, service)
+        try:
+            await asyncio.to_thread(self.backend.set, key, json.dumps(response))
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache write failed: {e}")
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "hits": self.hits, "misses": self.misses}
+
+
+def create_cache_from_env(data_dir: Path) -> Optional[LLMCache]:
+    """Build the cache configured by LLM_CACHE_* env vars (None if disabled)"""
+    backend_name = os.getenv("LLM_CACHE_BACKEND", "sqlite").lower()
+    max_bytes = int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+    ttl_seconds = int(float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600)
+
+    if backend_name in ("none", "off", "disabled", ""):
+        return None
+    if backend_name == "disk":
+        path = Path(os.getenv("LLM_CACHE_PATH", data_dir / "llm_cache"))
+        backend = DiskCacheBackend(path, max_bytes, ttl_seconds)
+    elif backend_name == "sqlite":
+        path = Path(os.getenv("LLM_CACHE_PATH", data_dir / "llm_cache.sqlite3"))
+        backend = SQLiteCacheBackend(path, max_bytes, ttl_seconds)
+    else:
+        raise ValueError(f"Unknown LLM_CACHE_BACKEND: {backend_name}")
+
+    logger.info(f"🗄️ LLM cache enabled ({backend_name}, {max_bytes // (1024 * 1024)} MB, TTL {ttl_seconds}s)")
+    return LLMCache(backend)
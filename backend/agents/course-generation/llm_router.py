@@ -0,0 +1,139 @@
+"""
+LLM Router
+==========
+Picks the LLM provider for each task from live statistics. Every provider /
+model keeps a rolling window of call outcomes (success, error, 429) and a
+latency EWMA per task. Candidates allowed for a task (by quality tier) are
+ranked by expected completion time:
+
+    latency / success_rate + queueing behind in-flight calls + 429 cooldown
+
+The caller tries them in order, so a rate-limited or failing provider is
+skipped until its cooldown ends or its error rate recovers.
+"""
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+ProviderKey = Tuple[str, str]  # (provider, model)
+
+
+class ProviderStats:
+    """Rolling outcome window, per-task latency EWMA and 429 cooldown for one provider/model"""
+
+    def __init__(self, quality: int, parallelism: int, prior_latency_ms: float, window: int, alpha: float):
+        self.quality = quality
+        self.parallelism = max(1, parallelism)
+        self.prior_latency_ms = prior_latency_ms
+        self.alpha = alpha
+        self.outcomes = deque(maxlen=window)  # "ok" | "error" | "rate_limited"
+        self.latency_ms: Dict[str, float] = {}
+        self.inflight = 0
+        self.calls = 0
+        self.rate_limits = 0
+        self.consecutive_rate_limits = 0
+        self.cooldown_until = 0.0
+
+    def record(self, task: str, latency_ms: float, ok: bool) -> None:
+        self.calls += 1
+        self.outcomes.append("ok" if ok else "error")
+        if ok:
+            self.consecutive_rate_limits = 0
+            previous = self.latency_ms.get(task)
+            self.latency_ms[task] = latency_ms if previous is None else (
+                self.alpha * latency_ms + (1 - self.alpha) * previous
+            )
+
+    def rate_limited(self, base_cooldown: float, max_cooldown: float) -> None:
+        self.rate_limits += 1
+        self.consecutive_rate_limits += 1
+        self.outcomes.append("rate_limited")
+        cooldown = min(max_cooldown, base_cooldown * 2 ** (self.consecutive_rate_limits - 1))
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+    def rate(self, outcome: str) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o == outcome) / len(self.outcomes)
+
+    def expected_ms(self, task: str) -> float:
+        latency = self.latency_ms.get(task)
+        if latency is None:
+            # No sample for this task yet
+            latency = self.prior_latency_ms
+        success = max(0.1, 1.0 - self.rate("error") - self.rate("rate_limited"))
+        queueing = latency * self.inflight / self.parallelism
+        cooldown = max(0.0, self.cooldown_until - time.monotonic()) * 1000
+        return latency / success + queueing + cooldown
+
+    def as_dict(self) -> dict:
+        return {
+            "quality": self.quality,
+            "calls": self.calls,
+            "inflight": self.inflight,
+            "error_rate": round(self.rate("error"), 3),
+            "rate_limit_rate": round(self.rate("rate_limited"), 3),
+            "rate_limits": self.rate_limits,
+            "cooldown_seconds": round(max(0.0, self.cooldown_until - time.monotonic()), 1),
+            "latency_ms": {task: round(ms, 1) for task, ms in sorted(self.latency_ms.items())},
+        }
+
+
+class LLMRouter:
+    """Orders providers per task by expected completion time, within quality constraints"""
+
+    def __init__(
+        self,
+        task_min_quality: Dict[str, int],
+        window: int = 50,
+        alpha: float = 0.3,
+        base_cooldown: float = 5.0,
+        max_cooldown: float = 60.0,
+    ):
+        self.task_min_quality = task_min_quality
+        self.window = window
+        self.alpha = alpha
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.providers: Dict[ProviderKey, ProviderStats] = {}
+
+    def register(self, provider: str, model: str, quality: int, parallelism: int, prior_latency_ms: float) -> None:
+        self.providers[(provider, model)] = ProviderStats(
+            quality, parallelism, prior_latency_ms, self.window, self.alpha
+        )
+
+    def candidates(self, task: str) -> List[ProviderKey]:
+        """Providers allowed for the task, best expected completion time first"""
+        min_quality = self.task_min_quality.get(task, 0)
+        allowed = [key for key, stats in self.providers.items() if stats.quality >= min_quality]
+        return sorted(allowed, key=lambda key: self.providers[key].expected_ms(task))
+
+    @contextmanager
+    def inflight(self, provider: str, model: str):
+        stats = self.providers.get((provider, model))
+        if stats is None:
+            yield
+            return
+        stats.inflight += 1
+        try:
+            yield
+        finally:
+            stats.inflight -= 1
+
+    def record(self, provider: str, model: str, task: str, latency_ms: float, ok: bool) -> None:
+        stats = self.providers.get((provider, model))
+        if stats is not None:
+            stats.record(task, latency_ms, ok)
+
+    def rate_limited(self, provider: str, model: str) -> None:
+        stats = self.providers.get((provider, model))
+        if stats is not None:
+            stats.rate_limited(self.base_cooldown, self.max_cooldown)
+
+    def stats(self) -> dict:
+        return {
+            "providers": {f"{p}/{m}": stats.as_dict() for (p, m), stats in self.providers.items()},
+            "routes": {task: [f"{p}/{m}" for p, m in self.candidates(task)] for task in self.task_min_quality},
+        }
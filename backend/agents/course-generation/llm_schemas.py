@@ -0,0 +1,64 @@
+"""
+LLM Response Schemas
+====================
+Pydantic shapes of the JSON the generators ask for. They are sent to the
+LLM as response schemas and used to validate what comes back.
+"""
+
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class OutlineChapter(BaseModel):
+    title: str
+    level: str = "intermediate"
+    objectives: List[str] = []
+    keyConcepts: List[str] = []
+    estimatedMinutes: int = 15
+
+
+class Outline(BaseModel):
+    chapters: List[OutlineChapter] = Field(min_length=1)
+
+
+# Requested shape of a new outline; Gemini enforces the chapter count through the schema.
+# Responses are still validated as Outline, so a short one can be extended instead of discarded.
+# (No docstring: gemini_schema sends a model's docstring to Gemini as the schema description.)
+class CourseOutlineRequest(Outline):
+    chapters: List[OutlineChapter] = Field(min_length=5, max_length=7)
+
+
+class Flashcard(BaseModel):
+    question: str
+    answer: str
+
+
+class MCQ(BaseModel):
+    question: str
+    options: List[str] = Field(min_length=2)
+    correct: str
+    explanation: str = ""
+
+
+class WordGameItem(BaseModel):
+    word: str
+    correct: str
+    incorrect: List[str] = Field(min_length=1)
+
+
+class FAQItem(BaseModel):
+    question: str
+    answer: str
+
+
+class Suggestion(BaseModel):
+    topic: str
+    description: str = ""
+
+
+class PracticeSet(BaseModel):
+    """Flashcards, MCQs and word games requested together in one call"""
+    flashcards: List[Flashcard]
+    mcqs: List[MCQ]
+    word_games: List[WordGameItem]
@@ -7,14 +7,18 @@ Generates complete courses in ~40 seconds with audio, articles, quizzes, and gam
 """
 
 import asyncio
+import hashlib
 import json
 import logging
 import os
-import re
-from collections import deque
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
+from urllib.parse import urlparse
 
 from dotenv import load_dotenv
 
@@ -25,15 +29,63 @@ load_dotenv(dotenv_path=env_path)
 
 import httpx
 import uvicorn
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+from audio_storage import audio_key, create_audio_storage_from_env, iterate_file, parse_range
+from brave_search import BraveSearch
+from cpu_pool import create_cpu_pool_from_env
+from html_postprocess import postprocess_html
+from job_queue import JobQueue, WorkerPool
+from llm_cache import cache_bypass, create_cache_from_env
+from llm_router import LLMRouter
+from llm_schemas import CourseOutlineRequest, FAQItem, Flashcard, MCQ, Outline, PracticeSet, Suggestion, WordGameItem
+from postgrest import PostgrestClient
+from progress_reporter import ProgressReporter
+from progress_stream import ProgressBus
+from structured_output import StructuredOutputError, gemini_schema, is_list_schema, parse_sections, parse_structured
+from timeline import Timeline, current_timeline, load_pricing, record_span, span_status, timeline_stage
+from topic_cache import create_topic_cache_from_env
+from topic_index import TopicIndex
+from tts import ElevenLabsTTS, TTSError
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Course Generation Service - Oboe Style", version="2.0.0")
+# In-process generation workers (started in lifespan when GENERATION_WORKERS > 0)
+worker_pool: Optional[WorkerPool] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the embedded generation worker pool."""
+    global worker_pool
+    
+    # Startup
+    await CPU_POOL.start()
+    if GENERATION_WORKERS > 0:
+        worker_pool = WorkerPool(JOB_QUEUE, run_generation_job, concurrency=GENERATION_WORKERS,
+                                 shutdown_grace=GENERATION_SHUTDOWN_GRACE_SECONDS)
+        await worker_pool.start()
+    else:
+        logger.info("ℹ️ GENERATION_WORKERS=0 - jobs will be processed by external workers (worker.py)")
+    
+    yield
+    
+    # Shutdown
+    if worker_pool:
+        await worker_pool.stop()
+        worker_pool = None
+    await progress_bus.flush()
+    await progress_reporter.flush_all()
+    await postgrest.aclose()
+    await tts.aclose()
+    await brave.aclose()
+    CPU_POOL.shutdown()
+
+app = FastAPI(title="Course Generation Service - Oboe Style", version="2.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -124,24 +176,173 @@ FLASHCARD_SEMAPHORE = asyncio.Semaphore(2)
 GAME_SEMAPHORE = asyncio.Semaphore(1)
 ARTICLE_SEMAPHORE = asyncio.Semaphore(1)
 
+SERVICE_SEMAPHORES = {
+    "chapter": CHAPTER_SEMAPHORE,
+    "quiz": QUIZ_SEMAPHORE,
+    "flashcard": FLASHCARD_SEMAPHORE,
+    "game": GAME_SEMAPHORE,
+    "article": ARTICLE_SEMAPHORE
+}
+
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 BRAVE_API_KEY = os.getenv("BRAVE_SEARCH_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-async def call_gemini_with_retry(prompt: str, service: str = "chapter", max_retries: int = 5) -> dict:
-    """Call Gemini with retry and service-specific rate limiting"""
+# Provider endpoints (overridable so benchmarks can point them at local stubs)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+BRAVE_BASE_URL = os.getenv("BRAVE_BASE_URL", "https://api.search.brave.com/res/v1").rstrip("/")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1").rstrip("/")
+
+# One pooled PostgREST client for every Supabase call in this service
+postgrest = PostgrestClient(
+    SUPABASE_URL,
+    SUPABASE_SERVICE_KEY,
+    max_connections=int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20")),
+)
+
+GEMINI_MODEL = "gemini-2.0-flash-exp"
+GROQ_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+# Provider routing: each task only goes to providers at or above its quality tier
+# (gemini 2, groq 1), ranked by live latency / error / 429 statistics
+LLM_TASK_MIN_QUALITY = {
+    "outline": 2,
+    "chapter": 2,
+    "article": 2,
+    "flashcard": 1,
+    "quiz": 1,
+    "game": 1,
+    "practice": 1,
+    "audio_script": 1,
+    **json.loads(os.getenv("LLM_TASK_MIN_QUALITY", "{}")),
+}
+# Gemini key pool used for tasks that aren't themselves a key pool name
+TASK_SERVICES = {"outline": "chapter", "audio_script": "chapter", "practice": "quiz"}
+LLM_ROUTER = LLMRouter(LLM_TASK_MIN_QUALITY)
+if GEMINI_API_KEYS:
+    LLM_ROUTER.register("gemini", GEMINI_MODEL, quality=2, parallelism=len(GEMINI_API_KEYS), prior_latency_ms=8000)
+if GROQ_KEYS:
+    LLM_ROUTER.register("groq", GROQ_MODEL, quality=1, parallelism=len(GROQ_KEYS), prior_latency_ms=3000)
+
+# Per-course span timelines: USD prices for cost estimates, and the courses generating in this process
+API_PRICING = load_pricing()
+ACTIVE_TIMELINES: Dict[str, Timeline] = {}
+
+# Outlines shorter than this are extended with a follow-up call for the missing chapters
+OUTLINE_MIN_CHAPTERS = 5
+
+# Ask for flashcards, MCQs and word games in one structured call instead of three
+PRACTICE_FUSION = os.getenv("PRACTICE_FUSION", "false").lower() == "true"
+PRACTICE_SECTIONS = ("flashcards", "mcqs", "word_games")
+
+# Stream chapter HTML as it is generated, flushing partial content to course_chapters
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "false").lower() == "true"
+STREAM_CHECKPOINT_CHARS = int(os.getenv("STREAM_CHECKPOINT_CHARS", "2000"))
+
+# Local state (LLM cache etc.) lives next to the service unless overridden
+DATA_DIR = Path(os.getenv("COURSE_GEN_DATA_DIR", Path(__file__).parent / "data"))
+
+# Persistent LLM response cache (None when LLM_CACHE_BACKEND=none)
+LLM_CACHE = create_cache_from_env(DATA_DIR)
+
+# Durable generation queue shared by the API and every worker process
+JOB_QUEUE = JobQueue(
+    DATA_DIR / "job_queue.sqlite3",
+    lease_seconds=int(os.getenv("GENERATION_JOB_LEASE_SECONDS", "60")),
+    max_attempts=int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", "3")),
+    # Admission control: courses generating at once (all workers) and per user; 0 = unlimited
+    max_inflight=int(os.getenv("GENERATION_MAX_INFLIGHT", "4")),
+    max_per_user=int(os.getenv("GENERATION_MAX_PER_USER", "2")),
+)
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+
+# Live progress events for /courses/{id}/stream subscribers, relayed through the queue
+# database so the API streams jobs running in worker.py processes too
+progress_bus = ProgressBus(relay=JOB_QUEUE)
+# Waiting courses a single user may have queued before new requests are refused
+GENERATION_MAX_QUEUED_PER_USER = int(os.getenv("GENERATION_MAX_QUEUED_PER_USER", "5"))
+# How long cancel/delete waits for a local job to abort and clean up
+GENERATION_CANCEL_WAIT_SECONDS = float(os.getenv("GENERATION_CANCEL_WAIT_SECONDS", "10"))
+# How long a stopping worker lets in-flight jobs finish before interrupting them
+GENERATION_SHUTDOWN_GRACE_SECONDS = float(os.getenv("GENERATION_SHUTDOWN_GRACE_SECONDS", "20"))
+
+# Near-duplicate topics are cloned from previously generated courses
+TOPIC_REUSE_ENABLED = os.getenv("TOPIC_REUSE_ENABLED", "true").lower() == "true"
+TOPIC_REUSE_THRESHOLD = float(os.getenv("TOPIC_REUSE_THRESHOLD", "0.8"))
+TOPIC_INDEX = TopicIndex(DATA_DIR / "topic_index.sqlite3") if TOPIC_REUSE_ENABLED else None
+
+# Long scripts are synthesised as concurrent sentence-aligned chunks, cached per chunk
+tts = ElevenLabsTTS(
+    ELEVENLABS_API_KEY,
+    DATA_DIR / "tts_chunks",
+    base_url=ELEVENLABS_BASE_URL,
+    chunk_chars=int(os.getenv("TTS_CHUNK_CHARS", "2500")),
+    concurrency=int(os.getenv("TTS_CONCURRENCY", "3")),
+    chunk_ttl_seconds=float(os.getenv("TTS_CHUNK_TTL_HOURS", "24")) * 3600,
+)
+
+# Brave resources and suggestions depend only on the topic: reused for TOPIC_CACHE_TTL_HOURS
+TOPIC_CACHE = create_topic_cache_from_env(DATA_DIR)
+brave = BraveSearch(BRAVE_API_KEY, base_url=BRAVE_BASE_URL)
+
+# HTML post-processing and JSON repair run in worker processes, off the event loop
+CPU_POOL = create_cpu_pool_from_env(preload=["html_postprocess", "structured_output", "llm_schemas"])
+
+# Synthesised audio, content-addressed by script + voice so identical scripts are stored once
+AUDIO_STORAGE = create_audio_storage_from_env(DATA_DIR)
+
+# Generated content tables: committed together and copied into / out of course templates
+CONTENT_TABLES = [
+    "course_chapters",
+    "course_flashcards",
+    "course_mcqs",
+    "course_articles",
+    "course_word_games",
+    "course_audio",
+    "course_resources",
+    "course_suggestions",
+]
+TEMPLATE_DROP_FIELDS = {"id", "course_id", "chapter_id", "created_at", "updated_at"}
+# Artefacts that can be regenerated on their own, and the table each one fills
+ARTEFACT_TABLES = {
+    "flashcards": "course_flashcards",
+    "mcqs": "course_mcqs",
+    "word_games": "course_word_games",
+    "articles": "course_articles",
+    "audio": "course_audio",
+    "resources": "course_resources",
+    "suggestions": "course_suggestions",
+}
+# course_progress references these rows ON DELETE CASCADE: regeneration rewrites them in place
+PROGRESS_REFERENCED_TABLES = {"course_flashcards", "course_mcqs"}
+
+async def call_gemini_with_retry(prompt: str, service: str = "chapter", max_retries: int = 5, use_cache: bool = True,
+                                response_schema: Optional[dict] = None, task: Optional[str] = None) -> dict:
+    """Call Gemini with retry and service-specific rate limiting.
+    
+    With response_schema, Gemini runs in JSON mode constrained to that schema.
+    Latency and outcome are recorded in the LLM router under `task` (default: service).
+    """
+    body = {"contents": [{"parts": [{"text": prompt}]}]}
+    cache_model = GEMINI_MODEL
+    if response_schema:
+        body["generationConfig"] = {"responseMimeType": "application/json", "responseSchema": response_schema}
+        cache_model = f"{GEMINI_MODEL}:json"
+    
+    if LLM_CACHE and use_cache:
+        cached = await LLM_CACHE.get(prompt, cache_model, service)
+        if cached is not None:
+            logger.info(f"♻️ [{service}] Served from LLM cache")
+            record_span("gemini", task or service, time.perf_counter(), status="cache_hit")
+            return cached
+    
     # Select semaphore based on service
-    semaphores = {
-        "chapter": CHAPTER_SEMAPHORE,
-        "quiz": QUIZ_SEMAPHORE,
-        "flashcard": FLASHCARD_SEMAPHORE,
-        "game": GAME_SEMAPHORE,
-        "article": ARTICLE_SEMAPHORE
-    }
-    semaphore = semaphores.get(service, CHAPTER_SEMAPHORE)
+    semaphore = SERVICE_SEMAPHORES.get(service, CHAPTER_SEMAPHORE)
     
     async with semaphore:  # Limit concurrent calls per service
+        start = time.perf_counter()
         for attempt in range(max_retries):
             try:
                 # Progressive delay based on attempt
@@ -150,16 +351,16 @@ async def call_gemini_with_retry(prompt: str, service: str = "chapter", max_retr
                 api_key = get_key_for_service(service)
                 
                 async with httpx.AsyncClient(timeout=45.0) as client:  # Increased timeout
+                    attempt_start = time.perf_counter()
                     response = await client.post(
-                        f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
-                        json={
-                            "contents": [{
-                                "parts": [{"text": prompt}]
-                            }]
-                        }
+                        f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent?key={api_key}",
+                        json=body
                     )
+                    if response.status_code >= 400:
+                        record_span("gemini", task or service, attempt_start, status=span_status(response), attempt=attempt, key=api_key)
                     
                     if response.status_code == 429:
+                        LLM_ROUTER.rate_limited("gemini", GEMINI_MODEL)
                         if attempt < max_retries - 1:
                             wait = 2 ** attempt
                             logger.warning(f"⏳ [{service}] Rate limited, retrying in {wait}s...")
@@ -168,58 +369,163 @@ async def call_gemini_with_retry(prompt: str, service: str = "chapter", max_retr
                         else:
                             # Last attempt - try fallback to general key pool
                             logger.warning(f"⚠️ [{service}] All service keys rate limited, falling back to general key pool")
-                            fallback_key = get_key_for_service("chapter")  # Use chapter pool as fallback
+                            api_key = get_key_for_service("chapter")  # Use chapter pool as fallback
+                            attempt_start = time.perf_counter()
                             response = await client.post(
-                                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={fallback_key}",
-                                json={
-                                    "contents": [{
-                                        "parts": [{"text": prompt}]
-                                    }]
-                                }
+                                f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent?key={api_key}",
+                                json=body
                             )
+                            if response.status_code >= 400:
+                                record_span("gemini", task or service, attempt_start, status=span_status(response), attempt=attempt + 1, key=api_key)
                             if response.status_code == 429:
                                 raise HTTPException(status_code=429, detail=f"Gemini API rate limit exceeded for {service} (even with fallback)")
                     
                     response.raise_for_status()
                     logger.info(f"✅ [{service}] API call successful")
-                    return response.json()
+                    data = response.json()
+                    usage = data.get("usageMetadata", {})
+                    record_span("gemini", task or service, attempt_start, attempt=attempt, key=api_key,
+                                input_tokens=usage.get("promptTokenCount"), output_tokens=usage.get("candidatesTokenCount"))
+                    LLM_ROUTER.record("gemini", GEMINI_MODEL, task or service, (time.perf_counter() - start) * 1000, ok=True)
+                    if LLM_CACHE and use_cache:
+                        await LLM_CACHE.set(prompt, cache_model, service, data)
+                    return data
                     
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429 and attempt < max_retries - 1:
                     logger.warning(f"⚠️ [{service}] HTTP 429 error, retrying... (attempt {attempt+1}/{max_retries})")
                     continue
                 logger.error(f"💥 [{service}] HTTP Error {e.response.status_code}: {e.response.text[:200]}")
+                LLM_ROUTER.record("gemini", GEMINI_MODEL, task or service, (time.perf_counter() - start) * 1000, ok=False)
                 raise
             except Exception as e:
+                if isinstance(e, httpx.TransportError):
+                    record_span("gemini", task or service, attempt_start, status="error", attempt=attempt, key=api_key)
                 if attempt < max_retries - 1:
                     logger.warning(f"⚠️ [{service}] Attempt {attempt+1} failed, retrying...")
                     continue
                 logger.error(f"💥 [{service}] Failed after {max_retries} attempts: {e}")
+                LLM_ROUTER.record("gemini", GEMINI_MODEL, task or service, (time.perf_counter() - start) * 1000, ok=False)
+                raise
+    
+    raise Exception(f"Max retries exceeded for {service}")
+
+async def call_gemini_stream(prompt: str, on_text, service: str = "chapter", max_retries: int = 5, use_cache: bool = True) -> dict:
+    """Call Gemini's streaming endpoint, passing accumulated text to on_text as it arrives.
+    
+    Returns the same shape as generateContent so callers can stay agnostic.
+    """
+    if LLM_CACHE and use_cache:
+        cached = await LLM_CACHE.get(prompt, GEMINI_MODEL, service)
+        if cached is not None:
+            logger.info(f"♻️ [{service}] Served from LLM cache")
+            record_span("gemini", service, time.perf_counter(), status="cache_hit")
+            await on_text(cached["candidates"][0]["content"]["parts"][0]["text"], True)
+            return cached
+    
+    semaphore = SERVICE_SEMAPHORES.get(service, CHAPTER_SEMAPHORE)
+    
+    async with semaphore:
+        for attempt in range(max_retries):
+            text = ""
+            usage = {}
+            try:
+                await asyncio.sleep(0.3 * (attempt + 1))
+                api_key = get_key_for_service(service)
+                
+                async with httpx.AsyncClient(timeout=httpx.Timeout(45.0, read=90.0)) as client:
+                    attempt_start = time.perf_counter()
+                    async with client.stream(
+                        "POST",
+                        f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={api_key}",
+                        json={"contents": [{"parts": [{"text": prompt}]}]}
+                    ) as response:
+                        if response.status_code >= 400:
+                            record_span("gemini", service, attempt_start, status=span_status(response), attempt=attempt, key=api_key)
+                        if response.status_code == 429 and attempt < max_retries - 1:
+                            wait = 2 ** attempt
+                            logger.warning(f"⏳ [{service}] Rate limited (stream), retrying in {wait}s...")
+                            await asyncio.sleep(wait)
+                            continue
+                        if response.status_code != 200:
+                            await response.aread()
+                        response.raise_for_status()
+                        
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            chunk = json.loads(line[5:].strip())
+                            usage = chunk.get("usageMetadata", usage)  # running totals, complete in the last chunk
+                            for candidate in chunk.get("candidates", [])[:1]:
+                                for part in candidate.get("content", {}).get("parts", []):
+                                    text += part.get("text", "")
+                            await on_text(text, False)
+                
+                record_span("gemini", service, attempt_start, attempt=attempt, key=api_key,
+                            input_tokens=usage.get("promptTokenCount"), output_tokens=usage.get("candidatesTokenCount"))
+                await on_text(text, True)
+                logger.info(f"✅ [{service}] Streaming call successful ({len(text)} chars)")
+                data = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+                if LLM_CACHE and use_cache:
+                    await LLM_CACHE.set(prompt, GEMINI_MODEL, service, data)
+                return data
+                
+            except Exception as e:
+                if isinstance(e, httpx.TransportError):
+                    record_span("gemini", service, attempt_start, status="error", attempt=attempt, key=api_key)
+                if attempt < max_retries - 1:
+                    logger.warning(f"⚠️ [{service}] Streaming attempt {attempt+1} failed, retrying...")
+                    continue
+                logger.error(f"💥 [{service}] Streaming failed after {max_retries} attempts: {e}")
                 raise
     
     raise Exception(f"Max retries exceeded for {service}")
 
-async def call_groq_with_retry(prompt: str, max_retries: int = 3) -> dict:
-    """Call Groq API with retry (faster than Gemini for text generation)"""
+async def call_groq_with_retry(prompt: str, max_retries: int = 3, use_cache: bool = True, json_mode: bool = False,
+                              task: str = "groq") -> dict:
+    """Call Groq API with retry (faster than Gemini for text generation).
+    
+    json_mode requests a JSON object response (the prompt must mention JSON).
+    Latency and outcome are recorded in the LLM router under `task`.
+    """
+    body = {
+        "model": GROQ_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.7
+    }
+    cache_model = GROQ_MODEL
+    if json_mode:
+        body["response_format"] = {"type": "json_object"}
+        cache_model = f"{GROQ_MODEL}:json"
+    
+    if LLM_CACHE and use_cache:
+        cached = await LLM_CACHE.get(prompt, cache_model, "groq")
+        if cached is not None:
+            logger.info("♻️ [groq] Served from LLM cache")
+            record_span("groq", task, time.perf_counter(), status="cache_hit")
+            return cached
+    
+    start = time.perf_counter()
     for attempt in range(max_retries):
         try:
             await asyncio.sleep(0.5 * (attempt + 1))
             api_key = get_key_for_service("groq")
             
             async with httpx.AsyncClient(timeout=30.0) as client:
+                attempt_start = time.perf_counter()
                 response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
+                    f"{GROQ_BASE_URL}/chat/completions",
                     headers={
                         "Authorization": f"Bearer {api_key}",
                         "Content-Type": "application/json"
                     },
-                    json={
-                        "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.7
-                    }
+                    json=body
                 )
+                if response.status_code >= 400:
+                    record_span("groq", task, attempt_start, status=span_status(response), attempt=attempt, key=api_key)
                 
+                if response.status_code == 429:
+                    LLM_ROUTER.rate_limited("groq", GROQ_MODEL)
                 if response.status_code == 429 and attempt < max_retries - 1:
                     await asyncio.sleep(2 ** attempt)
                     logger.warning(f"⏳ [groq] Rate limited, retrying in {2 ** attempt}s...")
@@ -227,20 +533,95 @@ async def call_groq_with_retry(prompt: str, max_retries: int = 3) -> dict:
                 
                 response.raise_for_status()
                 logger.info(f"✅ [groq] API call successful")
-                return response.json()
+                data = response.json()
+                usage = data.get("usage", {})
+                record_span("groq", task, attempt_start, attempt=attempt, key=api_key,
+                            input_tokens=usage.get("prompt_tokens"), output_tokens=usage.get("completion_tokens"))
+                LLM_ROUTER.record("groq", GROQ_MODEL, task, (time.perf_counter() - start) * 1000, ok=True)
+                if LLM_CACHE and use_cache:
+                    await LLM_CACHE.set(prompt, cache_model, "groq", data)
+                return data
                 
         except Exception as e:
+            if isinstance(e, httpx.TransportError):
+                record_span("groq", task, attempt_start, status="error", attempt=attempt, key=api_key)
             if attempt == max_retries - 1:
                 logger.error(f"💥 [groq] Failed after {max_retries} attempts: {e}")
+                LLM_ROUTER.record("groq", GROQ_MODEL, task, (time.perf_counter() - start) * 1000, ok=False)
                 raise
             logger.warning(f"⚠️ [groq] Attempt {attempt+1} failed, retrying...")
     
     raise Exception("Groq API max retries exceeded")
 
+async def call_llm(prompt: str, task: str, schema=None, use_cache: bool = True, request_schema=None) -> str:
+    """Route a prompt to the provider with the best expected completion time for the task.
+    
+    Providers are tried in the router's order; all but the last get a short retry budget
+    so a rate-limited provider fails over quickly instead of backing off for minutes.
+    With a schema, the call runs in the provider's JSON mode; Gemini is constrained to
+    request_schema when given (e.g. stricter counts than the response is validated against).
+    """
+    candidates = LLM_ROUTER.candidates(task)
+    if not candidates:
+        raise Exception(f"No LLM provider configured for {task}")
+    
+    for i, (provider, model) in enumerate(candidates):
+        last = i == len(candidates) - 1
+        try:
+            with LLM_ROUTER.inflight(provider, model):
+                if provider == "gemini":
+                    data = await call_gemini_with_retry(
+                        prompt,
+                        service=TASK_SERVICES.get(task, task),
+                        max_retries=5 if last else 2,
+                        use_cache=use_cache,
+                        response_schema=gemini_schema(request_schema or schema) if schema is not None else None,
+                        task=task
+                    )
+                    return data["candidates"][0]["content"]["parts"][0]["text"]
+                
+                if schema is not None and is_list_schema(schema):
+                    # JSON object mode can't return a bare array
+                    prompt = f'{prompt}\n\nRespond with a JSON object whose only key "items" holds the list.'
+                data = await call_groq_with_retry(
+                    prompt,
+                    max_retries=3 if last else 1,
+                    use_cache=use_cache,
+                    json_mode=schema is not None,
+                    task=task
+                )
+                return data["choices"][0]["message"]["content"]
+        except Exception as e:
+            if last:
+                raise
+            logger.warning(f"↪️ [{task}] {provider} failed ({e}), falling back to {candidates[i + 1][0]}")
+
+async def generate_structured(prompt: str, schema, task: str = "chapter", sections: Optional[dict] = None,
+                              request_schema=None):
+    """Route a structured (JSON mode) call and return validated pydantic objects.
+    
+    With sections ({name: item model}), each list in the response object is validated
+    independently (see parse_sections). Malformed JSON is repaired locally; only an
+    unusable response is retried, once, bypassing the cache so it isn't served again.
+    """
+    async def parse(text: str):
+        if sections:
+            return await CPU_POOL.run(parse_sections, text, sections)
+        return await CPU_POOL.run(parse_structured, text, schema)
+    
+    text = await call_llm(prompt, task, schema=schema, request_schema=request_schema)
+    try:
+        return await parse(text)
+    except StructuredOutputError as e:
+        logger.warning(f"⚠️ [{task}] Unusable structured response, retrying once: {e}")
+    return await parse(await call_llm(prompt, task, schema=schema, use_cache=False, request_schema=request_schema))
+
 # Models
 class CourseGenerationRequest(BaseModel):
     topic: str
     userId: str
+    bypassCache: bool = False  # Force fresh LLM calls for this course
+    streamChapters: Optional[bool] = None  # Defaults to GEMINI_STREAMING
 
 @app.get("/health")
 async def health_check():
@@ -256,16 +637,40 @@ async def health_check():
         "article_keys": len(ARTICLE_KEYS),
         "groq_keys": len(GROQ_KEYS),
         "has_elevenlabs": bool(ELEVENLABS_API_KEY),
-        "has_brave": bool(BRAVE_API_KEY)
+        "has_brave": bool(BRAVE_API_KEY),
+        "llm_cache": LLM_CACHE.stats() if LLM_CACHE else None,
+        "topic_index": TOPIC_INDEX.stats() if TOPIC_INDEX else None,
+        "progress_writes": progress_reporter.stats(),
+        "supabase_tables": postgrest.stats(),
+        "tts": tts.stats(),
+        "brave": brave.stats(),
+        "topic_cache": TOPIC_CACHE.stats() if TOPIC_CACHE else None,
+        "cpu_pool": CPU_POOL.stats(),
+        "audio_storage": AUDIO_STORAGE.stats(),
+        "llm_router": LLM_ROUTER.stats()
     }
 
+@app.get("/queue/stats")
+async def queue_stats():
+    """Queue depth and worker utilisation across all worker processes."""
+    stats = await asyncio.to_thread(JOB_QUEUE.stats)
+    stats["local_pool"] = worker_pool.stats() if worker_pool else None
+    return stats
+
 @app.post("/generate-course-parallel")
-async def generate_course_parallel(request: CourseGenerationRequest, background_tasks: BackgroundTasks):
+async def generate_course_parallel(request: CourseGenerationRequest):
     """Generate course with parallel AI agents"""
     
     if not GEMINI_API_KEYS:
         raise HTTPException(status_code=500, detail="Gemini API key not configured")
     
+    queued = await asyncio.to_thread(JOB_QUEUE.queued_count, request.userId)
+    if GENERATION_MAX_QUEUED_PER_USER and queued >= GENERATION_MAX_QUEUED_PER_USER:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{queued} courses are already waiting to generate; try again when one has started"
+        )
+    
     try:
         logger.info(f"🚀 Starting course generation: {request.topic}")
         
@@ -275,19 +680,27 @@ async def generate_course_parallel(request: CourseGenerationRequest, background_
         
         logger.info(f"✅ Course created: {course_id}, Job: {job_id}")
         
-        # Start background generation
-        background_tasks.add_task(
-            generate_in_parallel,
+        # Hand off to the durable queue; a generation worker picks it up
+        await asyncio.to_thread(
+            JOB_QUEUE.enqueue,
             course_id,
+            request.userId,
             request.topic,
-            request.userId
+            {
+                "bypass_cache": request.bypassCache,
+                "stream_chapters": GEMINI_STREAMING if request.streamChapters is None else request.streamChapters,
+            }
         )
+        queue = await report_queue_position(course_id)
+        average = await asyncio.to_thread(JOB_QUEUE.average_duration)
         
         return {
             "success": True,
             "courseId": course_id,
             "jobId": job_id,
-            "estimatedTime": 40
+            "queuePosition": queue["position"] if queue else 0,
+            "estimatedStartSeconds": queue["estimated_start_seconds"] if queue else 0,
+            "estimatedTime": round((queue["estimated_start_seconds"] if queue else 0) + average)
         }
         
     except Exception as e:
@@ -302,21 +715,16 @@ async def generate_course_parallel(request: CourseGenerationRequest, background_
 async def list_user_courses(user_id: str):
     """Return all courses for a user (newest first)."""
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(
-                f"{SUPABASE_URL}/rest/v1/courses",
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                },
-                params={
-                    "user_id": f"eq.{user_id}",
-                    "select": "*",
-                    "order": "created_at.desc",
-                },
-            )
-            r.raise_for_status()
-            return r.json()
+        r = await postgrest.get(
+            "courses",
+            params={
+                "user_id": f"eq.{user_id}",
+                "select": "*",
+                "order": "created_at.desc",
+            },
+        )
+        r.raise_for_status()
+        return r.json()
     except Exception as e:
         logger.error(f"Error listing courses: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -325,21 +733,16 @@ async def list_user_courses(user_id: str):
 async def get_course(course_id: str):
     """Return a single course by id."""
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(
-                f"{SUPABASE_URL}/rest/v1/courses",
-                headers={
-                    "apikey": SUPABASE_SERVICE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                },
-                params={
-                    "id": f"eq.{course_id}",
-                    "select": "*",
-                },
-            )
-            r.raise_for_status()
-            data = r.json()
-            return data[0] if data else {}
+        r = await postgrest.get(
+            "courses",
+            params={
+                "id": f"eq.{course_id}",
+                "select": "*",
+            },
+        )
+        r.raise_for_status()
+        data = r.json()
+        return data[0] if data else {}
     except Exception as e:
         logger.error(f"Error getting course: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -348,164 +751,487 @@ async def get_course(course_id: str):
 async def get_course_content(course_id: str):
     """Return all course content for a given course id."""
     try:
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-        }
-        async with httpx.AsyncClient() as client:
-            chapters_task = client.get(
-                f"{SUPABASE_URL}/rest/v1/course_chapters",
-                headers=headers,
-                params={"course_id": f"eq.{course_id}", "select": "*", "order": "order_index.asc"},
-            )
-            flashcards_task = client.get(
-                f"{SUPABASE_URL}/rest/v1/course_flashcards",
-                headers=headers,
+        chapters_r, flashcards_r, mcqs_r = await asyncio.gather(
+            postgrest.get(
+                "course_chapters",
+                params={"course_id": f"eq.{course_id}", "select": "*", "order": "order_number.asc"},
+            ),
+            postgrest.get(
+                "course_flashcards",
                 params={"course_id": f"eq.{course_id}", "select": "*"},
-            )
-            mcqs_task = client.get(
-                f"{SUPABASE_URL}/rest/v1/course_mcqs",
-                headers=headers,
+            ),
+            postgrest.get(
+                "course_mcqs",
                 params={"course_id": f"eq.{course_id}", "select": "*"},
-            )
-
-            chapters_r, flashcards_r, mcqs_r = await asyncio.gather(
-                chapters_task, flashcards_task, mcqs_task
-            )
+            ),
+        )
 
-            return {
-                "chapters": chapters_r.json(),
-                "flashcards": flashcards_r.json(),
-                "mcqs": mcqs_r.json(),
-            }
+        return {
+            "chapters": chapters_r.json(),
+            "flashcards": flashcards_r.json(),
+            "mcqs": mcqs_r.json(),
+        }
     except Exception as e:
         logger.error(f"Error getting course content: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Bundle sections: response key -> (table, columns for light=true, embedded order)
+BUNDLE_SECTIONS = {
+    "chapters": ("course_chapters", "id,title,order_number,estimated_reading_time", "order_number.asc"),
+    "flashcards": ("course_flashcards", "id,question,answer,difficulty", None),
+    "mcqs": ("course_mcqs", "*", None),
+    "articles": ("course_articles", "id,article_type,title,reading_time_minutes", None),
+    "word_games": ("course_word_games", "*", None),
+    "audio": ("course_audio", "id,audio_type,audio_url,duration_seconds,voice_used", None),
+    "resources": ("course_resources", "*", None),
+    "suggestions": ("course_suggestions", "*", "relevance_score.desc"),
+}
+BUNDLE_CACHE_TTL_SECONDS = int(os.getenv("BUNDLE_CACHE_TTL_SECONDS", "300"))
+BUNDLE_CACHE_SIZE = int(os.getenv("BUNDLE_CACHE_SIZE", "256"))
+
+# (course_id, sections, light) -> (expires_at, etag, bundle); published courses only
+bundle_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def invalidate_course_bundle(course_id: str):
+    """Drop every cached bundle variant for a course"""
+    for key in [k for k in bundle_cache if k[0] == course_id]:
+        bundle_cache.pop(key, None)
+
+@app.get("/courses/{course_id}/bundle")
+async def get_course_bundle(course_id: str, request: Request, include: Optional[str] = None, light: bool = False):
+    """Return the course and all of its content in one PostgREST round trip.
+    
+    `include` is a comma-separated subset of the bundle sections; `light=true` skips
+    heavy HTML/script bodies for list views. Responses carry an ETag derived from the
+    course version and honour If-None-Match.
+    """
+    sections = [s.strip() for s in include.split(",") if s.strip()] if include else list(BUNDLE_SECTIONS)
+    unknown = [s for s in sections if s not in BUNDLE_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown bundle sections: {', '.join(unknown)}")
+    
+    cache_key = (course_id, tuple(sections), light)
+    cached = bundle_cache.get(cache_key)
+    if cached and cached[0] > time.monotonic():
+        bundle_cache.move_to_end(cache_key)
+        _, etag, bundle = cached
+    else:
+        embeds = []
+        params = {"id": f"eq.{course_id}"}
+        for key in sections:
+            table, light_columns, order = BUNDLE_SECTIONS[key]
+            embeds.append(f"{key}:{table}({light_columns if light else '*'})")
+            if order:
+                params[f"{key}.order"] = order
+        params["select"] = ",".join(["*", *embeds])
+        
+        try:
+            r = await postgrest.get("courses", params=params)
+            r.raise_for_status()
+            rows = r.json()
+        except Exception as e:
+            logger.error(f"Error getting course bundle: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        if not rows:
+            raise HTTPException(status_code=404, detail="Course not found")
+        
+        bundle = rows[0]
+        version = f"{course_id}:{bundle.get('updated_at')}:{','.join(sections)}:{int(light)}"
+        etag = f'W/"{hashlib.sha1(version.encode()).hexdigest()[:16]}"'
+        # Only finished courses are stable enough to cache
+        if bundle.get("status") == "published":
+            bundle_cache[cache_key] = (time.monotonic() + BUNDLE_CACHE_TTL_SECONDS, etag, bundle)
+            while len(bundle_cache) > BUNDLE_CACHE_SIZE:
+                bundle_cache.popitem(last=False)
+    
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(resolve_audio_urls(bundle, str(request.base_url)), headers=headers)
+
+def resolve_audio_urls(bundle: dict, base_url: str) -> dict:
+    """Make audio URLs stored relative to this service (no AUDIO_PUBLIC_BASE_URL) absolute"""
+    audio = bundle.get("audio")
+    if not audio or not any((a.get("audio_url") or "").startswith("/") for a in audio):
+        return bundle
+    base_url = base_url.rstrip("/")
+    return {**bundle, "audio": [
+        {**a, "audio_url": f"{base_url}{a['audio_url']}"} if (a.get("audio_url") or "").startswith("/") else a
+        for a in audio
+    ]}
+
+@app.get("/courses/{course_id}/stages")
+async def get_course_stages(course_id: str):
+    """List checkpointed and failed generation stages for a course."""
+    checkpoints, failures = await asyncio.gather(
+        asyncio.to_thread(JOB_QUEUE.load_checkpoints, course_id),
+        asyncio.to_thread(JOB_QUEUE.load_failures, course_id),
+    )
+    return {
+        "courseId": course_id,
+        "completed": sorted(checkpoints),
+        "failed": failures,
+        "active": await asyncio.to_thread(JOB_QUEUE.active_job, course_id) is not None,
+    }
+
+@app.get("/courses/{course_id}/timeline")
+async def get_course_timeline(course_id: str, spans: bool = True):
+    """Span timeline of the course's latest generation run: per-stage latency, retries, tokens and API cost."""
+    live = ACTIVE_TIMELINES.get(course_id)
+    if live is not None:
+        timeline = {"status": "running", **live.summary(include_spans=spans)}
+    else:
+        timeline = await asyncio.to_thread(JOB_QUEUE.load_timeline, course_id)
+        if timeline is None:
+            raise HTTPException(status_code=404, detail="No generation timeline for this course")
+        if not spans:
+            timeline.pop("spans", None)
+    return {"courseId": course_id, **timeline}
+
+@app.get("/courses/{course_id}/queue")
+async def get_course_queue_position(course_id: str):
+    """Admission queue status of a course: running, or its position and estimated start."""
+    queue = await asyncio.to_thread(JOB_QUEUE.queue_position, course_id)
+    if queue is None:
+        raise HTTPException(status_code=404, detail="Course is not queued or generating")
+    return {"courseId": course_id, **queue}
+
+@app.post("/courses/{course_id}/cancel")
+async def cancel_course_generation(course_id: str):
+    """Stop a queued or running generation and discard its partial content; /resume can restart it."""
+    cancelled = await cancel_generation([course_id])
+    if course_id not in cancelled:
+        raise HTTPException(status_code=404, detail="Course is not queued or generating")
+    return {"success": True, "courseId": course_id, "cancelled": cancelled[course_id]}
+
+@app.post("/courses/{course_id}/chapters/{order_number}/regenerate")
+async def regenerate_course_chapter(course_id: str, order_number: int):
+    """Regenerate one chapter from the stored outline and replace just that row (its id is kept)."""
+    course, outline = await load_regeneration_context(course_id)
+    chapters = outline.get("chapters", [])
+    if not 1 <= order_number <= len(chapters):
+        raise HTTPException(status_code=404, detail=f"Course has no chapter {order_number}")
+    
+    timeline = start_regeneration(course_id)
+    try:
+        row = await generate_chapter(course_id, course["title"], chapters[order_number - 1], order_number)
+        if not row["content"]:
+            raise HTTPException(status_code=502, detail="Regenerated chapter was empty; the existing one is kept")
+        await replace_chapter_row(course_id, row)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"💥 Regenerating chapter {order_number} of {course_id} failed: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    await store_regenerated(course_id, f"chapter:{order_number}", row, "course_chapters", [row], key="order_number")
+    chapters_checkpoint = await asyncio.to_thread(JOB_QUEUE.load_checkpoint, course_id, "chapters")
+    if chapters_checkpoint:
+        chapters_checkpoint = [row if c.get("order_number") == order_number else c for c in chapters_checkpoint]
+        await asyncio.to_thread(JOB_QUEUE.save_checkpoint, course_id, "chapters", chapters_checkpoint)
+    logger.info(f"♻️ Regenerated chapter {order_number} of {course_id}")
+    return {"success": True, "courseId": course_id, "chapter": order_number, **regeneration_stats(timeline)}
+
+@app.post("/courses/{course_id}/regenerate/{artefact}")
+async def regenerate_course_artefact(course_id: str, artefact: str):
+    """Regenerate one artefact type (flashcards, mcqs, word_games, articles, audio, resources, suggestions)."""
+    table = ARTEFACT_TABLES.get(artefact)
+    if table is None:
+        raise HTTPException(status_code=400, detail=f"Unknown artefact '{artefact}'; expected one of {', '.join(ARTEFACT_TABLES)}")
+    course, outline = await load_regeneration_context(course_id)
+    topic = course["title"]
+    producers = {
+        "flashcards": lambda: generate_flashcards(course_id, topic),
+        "mcqs": lambda: generate_mcqs(course_id, topic),
+        "word_games": lambda: generate_word_games(course_id, topic),
+        "articles": lambda: generate_articles(course_id, topic),
+        "audio": lambda: regenerate_audio(course_id, topic, outline),
+        "resources": lambda: find_resources(course_id, topic),
+        "suggestions": lambda: generate_suggestions(course_id, topic),
+    }
+    
+    timeline = start_regeneration(course_id)
+    try:
+        rows = await producers[artefact]()
+        if not rows:
+            # Generators swallow their own errors; never replace good rows with nothing
+            raise HTTPException(status_code=502, detail=f"Regenerating {artefact} produced nothing; existing rows are kept")
+        if table in PROGRESS_REFERENCED_TABLES:
+            commit = await replace_rows_in_place(course_id, table, rows)
+        else:
+            fields = {"audio_generated": any(r.get("audio_url") for r in rows)} if artefact == "audio" else {}
+            commit = await commit_course_content(course_id, {table: rows}, fields)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"💥 Regenerating {artefact} of {course_id} failed: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    await store_regenerated(course_id, artefact, rows, table, rows)
+    logger.info(f"♻️ Regenerated {artefact} of {course_id} ({len(rows)} rows)")
+    return {
+        "success": True,
+        "courseId": course_id,
+        "artefact": artefact,
+        "rows": len(rows),
+        "commit_ms": commit["commit_ms"],
+        **regeneration_stats(timeline),
+    }
+
+@app.post("/courses/{course_id}/resume")
+async def resume_course_generation(course_id: str):
+    """Re-run only the missing or failed stages of an existing course."""
+    if await asyncio.to_thread(JOB_QUEUE.active_job, course_id):
+        raise HTTPException(status_code=409, detail="Course generation is already queued or running")
+    
+    course = await get_course(course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    checkpoints, failures = await asyncio.gather(
+        asyncio.to_thread(JOB_QUEUE.load_checkpoints, course_id),
+        asyncio.to_thread(JOB_QUEUE.load_failures, course_id),
+    )
+    
+    try:
+        await update_course_field(course_id, {"status": "generating"})
+        await reopen_generation_job(course_id)
+        job_id = await asyncio.to_thread(
+            JOB_QUEUE.enqueue,
+            course_id,
+            course["user_id"],
+            course["title"],
+            {"stream_chapters": GEMINI_STREAMING}
+        )
+        queue = await report_queue_position(course_id)
+    except Exception as e:
+        logger.error(f"💥 Error resuming course {course_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info(f"🔁 Resume queued for {course_id}: {len(checkpoints)} stages done, retrying {list(failures)}")
+    return {
+        "success": True,
+        "courseId": course_id,
+        "jobId": job_id,
+        "completedStages": sorted(checkpoints),
+        "retryingStages": sorted(failures),
+        "queuePosition": queue["position"] if queue else 0,
+    }
+
+@app.api_route("/audio/{filename}", methods=["GET", "HEAD"])
+async def get_audio(filename: str, request: Request):
+    """Serve stored TTS audio with HTTP range support (seeking in <audio> players)"""
+    key = filename.removesuffix(".mp3")
+    try:
+        size = await asyncio.to_thread(AUDIO_STORAGE.size, key)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Content-addressed: the bytes behind a key never change
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": f'"{key}"',
+    }
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    start, end = byte_range or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type="audio/mpeg")
+    return StreamingResponse(
+        iterate_file(AUDIO_STORAGE, key, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type="audio/mpeg"
+    )
+
+async def finished_generation_event(course_id: str) -> Optional[dict]:
+    """The terminal progress event of a course whose generation is over, or None while it may still run"""
+    if await asyncio.to_thread(JOB_QUEUE.active_job, course_id) is not None:
+        return None
+    try:
+        r = await postgrest.get(
+            "course_generation_jobs",
+            params={"course_id": f"eq.{course_id}", "select": "status,error_message"},
+        )
+        r.raise_for_status()
+        jobs = r.json()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read the generation job of {course_id}: {e}")
+        return None
+    status = jobs[0]["status"] if jobs else None
+    if status == "completed":
+        return {"type": "completed", "progress": 100}
+    if status == "failed":
+        return {"type": "failed", "error": jobs[0].get("error_message")}
+    if status == "cancelled":
+        return {"type": "cancelled"}
+    return None
+
+@app.get("/courses/{course_id}/stream")
+async def stream_course_progress(course_id: str):
+    """Server-Sent Events feed of progress and partial chapters for a generating course."""
+    r = await postgrest.get("courses", params={"id": f"eq.{course_id}", "select": "id"})
+    if r.status_code != 200 or not r.json():
+        raise HTTPException(status_code=404, detail="Course not found")
+    return StreamingResponse(
+        progress_bus.subscribe(course_id, finished=lambda: finished_generation_event(course_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.delete("/courses/{course_id}")
 async def delete_course(course_id: str):
     """Delete course and all related content (cascade delete)"""
+    logger.info(f"🗑️  Deleting course: {course_id}")
     try:
-        logger.info(f"🗑️  Deleting course: {course_id}")
-        headers = {
-            "apikey": SUPABASE_SERVICE_KEY,
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-        }
-        
-        async with httpx.AsyncClient() as client:
-            # Delete course (will cascade to related tables if foreign keys are set up)
-            # If cascade doesn't work, delete related content first
-            try:
-                # Try to delete related content first (in case cascade isn't configured)
-                related_tables = [
-                    "course_chapters",
-                    "course_flashcards",
-                    "course_mcqs",
-                    "course_articles",
-                    "course_word_games",
-                    "course_audio",
-                    "course_resources",
-                    "course_suggestions",
-                    "course_generation_jobs"
-                ]
-                
-                for table in related_tables:
-                    try:
-                        await client.delete(
-                            f"{SUPABASE_URL}/rest/v1/{table}",
-                            headers=headers,
-                            params={"course_id": f"eq.{course_id}"}
-                        )
-                    except Exception as e:
-                        logger.debug(f"Could not delete from {table}: {e} (may not exist)")
-                
-                # Now delete the course itself
-                response = await client.delete(
-                    f"{SUPABASE_URL}/rest/v1/courses",
-                    headers=headers,
-                    params={"id": f"eq.{course_id}"}
-                )
-                
-                if response.status_code == 204:
-                    logger.info(f"✅ Course {course_id} deleted successfully")
-                    return {"success": True, "message": "Course deleted successfully"}
-                elif response.status_code == 404:
-                    logger.warning(f"⚠️ Course {course_id} not found")
-                    return {"success": False, "message": "Course not found"}
-                else:
-                    logger.error(f"❌ Failed to delete course: {response.status_code} - {response.text}")
-                    raise HTTPException(status_code=500, detail="Failed to delete course")
-                    
-            except httpx.HTTPStatusError as e:
-                logger.error(f"💥 HTTP error deleting course: {e.response.status_code} - {e.response.text}")
-                raise HTTPException(status_code=e.response.status_code, detail=str(e))
-                
+        result = await delete_courses([course_id])
     except Exception as e:
         logger.error(f"💥 Error deleting course: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if course_id not in result["deleted"]:
+        logger.warning(f"⚠️ Course {course_id} not found")
+        return {"success": False, "message": "Course not found"}
+    logger.info(f"✅ Course {course_id} deleted successfully")
+    return {"success": True, "message": "Course deleted successfully"}
+
+# Ids go into one IN (...) filter / array argument; keep requests reasonably sized
+BULK_DELETE_LIMIT = int(os.getenv("BULK_DELETE_LIMIT", "200"))
+
+class BulkDeleteRequest(BaseModel):
+    courseIds: List[str]
+
+@app.post("/courses/bulk-delete")
+async def bulk_delete_courses(request: BulkDeleteRequest):
+    """Delete many courses and their content at once (e.g. account cleanup)"""
+    course_ids = list(dict.fromkeys(request.courseIds))
+    if not course_ids:
+        return {"success": True, "deleted": [], "not_found": []}
+    if len(course_ids) > BULK_DELETE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_DELETE_LIMIT} courses per request")
+    
+    logger.info(f"🗑️  Bulk deleting {len(course_ids)} courses")
+    try:
+        result = await delete_courses(course_ids)
+    except Exception as e:
+        logger.error(f"💥 Error bulk deleting courses: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "success": True,
+        "deleted": result["deleted"],
+        "not_found": [c for c in course_ids if c not in result["deleted"]],
+        "rows": result["rows"]
+    }
 
 async def create_course(topic: str, user_id: str) -> str:
     """Create course record in Supabase"""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/rest/v1/courses",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation"
-            },
-            json={
-                "user_id": user_id,
-                "title": topic,
-                "purpose": "practice",
-                "difficulty": "intermediate",
-                "status": "generating",
-                "summary": f"AI-generated course on {topic}",
-                "is_oboe_style": True
-            }
-        )
-        
-        if response.status_code not in [200, 201]:
-            raise Exception(f"Failed to create course: {response.text}")
-        
-        data = response.json()
-        return data[0]["id"] if isinstance(data, list) else data["id"]
+    response = await postgrest.post(
+        "courses",
+        headers={"Prefer": "return=representation"},
+        json={
+            "user_id": user_id,
+            "title": topic,
+            "purpose": "practice",
+            "difficulty": "intermediate",
+            "status": "generating",
+            "summary": f"AI-generated course on {topic}",
+            "is_oboe_style": True
+        }
+    )
+    
+    if response.status_code not in [200, 201]:
+        raise Exception(f"Failed to create course: {response.text}")
+    
+    data = response.json()
+    return data[0]["id"] if isinstance(data, list) else data["id"]
 
 async def create_generation_job(course_id: str, user_id: str) -> str:
     """Create generation job"""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/rest/v1/course_generation_jobs",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json",
-                "Prefer": "return=representation"
-            },
-            json={
-                "user_id": user_id,
-                "course_id": course_id,
-                "status": "processing",
-                "job_type": "course_creation",
-                "current_step": "Starting parallel generation",
-                "progress_percentage": 5
-            }
-        )
-        
-        data = response.json()
-        return data[0]["id"] if isinstance(data, list) else data["id"]
+    response = await postgrest.post(
+        "course_generation_jobs",
+        headers={"Prefer": "return=representation"},
+        json={
+            "user_id": user_id,
+            "course_id": course_id,
+            "status": "processing",
+            "job_type": "course_creation",
+            "current_step": "Starting parallel generation",
+            "progress_percentage": 5
+        }
+    )
+    
+    data = response.json()
+    return data[0]["id"] if isinstance(data, list) else data["id"]
 
-async def generate_in_parallel(course_id: str, topic: str, user_id: str):
+async def run_generation_job(job: dict):
+    """Worker entry point: run (or resume) generation for a queued job"""
+    checkpoints = await asyncio.to_thread(JOB_QUEUE.load_checkpoints, job["course_id"])
+    if checkpoints:
+        logger.info(f"🔁 Resuming course {job['course_id']} after stages: {', '.join(checkpoints)}")
+    await generate_in_parallel(
+        job["course_id"],
+        job["topic"],
+        job["user_id"],
+        checkpoints=checkpoints,
+        **job["options"]
+    )
+
+async def run_stage(course_id: str, stage: str, checkpoints: dict, produce, checkpoint_empty: bool = True):
+    """Return a stage's checkpointed output, or run it and checkpoint the result.
+    
+    Failures are recorded per stage so /courses/{id}/stages can show what a resume will redo.
+    Generators that swallow their own errors return empty results; pass checkpoint_empty=False
+    so those are retried on resume rather than remembered as done.
+    """
+    if stage in checkpoints:
+        logger.info(f"⏭️ [{course_id}] Stage '{stage}' restored from checkpoint")
+        return checkpoints[stage]
+    try:
+        with timeline_stage(stage):
+            result = await produce()
+    except Exception as e:
+        await asyncio.to_thread(JOB_QUEUE.record_failure, course_id, stage, str(e) or type(e).__name__)
+        raise
+    if result or checkpoint_empty:
+        await asyncio.to_thread(JOB_QUEUE.save_checkpoint, course_id, stage, result)
+        checkpoints[stage] = result
+    return result
+
+async def generate_in_parallel(course_id: str, topic: str, user_id: str, bypass_cache: bool = False,
+                               stream_chapters: bool = False, checkpoints: Optional[dict] = None):
     """Main parallel generation orchestrator"""
     start_time = datetime.now()
+    # Inherited by every task spawned below (asyncio.gather copies the context)
+    cache_bypass.set(bypass_cache)
+    timeline = Timeline(course_id, API_PRICING)
+    current_timeline.set(timeline)
+    ACTIVE_TIMELINES[course_id] = timeline
+    checkpoints = checkpoints if checkpoints is not None else {}
+    early_chapters = None
     
     try:
+        # STEP 0: Reuse a previously generated course for a near-duplicate topic
+        if TOPIC_INDEX and not bypass_cache and not checkpoints:
+            template = await asyncio.to_thread(TOPIC_INDEX.find, topic, TOPIC_REUSE_THRESHOLD)
+            if template:
+                await clone_course_from_template(course_id, topic, template, start_time)
+                return
+        
         # Update progress
         await update_progress(course_id, 10, "📚 Learn by Reading - Generating course structure...")
         
-        # STEP 1: Generate outline
-        outline = await generate_outline(topic)
+        # STEP 1: Generate outline (chapters of a short draft start while it is extended)
+        outline, early_chapters = await start_outline(course_id, topic, checkpoints, stream_chapters)
         chapter_count = len(outline['chapters'])
         logger.info(f"✅ Outline generated with {chapter_count} chapters")
         await update_progress(course_id, 15, f"📚 Learn by Reading - Generated {chapter_count} chapters outline")
@@ -513,29 +1239,11 @@ async def generate_in_parallel(course_id: str, topic: str, user_id: str):
         await update_progress(course_id, 20, "📚 Learn by Reading - Creating chapter content...")
         
         # STEP 2: Parallel generation with better error handling
-        results = await asyncio.gather(
-            generate_chapters(course_id, topic, outline),
-            generate_flashcards(course_id, topic),
-            generate_mcqs(course_id, topic),
-            generate_articles(course_id, topic),
-            generate_word_games(course_id, topic),
-            generate_audio_scripts(topic, outline),
-            return_exceptions=True
-        )
-        
-        # Handle exceptions gracefully
-        chapters = results[0] if not isinstance(results[0], Exception) else []
-        flashcards = results[1] if not isinstance(results[1], Exception) else []
-        mcqs = results[2] if not isinstance(results[2], Exception) else []
-        articles = results[3] if not isinstance(results[3], Exception) else {}
-        word_games = results[4] if not isinstance(results[4], Exception) else []
-        audio_scripts = results[5] if not isinstance(results[5], Exception) else {}
-        
-        # Log any exceptions
-        service_names = ["chapters", "flashcards", "mcqs", "articles", "word_games", "audio_scripts"]
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                logger.error(f"⚠️ {service_names[i]} generation failed: {result}")
+        content = await generate_content(course_id, topic, outline, stream_chapters, checkpoints, early_chapters)
+        chapters = content["chapters"]
+        flashcards = content["flashcards"]
+        mcqs = content["mcqs"]
+        audio_scripts = content["audio_scripts"]
         
         # Detailed progress update
         chapter_count = len(chapters) if chapters else 0
@@ -551,106 +1259,408 @@ async def generate_in_parallel(course_id: str, topic: str, user_id: str):
         
         await update_progress(course_id, 60, "🎧 Learn by Listening - Creating audio scripts...")
         
-        # STEP 3: Store audio scripts in database (always, even if TTS fails)
-        audio_success = False
-        if audio_scripts:
-            # Always store scripts in database for browser TTS fallback
-            audio_records = []
-            if audio_scripts.get("short"):
-                audio_records.append({
-                    "course_id": course_id,
-                    "audio_type": "short_podcast",
-                    "script": audio_scripts.get("short", ""),
-                    "script_text": audio_scripts.get("short", ""),  # Legacy field
-                    "audio_url": None,  # Browser will use speechSynthesis API
-                    "duration_seconds": 300,
-                })
-            if audio_scripts.get("long"):
-                audio_records.append({
-                    "course_id": course_id,
-                    "audio_type": "full_lecture",
-                    "script": audio_scripts.get("long", ""),
-                    "script_text": audio_scripts.get("long", ""),  # Legacy field
-                    "audio_url": None,  # Browser will use speechSynthesis API
-                    "duration_seconds": 1200,
-                })
-            
-            if audio_records:
-                await insert_to_supabase("course_audio", audio_records)
-                logger.info("✅ Audio scripts stored in database")
-                await update_progress(course_id, 70, "🎧 Learn by Listening - Audio scripts ready for playback")
-            
-            # Try to generate TTS if API key available
-            if ELEVENLABS_API_KEY:
-                results = await asyncio.gather(
-                    generate_tts(course_id, audio_scripts.get("short", ""), "short_podcast"),
-                    generate_tts(course_id, audio_scripts.get("long", ""), "full_lecture"),
-                    return_exceptions=True
-                )
-                # Check if any TTS generation succeeded (returned True)
-                audio_success = any(result is True for result in results)
-                
-                # Also verify by checking if audio was actually created in database
-                if not audio_success:
-                    try:
-                        async with httpx.AsyncClient() as client:
-                            check_response = await client.get(
-                                f"{SUPABASE_URL}/rest/v1/course_audio?course_id=eq.{course_id}&audio_url=not.is.null",
-                                headers={
-                                    "apikey": SUPABASE_SERVICE_KEY,
-                                    "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                                }
-                            )
-                            if check_response.status_code == 200:
-                                audio_data = check_response.json()
-                                audio_success = len(audio_data) > 0
-                    except Exception as e:
-                        logger.debug(f"Could not verify audio in database: {e}")
-                
-                if audio_success:
-                    await update_course_field(course_id, {"audio_generated": True})
-                    logger.info("✅ Audio generation completed successfully")
-                else:
-                    logger.warning("⚠️ Audio generation failed - scripts stored for browser TTS fallback")
-            else:
-                logger.info("ℹ️ ElevenLabs API key not configured - scripts stored for browser TTS")
+        # STEP 3: Audio rows (scripts always, even if TTS fails)
+        audio = await run_stage(course_id, "audio", checkpoints, lambda: produce_audio(course_id, audio_scripts))
         
         await update_progress(course_id, 80, "🎮 Learn by Interacting - Finding resources...")
         
         # STEP 4: Find resources if Brave key available
+        resources = []
         if BRAVE_API_KEY:
-            await find_resources(course_id, topic)
+            resources = await run_stage(course_id, "resources", checkpoints, lambda: find_resources(course_id, topic), checkpoint_empty=False)
         
         await update_progress(course_id, 90, "🎮 Learn by Interacting - Generating practice exercises...")
         
         # STEP 5: Generate suggestions
-        await generate_suggestions(course_id, topic)
+        suggestions = await run_stage(course_id, "suggestions", checkpoints, lambda: generate_suggestions(course_id, topic), checkpoint_empty=False)
         
-        # STEP 6: Finalize
+        # STEP 6: Commit everything in one transaction and publish
+        tables = {
+            "course_chapters": chapters,
+            "course_flashcards": flashcards,
+            "course_mcqs": mcqs,
+            "course_articles": content["articles"],
+            "course_word_games": content["word_games"],
+            "course_audio": audio,
+            "course_resources": resources or [],
+            "course_suggestions": suggestions or [],
+        }
         duration = int((datetime.now() - start_time).total_seconds())
         
         # Calculate estimated completion time based on chapter count
         chapter_count = len(outline.get("chapters", []))
         estimated_minutes = chapter_count * 15  # 15 minutes per chapter
         
-        await update_course_field(course_id, {
-            "status": "published",
-            "generation_duration_seconds": duration,
-            "articles_generated": True,
-            "games_generated": True,
-            "completion_time_estimate": estimated_minutes  # Estimated reading time in minutes
-        })
+        # A cancellation flagged for another process's worker may not have reached us yet
+        if course_id in await asyncio.to_thread(JOB_QUEUE.cancelling, [course_id]):
+            raise asyncio.CancelledError()
+        
+        with timeline_stage("commit"):
+            commit = await commit_course_content(course_id, tables, {
+                "status": "published",
+                "generation_duration_seconds": duration,
+                "articles_generated": True,
+                "games_generated": True,
+                "audio_generated": any(a.get("audio_url") for a in audio),
+                "completion_time_estimate": estimated_minutes  # Estimated reading time in minutes
+            })
         
-        await finalize_job(course_id, duration)
+        await finalize_job(course_id, duration, commit)
+        # Nothing left to resume; the outline stays for targeted regeneration
+        await asyncio.to_thread(JOB_QUEUE.prune_checkpoints, course_id, ("outline",))
         
         logger.info(f"✅ Course {course_id} generated in {duration}s")
         
+        # Index the finished course so near-duplicate topics can reuse it
+        if TOPIC_INDEX and chapters:
+            try:
+                await snapshot_course_template(topic, outline, tables, course_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not store course template: {e}")
+        
+    except asyncio.CancelledError:
+        # Only a user's cancel (flagged in the queue) discards the course. A worker shutting down
+        # leaves the job 'running', to be reclaimed and resumed from its checkpoints.
+        if course_id in await asyncio.to_thread(JOB_QUEUE.cancelling, [course_id]):
+            logger.warning(f"🛑 Generation of {course_id} cancelled")
+            await discard_partial_course(course_id)
+        else:
+            logger.warning(f"⏸️ Generation of {course_id} interrupted; it resumes from its checkpoints")
+        raise
     except Exception as e:
         logger.error(f"💥 Generation error: {e}")
         await mark_job_failed(course_id, str(e))
+        raise
+    finally:
+        if early_chapters and not early_chapters.done():
+            early_chapters.cancel()
+        ACTIVE_TIMELINES.pop(course_id, None)
+
+async def generate_content(course_id: str, topic: str, outline: dict, stream_chapters: bool = False,
+                           checkpoints: Optional[dict] = None, early_chapters: Optional[asyncio.Task] = None) -> dict:
+    """Run the independent content generators concurrently, each as its own checkpointed stage"""
+    checkpoints = checkpoints if checkpoints is not None else {}
+    
+    async def chapters():
+        if early_chapters:
+            # Chapters of the draft outline, started before it was extended; checkpointed per chapter
+            await early_chapters
+        return await generate_chapters(course_id, topic, outline, stream=stream_chapters, checkpoints=checkpoints)
+    
+    stages = {
+        "chapters": chapters,
+        "flashcards": lambda: generate_flashcards(course_id, topic),
+        "mcqs": lambda: generate_mcqs(course_id, topic),
+        "articles": lambda: generate_articles(course_id, topic),
+        "word_games": lambda: generate_word_games(course_id, topic),
+        "audio_scripts": lambda: generate_audio_scripts(topic, outline),
+    }
+    names = [name for name in stages if not (PRACTICE_FUSION and name in PRACTICE_SECTIONS)]
+    tasks = [run_stage(course_id, name, checkpoints, stages[name], checkpoint_empty=False) for name in names]
+    if PRACTICE_FUSION:
+        names.append("practice")
+        tasks.append(generate_practice(course_id, topic, checkpoints))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Log any exceptions
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            logger.error(f"⚠️ {name} generation failed: {result}")
+    
+    # Handle exceptions gracefully
+    content = {
+        name: result if not isinstance(result, Exception) else ({} if name in ("audio_scripts", "practice") else [])
+        for name, result in zip(names, results)
+    }
+    if PRACTICE_FUSION:
+        practice = content.pop("practice")
+        content.update({name: practice.get(name, []) for name in PRACTICE_SECTIONS})
+    return content
+
+async def generate_practice(course_id: str, topic: str, checkpoints: dict) -> dict:
+    """Fused flashcards/MCQs/word games; sections the fused call missed use their own calls"""
+    try:
+        practice = await run_stage(
+            course_id, "practice", checkpoints,
+            lambda: generate_practice_set(course_id, topic), checkpoint_empty=False
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Fused practice generation failed, using separate calls: {e}")
+        practice = {}
+    
+    separate = {
+        "flashcards": lambda: generate_flashcards(course_id, topic),
+        "mcqs": lambda: generate_mcqs(course_id, topic),
+        "word_games": lambda: generate_word_games(course_id, topic),
+    }
+    missing = [name for name in PRACTICE_SECTIONS if not practice.get(name)]
+    results = await asyncio.gather(
+        *[run_stage(course_id, name, checkpoints, separate[name], checkpoint_empty=False) for name in missing],
+        return_exceptions=True
+    )
+    practice = dict(practice)
+    for name, result in zip(missing, results):
+        if isinstance(result, Exception):
+            logger.error(f"⚠️ {name} generation failed: {result}")
+            result = []
+        practice[name] = result
+    return practice
+
+async def produce_audio(course_id: str, audio_scripts: dict, synthesize: bool = True,
+                        report_progress: bool = True) -> list:
+    """Build course_audio rows for the scripts, with ElevenLabs audio URLs where TTS succeeds.
+    
+    Pass report_progress=False outside a generation job (templates, regeneration): there is no
+    job row to update.
+    """
+    if not audio_scripts:
+        return []
+    
+    # Scripts are always stored for browser TTS fallback (audio_url None -> speechSynthesis API)
+    audio_records = []
+    if audio_scripts.get("short"):
+        audio_records.append({
+            "course_id": course_id,
+            "audio_type": "short_podcast",
+            "script": audio_scripts.get("short", ""),
+            "script_text": audio_scripts.get("short", ""),  # Legacy field
+            "audio_url": None,
+            "duration_seconds": 300,
+        })
+    if audio_scripts.get("long"):
+        audio_records.append({
+            "course_id": course_id,
+            "audio_type": "full_lecture",
+            "script": audio_scripts.get("long", ""),
+            "script_text": audio_scripts.get("long", ""),  # Legacy field
+            "audio_url": None,
+            "duration_seconds": 1200,
+        })
+    
+    if audio_records and report_progress:
+        await update_progress(course_id, 70, "🎧 Learn by Listening - Audio scripts ready for playback")
+    
+    # Try to generate TTS if API key available
+    if synthesize and ELEVENLABS_API_KEY and audio_records:
+        results = await asyncio.gather(
+            *[generate_tts(course_id, record["script"], record["audio_type"]) for record in audio_records],
+            return_exceptions=True
+        )
+        for record, result in zip(audio_records, results):
+            if isinstance(result, str):
+                record["audio_url"] = result
+                record["voice_used"] = "Aria"
+        
+        if any(record["audio_url"] for record in audio_records):
+            logger.info("✅ Audio generation completed successfully")
+        else:
+            logger.warning("⚠️ Audio generation failed - scripts stored for browser TTS fallback")
+    elif synthesize and not ELEVENLABS_API_KEY:
+        logger.info("ℹ️ ElevenLabs API key not configured - scripts stored for browser TTS")
+    return audio_records
+
+# Tables a pre-generated template must have before peak-time requests are allowed to clone it
+TEMPLATE_REQUIRED_TABLES = ("course_chapters", "course_flashcards", "course_mcqs", "course_articles")
+
+async def generate_course_template(topic: str, refresh: bool = False, synthesize_audio: bool = True) -> dict:
+    """Generate a course for `topic` straight into the topic index, without a course row.
+    
+    Used by off-peak pre-generation (pregenerate.py). `refresh` bypasses the LLM and topic
+    caches so a stale template is replaced by new content rather than the cached answers.
+    Returns whether a template was stored, its row counts, and the API calls and cost spent
+    (also when generation failed, so budgets account for it).
+    """
+    if not TOPIC_INDEX:
+        raise RuntimeError("TOPIC_REUSE_ENABLED is off; there is no template store to fill")
+    # Placeholder id: stage checkpoints and the timeline are keyed by course id
+    course_id = str(uuid.uuid4())
+    cache_bypass.set(refresh)
+    timeline = Timeline(course_id, API_PRICING)
+    current_timeline.set(timeline)
+    checkpoints = {}
+    result = {"topic": topic, "stored": False}
+    try:
+        outline = await run_stage(course_id, "outline", checkpoints, lambda: generate_outline(topic))
+        content = await generate_content(course_id, topic, outline, checkpoints=checkpoints)
+        audio = await run_stage(course_id, "audio", checkpoints,
+                                lambda: produce_audio(course_id, content["audio_scripts"], synthesize_audio,
+                                                      report_progress=False))
+        resources = await run_stage(course_id, "resources", checkpoints, lambda: find_resources(course_id, topic),
+                                    checkpoint_empty=False)
+        suggestions = await run_stage(course_id, "suggestions", checkpoints,
+                                      lambda: generate_suggestions(course_id, topic), checkpoint_empty=False)
+        tables = {
+            "course_chapters": content["chapters"],
+            "course_flashcards": content["flashcards"],
+            "course_mcqs": content["mcqs"],
+            "course_articles": content["articles"],
+            "course_word_games": content["word_games"],
+            "course_audio": audio,
+            "course_resources": resources or [],
+            "course_suggestions": suggestions or [],
+        }
+        result["rows"] = {table: len(rows) for table, rows in tables.items()}
+        missing = [table for table in TEMPLATE_REQUIRED_TABLES if not tables[table]]
+        if missing:
+            result["error"] = f"Incomplete content, not stored (empty: {', '.join(missing)})"
+        else:
+            await snapshot_course_template(topic, outline, tables, course_id)
+            result["stored"] = True
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    finally:
+        await asyncio.to_thread(JOB_QUEUE.clear_checkpoints, course_id)
+    totals = timeline.summary(include_spans=False)["totals"]
+    result["api_calls"] = totals["calls"]
+    result["api_cost_usd"] = totals["cost_usd"]
+    return result
+
+async def clone_course_from_template(course_id: str, topic: str, template: dict, start_time: datetime):
+    """Populate a new course from a stored template instead of calling the LLMs"""
+    logger.info(f"📇 Reusing template '{template['topic']}' for '{topic}' (score {template['score']:.2f})")
+    await update_progress(course_id, 20, f"📚 Learn by Reading - Reusing content from '{template['topic']}'...")
+    
+    tables = template["content"].get("tables", {})
+    source_topic = template["topic"]
+    
+    # Light personalisation: titles that mention the original topic use the new one
+    for article in tables.get("course_articles", []):
+        article["title"] = article.get("title", "").replace(source_topic, topic)
+    
+    chapter_count = len(tables.get("course_chapters", []))
+    duration = int((datetime.now() - start_time).total_seconds())
+    commit = await commit_course_content(course_id, tables, {
+        "status": "published",
+        "generation_duration_seconds": duration,
+        "articles_generated": bool(tables.get("course_articles")),
+        "games_generated": bool(tables.get("course_word_games")),
+        "audio_generated": any(a.get("audio_url") for a in tables.get("course_audio", [])),
+        "completion_time_estimate": chapter_count * 15
+    })
+    await finalize_job(course_id, duration, commit)
+    logger.info(f"✅ Course {course_id} cloned from template in {duration}s")
+
+async def load_regeneration_context(course_id: str) -> tuple:
+    """Course row and outline for a targeted regeneration (stored outline, else rebuilt from chapters)"""
+    if await asyncio.to_thread(JOB_QUEUE.active_job, course_id):
+        raise HTTPException(status_code=409, detail="Course generation is queued or running")
+    course = await get_course(course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    outline = await asyncio.to_thread(JOB_QUEUE.load_checkpoint, course_id, "outline")
+    if not outline:
+        response = await postgrest.get("course_chapters", params={
+            "course_id": f"eq.{course_id}",
+            "select": "title,order_number,estimated_reading_time",
+            "order": "order_number.asc",
+        })
+        response.raise_for_status()
+        outline = {"chapters": [
+            {"title": c["title"], "estimatedMinutes": c.get("estimated_reading_time") or 15}
+            for c in response.json()
+        ]}
+    return course, outline
+
+def start_regeneration(course_id: str) -> Timeline:
+    """Fresh LLM calls (the cached answer is what's being replaced) under their own timeline"""
+    cache_bypass.set(True)
+    timeline = Timeline(course_id, API_PRICING)
+    current_timeline.set(timeline)
+    return timeline
+
+def regeneration_stats(timeline: Timeline) -> dict:
+    summary = timeline.summary(include_spans=False)
+    return {"duration_ms": summary["elapsed_ms"], "api_calls": summary["totals"]["calls"],
+            "api_cost_usd": summary["totals"]["cost_usd"]}
 
-async def generate_outline(topic: str) -> dict:
-    """Generate course outline - 5-7 chapters based on complexity"""
+async def regenerate_audio(course_id: str, topic: str, outline: dict) -> list:
+    scripts = await generate_audio_scripts(topic, outline)
+    if await asyncio.to_thread(JOB_QUEUE.resumable, course_id):
+        await asyncio.to_thread(JOB_QUEUE.save_checkpoint, course_id, "audio_scripts", scripts)
+    return await produce_audio(course_id, scripts, report_progress=False)
+
+async def replace_chapter_row(course_id: str, row: dict):
+    """Update a chapter in place (chapter_completion references its id), inserting it if it was missing"""
+    response = await postgrest.patch(
+        "course_chapters",
+        params={"course_id": f"eq.{course_id}", "order_number": f"eq.{row['order_number']}", "select": "id"},
+        headers={"Prefer": "return=representation"},
+        json={k: row[k] for k in ("title", "content", "estimated_reading_time")}
+    )
+    response.raise_for_status()
+    if not response.json():
+        response = await postgrest.post("course_chapters", json=row)
+        response.raise_for_status()
+
+async def replace_rows_in_place(course_id: str, table: str, rows: list) -> dict:
+    """Overwrite a course's rows in `table` keeping their ids, so learner progress on them survives.
+    
+    The k-th new row takes the id of the k-th existing row; extra new rows are inserted and
+    surplus old rows deleted (their progress goes with them). Not atomic, unlike
+    commit_course_content.
+    """
+    start = time.perf_counter()
+    response = await postgrest.get(table, params={
+        "course_id": f"eq.{course_id}", "select": "id", "order": "created_at.asc,id.asc"
+    })
+    response.raise_for_status()
+    ids = [row["id"] for row in response.json()]
+    rows = [{**row, "course_id": course_id} for row in rows]
+    
+    if ids[:len(rows)]:
+        response = await postgrest.post(
+            table,
+            headers={"Prefer": "resolution=merge-duplicates"},
+            params={"on_conflict": "id"},
+            json=[{**row, "id": row_id} for row_id, row in zip(ids, rows)]
+        )
+        response.raise_for_status()
+    if rows[len(ids):]:
+        response = await postgrest.post(table, json=rows[len(ids):])
+        response.raise_for_status()
+    if ids[len(rows):]:
+        response = await postgrest.delete(table, params={"id": f"in.({','.join(ids[len(rows):])})"})
+        response.raise_for_status()
+    
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"💾 [{course_id}] Rewrote {len(rows)} {table} rows in place ({len(ids)} existing) in {elapsed_ms}ms")
+    return {"rows": {table: len(rows)}, "commit_ms": elapsed_ms, "commit_mode": "in_place"}
+
+async def store_regenerated(course_id: str, stage: str, checkpoint, table: str, rows: list, key: Optional[str] = None):
+    """Refresh stale copies of regenerated content (checkpoint of an unfinished run, bundle cache and
+    ETag, topic template)"""
+    if await asyncio.to_thread(JOB_QUEUE.resumable, course_id):
+        await asyncio.to_thread(JOB_QUEUE.save_checkpoint, course_id, stage, checkpoint)
+    # Bundle ETags derive from courses.updated_at; content tables are written without touching it
+    try:
+        response = await postgrest.patch(
+            "courses", params={"id": f"eq.{course_id}"}, json={"updated_at": datetime.utcnow().isoformat()}
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not bump updated_at of {course_id}; cached bundles may stay stale: {e}")
+    invalidate_course_bundle(course_id)
+    if TOPIC_INDEX:
+        template_rows = [{k: v for k, v in row.items() if k not in TEMPLATE_DROP_FIELDS} for row in rows]
+        await asyncio.to_thread(TOPIC_INDEX.replace_rows, course_id, table, template_rows, key)
+
+async def snapshot_course_template(topic: str, outline: dict, tables: dict, course_id: str):
+    """Copy a generated course's committed rows into the local topic index"""
+    snapshot = {}
+    for table, rows in tables.items():
+        rows = [{k: v for k, v in row.items() if k not in TEMPLATE_DROP_FIELDS} for row in rows]
+        if rows:
+            snapshot[table] = rows
+    
+    await asyncio.to_thread(TOPIC_INDEX.store, topic, {"outline": outline, "tables": snapshot}, course_id)
+
+async def generate_outline(topic: str, on_draft=None) -> dict:
+    """Generate course outline - 5-7 chapters based on complexity
+    
+    A short outline is completed by a cheap extension call for the missing chapters; on_draft
+    receives the short outline first, so its chapters can be generated while that call runs.
+    """
     prompt = f"""Create a detailed course outline for: "{topic}"
 
 Generate 5-7 chapters based on topic complexity:
@@ -677,37 +1687,77 @@ Return JSON:
 
 Generate at least 5 chapters, up to 7 if the topic is complex. Return ONLY valid JSON."""
     
-    data = await call_gemini_with_retry(prompt, service="chapter")
-    text = data["candidates"][0]["content"]["parts"][0]["text"]
+    outline = await generate_structured(prompt, Outline, task="outline", request_schema=CourseOutlineRequest)
     
-    # Extract JSON
-    json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL) or re.search(r'\{.*\}', text, re.DOTALL)
-    if json_match:
-        outline = json.loads(json_match.group(1) if json_match.lastindex else json_match.group(0))
-        
-        # Ensure minimum 5 chapters
-        if len(outline.get('chapters', [])) < 5:
-            logger.warning(f"Only {len(outline['chapters'])} chapters generated, requesting more...")
-            # Retry with explicit requirement
-            retry_prompt = f"""Create a course outline for: "{topic}" with EXACTLY 5-7 chapters. Return JSON: {{"chapters": [{{"title": "string", "level": "basic|intermediate|advanced|expert", "objectives": ["obj1"], "keyConcepts": ["concept1"], "estimatedMinutes": 15}}]}}"""
-            retry_data = await call_gemini_with_retry(retry_prompt, service="chapter")
-            retry_text = retry_data["candidates"][0]["content"]["parts"][0]["text"]
-            retry_match = re.search(r'```json\n(.*?)\n```', retry_text, re.DOTALL) or re.search(r'\{.*\}', retry_text, re.DOTALL)
-            if retry_match:
-                outline = json.loads(retry_match.group(1) if retry_match.lastindex else retry_match.group(0))
-        
-        return outline
+    missing = OUTLINE_MIN_CHAPTERS - len(outline.chapters)
+    if missing > 0:
+        logger.warning(f"Only {len(outline.chapters)} chapters generated, extending the outline by {missing}...")
+        if on_draft:
+            on_draft(outline.model_dump())
+        try:
+            outline.chapters += await extend_outline(topic, outline.chapters, missing)
+        except Exception as e:
+            # The draft is a usable outline; a failed extension shouldn't fail the course
+            logger.warning(f"⚠️ Outline extension failed, keeping {len(outline.chapters)} chapters: {e}")
+    
+    return outline.model_dump()
+
+async def extend_outline(topic: str, chapters: list, missing: int) -> list:
+    """Only the missing chapters, continuing the existing ones (a short prompt and a short answer)"""
+    existing = "\n".join(f"{i + 1}. {c.title} ({c.level})" for i, c in enumerate(chapters))
+    prompt = f"""A course on "{topic}" has these chapters:
+{existing}
+
+Write exactly {missing} more chapters that continue this progression without repeating it.
+Return JSON: {{"chapters": [{{"title": "string", "level": "basic|intermediate|advanced|expert", "objectives": ["obj1", "obj2", "obj3"], "keyConcepts": ["concept1", "concept2", "concept3"], "estimatedMinutes": 15}}]}}"""
+    extension = await generate_structured(prompt, Outline, task="outline")
+    return extension.chapters[:missing]
+
+async def start_outline(course_id: str, topic: str, checkpoints: dict, stream_chapters: bool = False) -> tuple:
+    """Run the outline stage; if it comes back short, start generating the draft's chapters
+    while the extension call is in flight.
     
-    return json.loads(text)
+    Returns (outline, early chapters task or None). The early task checkpoints chapter:1..n,
+    so generate_chapters later continues after them.
+    """
+    draft = asyncio.get_running_loop().create_future()
+    outline_task = asyncio.create_task(run_stage(
+        course_id, "outline", checkpoints, lambda: generate_outline(topic, on_draft=draft.set_result)
+    ))
+    early = None
+    try:
+        await asyncio.wait([outline_task, draft], return_when=asyncio.FIRST_COMPLETED)
+        if draft.done() and not outline_task.done():
+            early = asyncio.create_task(generate_chapters(
+                course_id, topic, draft.result(), stream=stream_chapters, checkpoints=checkpoints
+            ))
+        return await outline_task, early
+    except BaseException:
+        outline_task.cancel()
+        if early:
+            early.cancel()
+        raise
 
-async def generate_chapters(course_id: str, topic: str, outline: dict) -> list:
+async def generate_chapters(course_id: str, topic: str, outline: dict, stream: bool = False,
+                            checkpoints: Optional[dict] = None) -> list:
     """Generate chapter content in HTML format with code examples, tables"""
+    checkpoints = checkpoints if checkpoints is not None else {}
     chapters = []
     
+    # Each chapter is its own checkpoint so a resume only regenerates missing ones
     for i, chapter in enumerate(outline["chapters"]):
-        level = chapter.get('level', 'intermediate')
-        
-        prompt = f"""Write comprehensive chapter content for: {chapter['title']}
+        chapters.append(await run_stage(
+            course_id, f"chapter:{i + 1}", checkpoints,
+            lambda: generate_chapter(course_id, topic, chapter, i + 1, stream)
+        ))
+    
+    return chapters
+
+async def generate_chapter(course_id: str, topic: str, chapter: dict, order_number: int, stream: bool = False) -> dict:
+    """Generate a single chapter row"""
+    level = chapter.get('level', 'intermediate')
+    
+    prompt = f"""Write comprehensive chapter content for: {chapter['title']}
 
 Topic: {topic}
 Level: {level}
@@ -744,88 +1794,105 @@ DO NOT:
 
 Return ONLY HTML, no markdown. Make it comprehensive and detailed."""
 
-        data = await call_gemini_with_retry(prompt, service="chapter")
-        content = data["candidates"][0]["content"]["parts"][0]["text"]
-        
-        # Clean any remaining markdown artifacts
-        content = content.replace('```html', '').replace('```', '').replace('**', '').strip()
-        # Remove any markdown headers if present
-        content = re.sub(r'^#+\s+', '', content, flags=re.MULTILINE)
-        
-        # Remove chapter title if it appears in content (repeated heading fix)
-        title_lower = chapter['title'].lower()
-        # Remove first <h1> or <h2> that matches chapter title exactly
-        content = re.sub(
-            rf'<h[12][^>]*>\s*{re.escape(chapter["title"])}\s*</h[12]>',
-            '',
-            content,
-            count=1,
-            flags=re.IGNORECASE
-        )
-        # Also remove if title appears as plain text at the start
-        if content.lower().startswith(title_lower):
-            content = re.sub(
-                rf'^{re.escape(chapter["title"])}\s*\n+',
-                '',
-                content,
-                count=1,
-                flags=re.IGNORECASE | re.MULTILINE
-            )
-        
-        chapters.append({
+    if stream:
+        data = await stream_chapter(course_id, chapter, order_number, prompt)
+        text = data["candidates"][0]["content"]["parts"][0]["text"]
+    else:
+        text = await call_llm(prompt, task="chapter")
+    processed = await CPU_POOL.run(postprocess_html, text, chapter["title"])
+    
+    return {
+        "course_id": course_id,
+        "title": chapter["title"],
+        "content": processed["html"],
+        "order_number": order_number,
+        "estimated_reading_time": processed["reading_minutes"]
+    }
+
+async def stream_chapter(course_id: str, chapter: dict, order_number: int, prompt: str) -> dict:
+    """Stream one chapter, checkpointing partial HTML to course_chapters as it grows"""
+    flushed = {"chars": 0}
+    
+    async def on_text(text: str, done: bool):
+        if not done and len(text) - flushed["chars"] < STREAM_CHECKPOINT_CHARS:
+            return
+        flushed["chars"] = len(text)
+        processed = await CPU_POOL.run(postprocess_html, text, chapter["title"])
+        await upsert_to_supabase("course_chapters", [{
             "course_id": course_id,
             "title": chapter["title"],
-            "content": content,  # Now pure HTML
-            "order_number": i + 1,
-            "estimated_reading_time": chapter.get("estimatedMinutes", 10)
+            "content": processed["html"],
+            "order_number": order_number,
+            "estimated_reading_time": processed["reading_minutes"]
+        }], on_conflict="course_id,order_number")
+        progress_bus.publish(course_id, {
+            "type": "chapter",
+            "order_number": order_number,
+            "title": chapter["title"],
+            "chars": len(text),
+            "toc": processed["toc"],
+            "complete": done
         })
     
-    # Insert chapters
-    await insert_to_supabase("course_chapters", chapters)
-    return chapters
+    return await call_gemini_stream(prompt, on_text, service="chapter")
 
-async def generate_flashcards(course_id: str, topic: str) -> list:
-    """Generate flashcards"""
-    prompt = f"Generate 10 flashcards for: {topic}. Format as JSON: [{{'question': 'string', 'answer': 'string'}}]"
-    data = await call_gemini_with_retry(prompt, service="flashcard")
-    text = data["candidates"][0]["content"]["parts"][0]["text"]
-    
-    json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL) or re.search(r'\[.*\]', text, re.DOTALL)
-    flashcards_data = json.loads(json_match.group(1) if json_match.lastindex else json_match.group(0))
-    
-    flashcards = [
-        {"course_id": course_id, "question": f["question"], "answer": f["answer"], "difficulty": "medium"}
-        for f in flashcards_data
+
+def flashcard_rows(course_id: str, items: list) -> list:
+    return [
+        {"course_id": course_id, "question": f.question, "answer": f.answer, "difficulty": "medium"}
+        for f in items
     ]
-    
-    await insert_to_supabase("course_flashcards", flashcards)
-    return flashcards
 
-async def generate_mcqs(course_id: str, topic: str) -> list:
-    """Generate MCQs"""
-    prompt = f"Generate 10 MCQs for: {topic}. Format as JSON: [{{'question': 'string', 'options': ['A', 'B', 'C', 'D'], 'correct': 'A', 'explanation': 'string'}}]"
-    data = await call_gemini_with_retry(prompt, service="quiz")
-    text = data["candidates"][0]["content"]["parts"][0]["text"]
-    
-    json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL) or re.search(r'\[.*\]', text, re.DOTALL)
-    mcqs_data = json.loads(json_match.group(1) if json_match.lastindex else json_match.group(0))
-    
-    mcqs = [
+def mcq_rows(course_id: str, items: list) -> list:
+    return [
         {
             "course_id": course_id,
-            "question": m["question"],
-            "options": m["options"],
-            "correct_answer": m["correct"],
-            "explanation": m["explanation"],
+            "question": m.question,
+            "options": m.options,
+            "correct_answer": m.correct,
+            "explanation": m.explanation,
             "difficulty": "medium"
         }
-        for m in mcqs_data
+        for m in items
     ]
-    
-    await insert_to_supabase("course_mcqs", mcqs)
-    return mcqs
 
-async def generate_articles(course_id: str, topic: str) -> dict:
+def word_game_rows(course_id: str, items: list) -> list:
+    return [
+        {"course_id": course_id, "word": w.word, "definition": w.correct, "incorrect_options": w.incorrect, "difficulty": "medium"}
+        for w in items
+    ]
+
+async def generate_flashcards(course_id: str, topic: str) -> list:
+    """Generate flashcards"""
+    prompt = f"Generate 10 flashcards for: {topic}. Format as JSON: [{{'question': 'string', 'answer': 'string'}}]"
+    flashcards_data = await generate_structured(prompt, List[Flashcard], task="flashcard")
+    return flashcard_rows(course_id, flashcards_data)
+
+async def generate_mcqs(course_id: str, topic: str) -> list:
+    """Generate MCQs"""
+    prompt = f"Generate 10 MCQs for: {topic}. Format as JSON: [{{'question': 'string', 'options': ['A', 'B', 'C', 'D'], 'correct': 'A', 'explanation': 'string'}}]"
+    mcqs_data = await generate_structured(prompt, List[MCQ], task="quiz")
+    return mcq_rows(course_id, mcqs_data)
+
+async def generate_practice_set(course_id: str, topic: str) -> dict:
+    """Flashcards, MCQs and word games in one structured call (PRACTICE_FUSION)"""
+    prompt = f"""Create practice material for: {topic}
+
+Return JSON with three lists:
+- "flashcards": 10 items {{"question": "string", "answer": "string"}}
+- "mcqs": 10 items {{"question": "string", "options": ["A", "B", "C", "D"], "correct": "A", "explanation": "string"}}
+- "word_games": 15 vocabulary items {{"word": "string", "correct": "definition", "incorrect": ["wrong definition", "wrong definition", "wrong definition"]}}"""
+    sections = await generate_structured(
+        prompt, PracticeSet, task="practice",
+        sections={"flashcards": Flashcard, "mcqs": MCQ, "word_games": WordGameItem}
+    )
+    return {
+        "flashcards": flashcard_rows(course_id, sections["flashcards"]),
+        "mcqs": mcq_rows(course_id, sections["mcqs"]),
+        "word_games": word_game_rows(course_id, sections["word_games"]),
+    }
+
+async def generate_articles(course_id: str, topic: str) -> list:
     """Generate articles in HTML format"""
     # Deep dive - HTML format
     deep_dive_prompt = f"""Write an 800-1000 word deep-dive article on: {topic}
@@ -834,75 +1901,44 @@ Use ONLY HTML tags: <h2>, <p>, <strong>, <em>, <ul>, <li>, <code>, <table>
 No markdown syntax allowed.
 Include 2-3 code examples in <code> tags."""
     
-    deep_dive_data = await call_gemini_with_retry(deep_dive_prompt, service="article")
-    deep_dive = deep_dive_data["candidates"][0]["content"]["parts"][0]["text"].strip()
-    # Clean markdown artifacts
-    deep_dive = deep_dive.replace('```html', '').replace('```', '').replace('**', '').strip()
+    deep_dive = await CPU_POOL.run(postprocess_html, await call_llm(deep_dive_prompt, task="article"))
     
     # Key takeaways - HTML format
     takeaways_prompt = f"""Summarize key takeaways for: {topic} in 5-7 bullet points. Use HTML: <ul><li>Point 1</li><li>Point 2</li></ul>"""
-    takeaways_data = await call_gemini_with_retry(takeaways_prompt, service="article")
-    takeaways = takeaways_data["candidates"][0]["content"]["parts"][0]["text"].strip()
-    takeaways = takeaways.replace('```html', '').replace('```', '').replace('**', '').strip()
+    takeaways = await CPU_POOL.run(postprocess_html, await call_llm(takeaways_prompt, task="article"))
     
     # FAQ
     faq_prompt = f"Generate 8-10 FAQ for: {topic}. Format as JSON: [{{'question': 'string', 'answer': 'string'}}]"
-    faq_data = await call_gemini_with_retry(faq_prompt, service="article")
-    faq_text = faq_data["candidates"][0]["content"]["parts"][0]["text"]
-    
-    json_match = re.search(r'```json\n(.*?)\n```', faq_text, re.DOTALL) or re.search(r'\[.*\]', faq_text, re.DOTALL)
-    faq = json.loads(json_match.group(1) if json_match.lastindex else json_match.group(0))
+    faq = [item.model_dump() for item in await generate_structured(faq_prompt, List[FAQItem], task="article")]
     
     articles = [
-        {"course_id": course_id, "article_type": "deep_dive", "title": f"Deep Dive: {topic}", "content": deep_dive, "reading_time_minutes": 10},
-        {"course_id": course_id, "article_type": "key_takeaways", "title": f"Key Takeaways: {topic}", "content": takeaways, "reading_time_minutes": 3},
+        {"course_id": course_id, "article_type": "deep_dive", "title": f"Deep Dive: {topic}", "content": deep_dive["html"], "reading_time_minutes": deep_dive["reading_minutes"]},
+        {"course_id": course_id, "article_type": "key_takeaways", "title": f"Key Takeaways: {topic}", "content": takeaways["html"], "reading_time_minutes": takeaways["reading_minutes"]},
         {"course_id": course_id, "article_type": "faq", "title": f"FAQ: {topic}", "content": json.dumps(faq), "reading_time_minutes": 5}
     ]
     
-    await insert_to_supabase("course_articles", articles)
-    return {"deep_dive": deep_dive, "takeaways": takeaways, "faq": faq}
+    return articles
 
 async def generate_word_games(course_id: str, topic: str) -> list:
     """Generate word games - skip if table doesn't exist"""
     try:
         prompt = f"Generate 15 vocabulary words for: {topic}. Format as JSON: [{{'word': 'string', 'correct': 'string', 'incorrect': ['string', 'string', 'string']}}]"
-        data = await call_gemini_with_retry(prompt, service="game")
-        text = data["candidates"][0]["content"]["parts"][0]["text"]
-        
-        json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL) or re.search(r'\[.*\]', text, re.DOTALL)
-        words_data = json.loads(json_match.group(1) if json_match.lastindex else json_match.group(0))
-        
-        words = [
-            {"course_id": course_id, "word": w["word"], "definition": w["correct"], "incorrect_options": w["incorrect"], "difficulty": "medium"}
-            for w in words_data
-        ]
-        
-        await insert_to_supabase("course_word_games", words)
-        return words
+        words_data = await generate_structured(prompt, List[WordGameItem], task="game")
+        return word_game_rows(course_id, words_data)
     except Exception as e:
         logger.warning(f"Word games table not found or error occurred, skipping: {e}")
         return []  # Return empty list instead of failing
 
 async def generate_audio_scripts(topic: str, outline: dict) -> dict:
-    """Generate audio scripts using Groq (faster than Gemini)"""
+    """Generate audio scripts (routed; Groq is usually the fastest provider for these)"""
     try:
-        # Short script - use Groq if available, fallback to Gemini
+        # Short script
         short_prompt = f"Write 5-minute conversational podcast script introducing: {topic}. ~700 words. No speaker labels."
-        if GROQ_KEYS:
-            short_data = await call_groq_with_retry(short_prompt)
-            short_script = short_data["choices"][0]["message"]["content"]
-        else:
-            short_data = await call_gemini_with_retry(short_prompt, service="chapter")
-            short_script = short_data["candidates"][0]["content"]["parts"][0]["text"]
+        short_script = await call_llm(short_prompt, task="audio_script")
         
         # Long script
         long_prompt = f"Write 20-minute educational lecture on: {topic}. ~3000 words. No speaker labels."
-        if GROQ_KEYS:
-            long_data = await call_groq_with_retry(long_prompt)
-            long_script = long_data["choices"][0]["message"]["content"]
-        else:
-            long_data = await call_gemini_with_retry(long_prompt, service="chapter")
-            long_script = long_data["candidates"][0]["content"]["parts"][0]["text"]
+        long_script = await call_llm(long_prompt, task="audio_script")
         
         return {"short": short_script, "long": long_script}
     except Exception as e:
@@ -913,155 +1949,85 @@ async def generate_audio_scripts(topic: str, outline: dict) -> dict:
             "long": f"In this comprehensive lecture on {topic}, we'll cover everything from basics to advanced techniques."
         }
 
-async def generate_tts(course_id: str, script: str, audio_type: str):
-    """Generate TTS audio"""
+async def generate_tts(course_id: str, script: str, audio_type: str) -> Optional[str]:
+    """Generate TTS audio; returns its URL, or None if no audio was produced"""
     if not ELEVENLABS_API_KEY:
         logger.info("ElevenLabs API key not configured, skipping TTS")
-        return
+        return None
     
     if not script or len(script.strip()) < 50:
         logger.warning("Script too short for TTS")
-        return
+        return None
+    
+    # Identical script + voice was already synthesised (e.g. a regenerated or cloned course)
+    key = audio_key(script, tts.voice_id, tts.model_id)
+    if await asyncio.to_thread(AUDIO_STORAGE.exists, key):
+        logger.info(f"♻️ Reusing stored {audio_type} audio")
+        return AUDIO_STORAGE.url(key)
     
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                "https://api.elevenlabs.io/v1/text-to-speech/9BWtsMINqrJLrRacOk9x",
-                headers={
-                    "xi-api-key": ELEVENLABS_API_KEY,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "text": script[:5000],
-                    "model_id": "eleven_turbo_v2_5",
-                    "voice_settings": {
-                        "stability": 0.5,
-                        "similarity_boost": 0.75
-                    }
-                }
-            )
-            
-            if response.status_code == 401:
-                error_detail = ""
-                try:
-                    error_json = response.json()
-                    error_detail = error_json.get("detail", {}).get("message", "") or str(error_json)
-                except:
-                    error_detail = response.text[:200] if hasattr(response, 'text') else ""
-                
-                if "abuse" in error_detail.lower() or "free tier" in error_detail.lower():
-                    logger.warning(f"ElevenLabs abuse detection triggered: {error_detail[:150]}")
-                else:
-                    logger.error(f"Invalid ElevenLabs API key (401): {error_detail[:150]}")
-                return False
-            
-            if response.status_code == 200:
-                audio_data = response.content
-                # Store in Supabase storage (simplified - you'd upload to storage bucket)
-                audio_url = f"https://storage.example.com/{course_id}/{audio_type}.mp3"
-                
-                # Update existing record with audio_url if it exists, otherwise create new one
-                try:
-                    async with httpx.AsyncClient() as client:
-                        check_response = await client.get(
-                            f"{SUPABASE_URL}/rest/v1/course_audio?course_id=eq.{course_id}&audio_type=eq.{audio_type}",
-                            headers={
-                                "apikey": SUPABASE_SERVICE_KEY,
-                                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                            }
-                        )
-                        if check_response.status_code == 200:
-                            existing = check_response.json()
-                            if existing and len(existing) > 0:
-                                # Update existing record with audio_url
-                                update_response = await client.patch(
-                                    f"{SUPABASE_URL}/rest/v1/course_audio?id=eq.{existing[0]['id']}",
-                                    headers={
-                                        "apikey": SUPABASE_SERVICE_KEY,
-                                        "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                                        "Content-Type": "application/json",
-                                        "Prefer": "return=representation"
-                                    },
-                                    json={
-                                        "audio_url": audio_url,
-                                        "voice_used": "Aria"
-                                    }
-                                )
-                                if update_response.status_code in [200, 204]:
-                                    logger.info(f"✅ Updated {audio_type} with audio URL")
-                                    return True
-                except Exception as e:
-                    logger.debug(f"Could not check/update existing record: {e}")
-                
-                # If no existing record, create new one
-                await insert_to_supabase("course_audio", [{
-                    "course_id": course_id,
-                    "audio_type": audio_type,
-                    "audio_url": audio_url,
-                    "script_text": script,
-                    "duration_seconds": 300 if audio_type == "short_podcast" else 1200,
-                    "voice_used": "Aria"
-                }])
-                
-                logger.info(f"✅ Generated {audio_type} audio")
-                return True  # Return True to indicate success
-            else:
-                error_msg = response.text[:200] if hasattr(response, 'text') else str(response.status_code)
-                logger.warning(f"TTS generation failed with status {response.status_code}: {error_msg}")
-                return False  # Return False to indicate failure
+        segments = await tts.synthesize_segments(script)
+        size = await asyncio.to_thread(AUDIO_STORAGE.save, key, segments)
+        await asyncio.to_thread(tts.discard, script)
+    except TTSError as e:
+        logger.warning(f"TTS generation failed for {audio_type}: {e}")
+        return None
     except Exception as e:
         logger.error(f"TTS error: {e}")
+        return None
+    
+    logger.info(f"✅ Generated {audio_type} audio ({size} bytes)")
+    return AUDIO_STORAGE.url(key)
 
 async def find_resources(course_id: str, topic: str):
-    """Find resources using Brave"""
+    """Find resources using Brave (cached per topic)"""
     if not BRAVE_API_KEY:
-        return
+        return []
     
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.search.brave.com/res/v1/web/search?q={topic}+tutorial+documentation",
-                headers={"X-Subscription-Token": BRAVE_API_KEY}
-            )
-            
-            data = response.json()
-            results = data.get("web", {}).get("results", [])
-            
-            resources = [
-                {
-                    "course_id": course_id,
-                    "title": r["title"],
-                    "type": "article",
-                    "url": r["url"],
-                    "description": r.get("description", ""),
-                    "provider": r["url"].split("/")[2]
-                }
-                for r in results[:5]
-            ]
-            
-            if resources:
-                await insert_to_supabase("course_resources", resources)
-    except Exception as e:
-        logger.error(f"Resource finding error: {e}")
+    resources = await TOPIC_CACHE.get("resources", topic) if TOPIC_CACHE else None
+    if resources is not None:
+        record_span("topic_cache", "resources", time.perf_counter(), status="cache_hit")
+    else:
+        try:
+            results = await brave.web_search(f"{topic} tutorial documentation", count=5)
+        except Exception as e:
+            logger.error(f"Resource finding error: {e}")
+            return []
+        resources = [
+            {
+                "title": r["title"],
+                "type": "article",
+                "url": r["url"],
+                "description": r.get("description", ""),
+                "provider": urlparse(r["url"]).netloc
+            }
+            for r in results
+        ]
+        if resources and TOPIC_CACHE:
+            await TOPIC_CACHE.set("resources", topic, resources)
+    
+    return [{"course_id": course_id, **r} for r in resources]
 
 async def generate_suggestions(course_id: str, topic: str):
-    """Generate continue learning suggestions"""
-    try:
-        prompt = f"Suggest 5 related topics after learning {topic}. Format as JSON: [{{'topic': 'string', 'description': 'string'}}]"
-        data = await call_gemini_with_retry(prompt, service="article")
-        text = data["candidates"][0]["content"]["parts"][0]["text"]
-        
-        json_match = re.search(r'```json\n(.*?)\n```', text, re.DOTALL) or re.search(r'\[.*\]', text, re.DOTALL)
-        suggestions_data = json.loads(json_match.group(1) if json_match.lastindex else json_match.group(0))
-        
+    """Generate continue learning suggestions (cached per topic)"""
+    suggestions = await TOPIC_CACHE.get("suggestions", topic) if TOPIC_CACHE else None
+    if suggestions is not None:
+        record_span("topic_cache", "suggestions", time.perf_counter(), status="cache_hit")
+    else:
+        try:
+            prompt = f"Suggest 5 related topics after learning {topic}. Format as JSON: [{{'topic': 'string', 'description': 'string'}}]"
+            suggestions_data = await generate_structured(prompt, List[Suggestion], task="article")
+        except Exception as e:
+            logger.warning(f"Suggestions generation failed, skipping: {e}")
+            return []
         suggestions = [
-            {"course_id": course_id, "suggestion_topic": s["topic"], "suggestion_description": s["description"], "relevance_score": 5 - i}
+            {"suggestion_topic": s.topic, "suggestion_description": s.description, "relevance_score": 5 - i}
             for i, s in enumerate(suggestions_data)
         ]
-        
-        await insert_to_supabase("course_suggestions", suggestions)
-    except Exception as e:
-        logger.warning(f"Suggestions generation failed, skipping: {e}")
+        if suggestions and TOPIC_CACHE:
+            await TOPIC_CACHE.set("suggestions", topic, suggestions)
+    
+    return [{"course_id": course_id, **s} for s in suggestions]
 
 # Utility functions
 async def insert_to_supabase(table: str, data: list):
@@ -1069,77 +2035,253 @@ async def insert_to_supabase(table: str, data: list):
     if not data:
         return
     
-    async with httpx.AsyncClient() as client:
-        await client.post(
-            f"{SUPABASE_URL}/rest/v1/{table}",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json"
-            },
-            json=data
-        )
+    await postgrest.post(table, json=data)
+
+async def upsert_to_supabase(table: str, data: list, on_conflict: str):
+    """Insert or merge rows on a unique key"""
+    if not data:
+        return
+    
+    await postgrest.post(
+        table,
+        headers={"Prefer": "resolution=merge-duplicates"},
+        params={"on_conflict": on_conflict},
+        json=data
+    )
+
+async def commit_course_content(course_id: str, tables: dict, course_fields: dict) -> dict:
+    """Replace a course's generated rows and update the course row in one transaction.
+    
+    Uses the commit_course_content SQL function; if it isn't installed, falls back to
+    per-table delete + insert with status checks (not atomic). Returns row counts and timing.
+    """
+    content = {
+        table: [{k: v for k, v in row.items() if k != "course_id"} for row in tables.get(table) or []]
+        for table in CONTENT_TABLES if table in tables
+    }
+    # Pending debounced course writes must not land after (and overwrite) the commit
+    await progress_reporter.flush_course(course_id)
+    start = time.perf_counter()
+    response = await postgrest.rpc("commit_course_content", {
+        "p_course_id": course_id,
+        "p_content": content,
+        "p_course_fields": course_fields
+    })
+    if response.status_code == 200:
+        counts = response.json()
+        mode = "rpc"
+    elif response.status_code == 404:
+        logger.warning("⚠️ commit_course_content function missing, committing table by table")
+        counts = await commit_course_content_per_table(course_id, content, course_fields)
+        mode = "per_table"
+    else:
+        raise Exception(f"Content commit failed ({response.status_code}): {response.text[:200]}")
+    
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"💾 [{course_id}] Committed {sum(counts.values())} rows via {mode} in {elapsed_ms}ms: {counts}")
+    return {"rows": counts, "commit_ms": elapsed_ms, "commit_mode": mode}
+
+async def commit_course_content_per_table(course_id: str, content: dict, course_fields: dict) -> dict:
+    """Fallback for commit_course_content: replace each table's rows, then update the course"""
+    async def replace(table: str, rows: list) -> int:
+        response = await postgrest.delete(table, params={"course_id": f"eq.{course_id}"})
+        if response.status_code not in (200, 204):
+            raise Exception(f"Clearing {table} failed ({response.status_code}): {response.text[:200]}")
+        if rows:
+            response = await postgrest.post(table, json=[{**row, "course_id": course_id} for row in rows])
+            if response.status_code not in (200, 201, 204):
+                raise Exception(f"Inserting into {table} failed ({response.status_code}): {response.text[:200]}")
+        return len(rows)
+    
+    counts = await asyncio.gather(*[replace(table, rows) for table, rows in content.items()])
+    if course_fields:
+        response = await postgrest.patch("courses", params={"id": f"eq.{course_id}"}, json=course_fields)
+        response.raise_for_status()
+    return dict(zip(content, counts))
+
+async def delete_courses(course_ids: List[str]) -> dict:
+    """Delete courses and all related rows; returns {"deleted": [ids], "rows": {table: count}}.
+    
+    Uses the delete_courses SQL function (one transaction, one round trip); if it isn't
+    installed, deletes related tables concurrently and only removes the course rows
+    once every related delete succeeded.
+    """
+    start = time.perf_counter()
+    # Stop generation first so it can't write rows for a course that no longer exists
+    await cancel_generation(course_ids, reset=False)
+    response = await postgrest.rpc("delete_courses", {"p_course_ids": course_ids})
+    if response.status_code == 200:
+        result = response.json()
+        result["deleted"] = [str(c) for c in result.get("deleted", [])]
+    elif response.status_code == 404:
+        logger.warning("⚠️ delete_courses function missing, deleting table by table")
+        result = await delete_courses_per_table(course_ids)
+    else:
+        raise Exception(f"Course delete failed ({response.status_code}): {response.text[:200]}")
+    
+    for course_id in result["deleted"]:
+        invalidate_course_bundle(course_id)
+        await asyncio.to_thread(JOB_QUEUE.clear_checkpoints, course_id)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"🗑️  Deleted {len(result['deleted'])}/{len(course_ids)} courses in {elapsed_ms}ms")
+    return result
+
+async def delete_courses_per_table(course_ids: List[str]) -> dict:
+    """Fallback for delete_courses: concurrent related deletes with aggregated errors"""
+    ids = f"in.({','.join(course_ids)})"
+    tables = CONTENT_TABLES + ["course_generation_jobs"]
+    responses = await asyncio.gather(*[
+        postgrest.delete(table, params={"course_id": ids}, headers={"Prefer": "return=minimal, count=exact"})
+        for table in tables
+    ], return_exceptions=True)
+    
+    rows, errors = {}, []
+    for table, response in zip(tables, responses):
+        if isinstance(response, Exception):
+            errors.append(f"{table}: {response}")
+        elif response.status_code == 404:
+            continue  # Optional table not created in this deployment
+        elif response.status_code not in (200, 204):
+            errors.append(f"{table}: {response.status_code} {response.text[:200]}")
+        else:
+            # Content-Range: */<count>
+            total = response.headers.get("content-range", "").rpartition("/")[2]
+            rows[table] = int(total) if total.isdigit() else None
+    if errors:
+        # Course rows are kept so the delete can simply be retried
+        raise Exception(f"Deleting related content failed: {'; '.join(errors)}")
+    
+    response = await postgrest.delete(
+        "courses",
+        params={"id": ids, "select": "id"},
+        headers={"Prefer": "return=representation"}
+    )
+    response.raise_for_status()
+    return {"deleted": [row["id"] for row in response.json()], "rows": rows}
+
+async def send_progress_update(target: str, course_id: str, fields: dict):
+    """PATCH a job ("job") or course ("course") row; called by the progress reporter"""
+    table, column = ("course_generation_jobs", "course_id") if target == "job" else ("courses", "id")
+    response = await postgrest.patch(table, params={column: f"eq.{course_id}"}, json=fields)
+    response.raise_for_status()
+
+# Coalesces progress PATCHes per row; terminal states are written immediately
+progress_reporter = ProgressReporter(
+    send_progress_update,
+    interval=float(os.getenv("PROGRESS_WRITE_INTERVAL_SECONDS", "2.0"))
+)
+
+# course_id -> monotonic time its running timeline was last saved
+timeline_saved_at: Dict[str, float] = {}
 
 async def update_progress(course_id: str, percent: int, step: str):
     """Update job progress"""
-    async with httpx.AsyncClient() as client:
-        await client.patch(
-            f"{SUPABASE_URL}/rest/v1/course_generation_jobs?course_id=eq.{course_id}",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={"progress_percentage": percent, "current_step": step}
-        )
+    progress_bus.publish(course_id, {"type": "progress", "progress": percent, "step": step})
+    progress_reporter.report("job", course_id, {"progress_percentage": percent, "current_step": step})
+    # Running timelines are only for other processes' /timeline reads: save on the write interval
+    if time.monotonic() - timeline_saved_at.get(course_id, 0.0) >= progress_reporter.interval:
+        await save_timeline(course_id, "running")
+
+async def save_timeline(course_id: str, status: str) -> Optional[dict]:
+    """Persist the current course's timeline with its job, so any process can serve it"""
+    timeline = current_timeline.get()
+    if timeline is None:
+        return None
+    summary = {"status": status, **timeline.summary()}
+    await asyncio.to_thread(JOB_QUEUE.save_timeline, course_id, summary)
+    if status == "running":
+        timeline_saved_at[course_id] = time.monotonic()
+    else:
+        timeline_saved_at.pop(course_id, None)
+    return summary
+
+async def report_queue_position(course_id: str) -> Optional[dict]:
+    """Show a waiting course's queue position as its job step"""
+    queue = await asyncio.to_thread(JOB_QUEUE.queue_position, course_id)
+    if queue and queue["status"] == "queued":
+        step = f"⏳ Waiting to start ({queue['position']} in queue, ~{queue['estimated_start_seconds']}s)"
+        progress_bus.publish(course_id, {"type": "queued", "position": queue["position"],
+                                         "estimatedStartSeconds": queue["estimated_start_seconds"]})
+        progress_reporter.report("job", course_id, {"current_step": step})
+    return queue
 
 async def update_course_field(course_id: str, fields: dict):
     """Update course fields"""
-    async with httpx.AsyncClient() as client:
-        await client.patch(
-            f"{SUPABASE_URL}/rest/v1/courses?id=eq.{course_id}",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json"
-            },
-            json=fields
-        )
+    progress_reporter.report("course", course_id, fields)
 
-async def finalize_job(course_id: str, duration: int):
+async def finalize_job(course_id: str, duration: int, commit: Optional[dict] = None):
     """Finalize generation job"""
-    async with httpx.AsyncClient() as client:
-        await client.patch(
-            f"{SUPABASE_URL}/rest/v1/course_generation_jobs?course_id=eq.{course_id}",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "status": "completed",
-                "progress_percentage": 100,
-                "current_step": "Course ready!",
-                "completed_at": datetime.utcnow().isoformat()
-            }
-        )
+    timeline = await save_timeline(course_id, "completed")
+    if timeline:
+        commit = {**(commit or {}), "api_cost_usd": timeline["totals"]["cost_usd"]}
+    progress_bus.publish(course_id, {"type": "completed", "progress": 100, "duration": duration, **(commit or {})})
+    invalidate_course_bundle(course_id)
+    await progress_reporter.flush_course(course_id, {"job": {
+        "status": "completed",
+        "progress_percentage": 100,
+        "current_step": "Course ready!",
+        "completed_at": datetime.utcnow().isoformat()
+    }})
+
+async def reopen_generation_job(course_id: str):
+    """Move a failed job back to processing before a resume"""
+    await progress_reporter.flush_course(course_id, {"job": {
+        "status": "processing",
+        "error_message": None,
+        "completed_at": None,
+        "current_step": "Resuming from last checkpoint"
+    }})
+
+async def cancel_generation(course_ids: List[str], reset: bool = True) -> Dict[str, str]:
+    """Cancel queued or running generation of these courses; returns {course_id: "queued" | "running"}.
+    
+    Jobs running in this process are cancelled at once, which aborts their in-flight provider
+    requests, and are awaited while they clean up. Jobs in other worker processes stop at their
+    next cancellation check. With reset, courses whose job never started go back to draft.
+    """
+    cancelled = await asyncio.to_thread(JOB_QUEUE.cancel, course_ids)
+    if worker_pool:
+        tasks = [worker_pool.cancel_local(c) for c, status in cancelled.items() if status == "running"]
+        tasks = [task for task in tasks if task is not None]
+        if tasks:
+            await asyncio.wait(tasks, timeout=GENERATION_CANCEL_WAIT_SECONDS)
+    if reset:
+        await asyncio.gather(*[mark_job_cancelled(c) for c, status in cancelled.items() if status == "queued"])
+    if cancelled:
+        logger.info(f"🛑 Cancelled generation of {len(cancelled)} courses")
+    return cancelled
+
+async def discard_partial_course(course_id: str):
+    """After a cancellation: remove rows written so far (e.g. streamed chapters) and mark the job"""
+    try:
+        await commit_course_content(course_id, {table: [] for table in CONTENT_TABLES}, {})
+        await mark_job_cancelled(course_id)
+    except Exception as e:
+        logger.error(f"💥 Cleanup after cancelling {course_id} failed: {e}")
+
+async def mark_job_cancelled(course_id: str):
+    """Mark job as cancelled and return the course to draft"""
+    await save_timeline(course_id, "cancelled")
+    progress_bus.publish(course_id, {"type": "cancelled"})
+    invalidate_course_bundle(course_id)
+    await progress_reporter.flush_course(course_id, {
+        "job": {
+            "status": "cancelled",
+            "current_step": "Generation cancelled",
+            "completed_at": datetime.utcnow().isoformat()
+        },
+        "course": {"status": "draft"}
+    })
 
 async def mark_job_failed(course_id: str, error: str):
     """Mark job as failed"""
-    async with httpx.AsyncClient() as client:
-        await client.patch(
-            f"{SUPABASE_URL}/rest/v1/course_generation_jobs?course_id=eq.{course_id}",
-            headers={
-                "apikey": SUPABASE_SERVICE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "status": "failed",
-                "error_message": error,
-                "completed_at": datetime.utcnow().isoformat()
-            }
-        )
+    await save_timeline(course_id, "failed")
+    progress_bus.publish(course_id, {"type": "failed", "error": error})
+    await progress_reporter.flush_course(course_id, {"job": {
+        "status": "failed",
+        "error_message": error,
+        "completed_at": datetime.utcnow().isoformat()
+    }})
 
 if __name__ == "__main__":
     port = int(os.getenv("SERVICE_PORT", "8008"))
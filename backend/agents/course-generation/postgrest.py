@@ -0,0 +1,151 @@
+"""
+PostgREST Client
+================
+One pooled httpx client for all Supabase REST calls made by course
+generation. Auth headers are set once, transient gateway errors are retried,
+and per-table request timings are kept for /health.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+from http_pool import LazyAsyncClient, pool_limits
+from timeline import record_span, span_status
+
+logger = logging.getLogger(__name__)
+
+# 503 means PostgREST never ran the request, so every method may retry it;
+# 502/504 may have reached the database, so only idempotent requests retry
+RETRY_ALWAYS = {503}
+RETRY_IDEMPOTENT = {502, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "DELETE", "PATCH", "PUT"}
+
+
+class TableMetrics:
+    __slots__ = ("requests", "errors", "retries", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class PostgrestClient:
+    """Shared connection pool for the Supabase REST API"""
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        service_key: Optional[str],
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        max_retries: int = 3,
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.service_key = service_key or ""
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.metrics = defaultdict(TableMetrics)
+        self._http = LazyAsyncClient(
+            base_url=f"{self.base_url}/rest/v1",
+            headers={
+                "apikey": self.service_key,
+                "Authorization": f"Bearer {self.service_key}",
+                "Content-Type": "application/json",
+            },
+            timeout=self.timeout,
+            limits=pool_limits(self.max_connections),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._http.get()
+
+    async def request(
+        self,
+        method: str,
+        table: str,
+        *,
+        params: Optional[dict] = None,
+        json=None,
+        headers: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        """Send one request, retrying transient failures with backoff"""
+        method = method.upper()
+        metrics = self.metrics[table]
+        kwargs = {"params": params, "json": json, "headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        for attempt in range(self.max_retries):
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, f"/{table}", **kwargs)
+            except httpx.TransportError as e:
+                self._record(metrics, start, error=True)
+                record_span("supabase", f"{method} {table}", start, status="error", attempt=attempt)
+                # Connection-level failures: the request may not have been sent
+                if attempt < self.max_retries - 1 and (method in IDEMPOTENT_METHODS or isinstance(e, httpx.ConnectError)):
+                    metrics.retries += 1
+                    await asyncio.sleep(0.2 * 2 ** attempt)
+                    continue
+                raise
+            retryable = response.status_code in RETRY_ALWAYS or (
+                response.status_code in RETRY_IDEMPOTENT and method in IDEMPOTENT_METHODS
+            )
+            self._record(metrics, start, error=response.status_code >= 400)
+            record_span("supabase", f"{method} {table}", start, status=span_status(response), attempt=attempt)
+            if retryable and attempt < self.max_retries - 1:
+                metrics.retries += 1
+                logger.warning(f"⏳ [postgrest] {method} {table} returned {response.status_code}, retrying...")
+                await asyncio.sleep(0.2 * 2 ** attempt)
+                continue
+            return response
+        return response
+
+    @staticmethod
+    def _record(metrics: TableMetrics, start: float, error: bool) -> None:
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.requests += 1
+        metrics.total_ms += elapsed
+        metrics.max_ms = max(metrics.max_ms, elapsed)
+        if error:
+            metrics.errors += 1
+
+    async def get(self, table: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", table, **kwargs)
+
+    async def post(self, table: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", table, **kwargs)
+
+    async def patch(self, table: str, **kwargs) -> httpx.Response:
+        return await self.request("PATCH", table, **kwargs)
+
+    async def delete(self, table: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", table, **kwargs)
+
+    async def rpc(self, function: str, payload: dict, **kwargs) -> httpx.Response:
+        return await self.request("POST", f"rpc/{function}", json=payload, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    def stats(self) -> dict:
+        return {table: m.as_dict() for table, m in sorted(self.metrics.items())}
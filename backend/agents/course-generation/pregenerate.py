@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Trending Topic Pre-generation
+=============================
+Off-peak warm-up of the topic template store. Reads the most requested
+(normalised) topics from `courses` and, for each one without a fresh template,
+generates the course content straight into the topic index
+(main.generate_course_template). Peak-time requests for those topics are then
+cloned from the template instead of generated.
+
+A pass stops starting topics when its API budget (estimated USD and call
+count) would be exceeded or the off-peak window closes, and waits while user
+jobs are queued so it never competes with them for keys.
+
+    python pregenerate.py                    # every day inside PREGEN_WINDOW_UTC
+    python pregenerate.py --once             # one pass now (e.g. from cron)
+    python pregenerate.py --once --dry-run   # list trending topics and what a pass would do
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+from collections import Counter, defaultdict
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from main import (
+    CPU_POOL, JOB_QUEUE, TOPIC_INDEX, TOPIC_REUSE_THRESHOLD, brave, generate_course_template, logger, postgrest,
+    progress_reporter, tts,
+)
+from topic_index import normalise_topic
+
+PREGEN_WINDOW_UTC = os.getenv("PREGEN_WINDOW_UTC", "02:00-05:00")
+PREGEN_LOOKBACK_DAYS = int(os.getenv("PREGEN_LOOKBACK_DAYS", "7"))
+PREGEN_TOP_TOPICS = int(os.getenv("PREGEN_TOP_TOPICS", "10"))
+# A topic must have been requested at least this often in the lookback window
+PREGEN_MIN_REQUESTS = int(os.getenv("PREGEN_MIN_REQUESTS", "3"))
+# Templates younger than this are left alone; older ones are regenerated
+PREGEN_REFRESH_HOURS = float(os.getenv("PREGEN_REFRESH_HOURS", "72"))
+# Per-pass API budget: estimated USD (timeline pricing) and API calls; 0 = no limit
+PREGEN_BUDGET_USD = float(os.getenv("PREGEN_BUDGET_USD", "2.0"))
+PREGEN_MAX_CALLS = int(os.getenv("PREGEN_MAX_CALLS", "300"))
+PREGEN_AUDIO = os.getenv("PREGEN_AUDIO", "true").lower() == "true"
+PREGEN_SCAN_LIMIT = int(os.getenv("PREGEN_SCAN_LIMIT", "5000"))
+# How long to wait for queued user jobs to drain before checking again
+PREGEN_YIELD_SECONDS = 30
+
+
+def trending_topics(titles: List[str], top_n: int, min_requests: int) -> List[dict]:
+    """Most requested topics by normalised form, each shown as its most common spelling"""
+    counts = Counter()
+    spellings = defaultdict(Counter)
+    for title in titles:
+        if not title or not title.strip():
+            continue
+        normalised = normalise_topic(title)
+        counts[normalised] += 1
+        spellings[normalised][title.strip()] += 1
+    return [
+        {"topic": spellings[normalised].most_common(1)[0][0], "normalised": normalised, "requests": count}
+        for normalised, count in counts.most_common(top_n)
+        if count >= min_requests
+    ]
+
+
+async def fetch_requested_titles(days: int, limit: int) -> List[str]:
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    response = await postgrest.get("courses", params={
+        "select": "title",
+        "created_at": f"gte.{since}",
+        "order": "created_at.desc",
+        "limit": str(limit),
+    })
+    response.raise_for_status()
+    return [row.get("title") for row in response.json()]
+
+
+class Budget:
+    """API spend of one pass; a topic only starts if the costliest topic so far would still fit"""
+
+    def __init__(self, usd: float, calls: int):
+        self.usd = usd
+        self.calls = calls
+        self.spent_usd = 0.0
+        self.spent_calls = 0
+        self.largest_usd = 0.0
+        self.largest_calls = 0
+
+    def allows_another(self) -> bool:
+        if self.usd and self.spent_usd + self.largest_usd > self.usd:
+            return False
+        if self.calls and self.spent_calls + self.largest_calls > self.calls:
+            return False
+        return True
+
+    def charge(self, usd: float, calls: int) -> None:
+        self.spent_usd += usd
+        self.spent_calls += calls
+        self.largest_usd = max(self.largest_usd, usd)
+        self.largest_calls = max(self.largest_calls, calls)
+
+    def as_dict(self) -> dict:
+        return {"budget_usd": self.usd, "spent_usd": round(self.spent_usd, 4),
+                "max_calls": self.calls, "spent_calls": self.spent_calls}
+
+
+async def wait_for_idle_queue(deadline: Optional[datetime]) -> bool:
+    """Wait until no user jobs are queued; False if the deadline passed first"""
+    while (await asyncio.to_thread(JOB_QUEUE.stats))["depth"]:
+        if deadline and datetime.now(timezone.utc) + timedelta(seconds=PREGEN_YIELD_SECONDS) >= deadline:
+            return False
+        logger.info("⏸️ User jobs are queued, pre-generation waits")
+        await asyncio.sleep(PREGEN_YIELD_SECONDS)
+    return True
+
+
+async def run_pass(deadline: Optional[datetime] = None, dry_run: bool = False) -> dict:
+    """Warm or refresh templates for today's trending topics within the budget"""
+    if not TOPIC_INDEX:
+        raise RuntimeError("TOPIC_REUSE_ENABLED is off; pre-generated templates would never be used")
+    titles = await fetch_requested_titles(PREGEN_LOOKBACK_DAYS, PREGEN_SCAN_LIMIT)
+    topics = trending_topics(titles, PREGEN_TOP_TOPICS, PREGEN_MIN_REQUESTS)
+    budget = Budget(PREGEN_BUDGET_USD, PREGEN_MAX_CALLS)
+    results = []
+    logger.info(f"📈 {len(topics)} trending topics from {len(titles)} recent courses")
+
+    for entry in topics:
+        age = await asyncio.to_thread(TOPIC_INDEX.template_age, entry["topic"], TOPIC_REUSE_THRESHOLD)
+        refresh = age is not None
+        if refresh and age < PREGEN_REFRESH_HOURS * 3600:
+            results.append({**entry, "action": "fresh", "template_age_hours": round(age / 3600, 1)})
+            continue
+        action = "refresh" if refresh else "generate"
+        if dry_run:
+            results.append({**entry, "action": action})
+            continue
+        if deadline and datetime.now(timezone.utc) >= deadline:
+            results.append({**entry, "action": "skipped", "reason": "off-peak window closed"})
+            continue
+        if not budget.allows_another():
+            results.append({**entry, "action": "skipped", "reason": "budget"})
+            continue
+        if not await wait_for_idle_queue(deadline):
+            results.append({**entry, "action": "skipped", "reason": "user jobs queued until the window closed"})
+            continue
+
+        logger.info(f"🔥 Pre-generating '{entry['topic']}' ({entry['requests']} requests, {action})")
+        # Own task: the cache bypass and timeline it sets stay out of this loop's context
+        outcome = await asyncio.create_task(
+            generate_course_template(entry["topic"], refresh=refresh, synthesize_audio=PREGEN_AUDIO)
+        )
+        budget.charge(outcome["api_cost_usd"], outcome["api_calls"])
+        if outcome["stored"]:
+            logger.info(f"✅ Template ready for '{entry['topic']}' (${outcome['api_cost_usd']:.4f}, "
+                        f"{outcome['api_calls']} calls)")
+        else:
+            logger.warning(f"⚠️ Pre-generation of '{entry['topic']}' failed: {outcome.get('error')}")
+        results.append({**entry, "action": action, **outcome})
+
+    return {"topics": results, **budget.as_dict()}
+
+
+def parse_window(window: str) -> Tuple[dtime, dtime]:
+    """'02:00-05:00' -> (start, end); the window may wrap midnight ('22:00-04:00')"""
+    start, _, end = window.partition("-")
+    return dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())
+
+
+def current_window(now: datetime, window: Tuple[dtime, dtime]) -> Tuple[datetime, datetime]:
+    """Start and end of the window containing `now`, or else of the next one"""
+    start_time, end_time = window
+    for day in (now.date() - timedelta(days=1), now.date(), now.date() + timedelta(days=1)):
+        start = datetime.combine(day, start_time, tzinfo=timezone.utc)
+        end = datetime.combine(day, end_time, tzinfo=timezone.utc)
+        if end <= start:
+            end += timedelta(days=1)
+        if now < end:
+            return start, end
+    raise ValueError(f"Invalid pre-generation window: {window}")
+
+
+async def run_scheduler(stop: asyncio.Event) -> None:
+    window = parse_window(PREGEN_WINDOW_UTC)
+    last_window_start = None
+    while not stop.is_set():
+        now = datetime.now(timezone.utc)
+        start, end = current_window(now, window)
+        if start <= now and start != last_window_start:
+            last_window_start = start
+            try:
+                summary = await run_pass(deadline=end)
+                logger.info(f"📊 Pre-generation pass: {json.dumps(summary)}")
+            except Exception as e:
+                logger.error(f"💥 Pre-generation pass failed: {e}")
+            continue
+        wake = start if start > now else end
+        if wake == start:
+            logger.info(f"💤 Next pre-generation window starts {start.isoformat()}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=max(1.0, (wake - now).total_seconds()))
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main(args) -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: fall back to KeyboardInterrupt
+            pass
+
+    await CPU_POOL.start()
+    try:
+        if args.once:
+            print(json.dumps(await run_pass(dry_run=args.dry_run), indent=2))
+        else:
+            await run_scheduler(stop)
+    finally:
+        await progress_reporter.flush_all()
+        await postgrest.aclose()
+        await tts.aclose()
+        await brave.aclose()
+        CPU_POOL.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="run one pass now instead of scheduling")
+    parser.add_argument("--dry-run", action="store_true", help="with --once: only report what would be generated")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
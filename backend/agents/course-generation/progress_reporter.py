@@ -0,0 +1,93 @@
+"""
+Progress Reporter
+=================
+Coalesces job/course row updates per course and writes them in the
+background, at most once per interval per row. Terminal states (completed,
+failed) are flushed immediately. Generation code never waits on Supabase for
+intermediate progress.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (target, course_id) identifies one row; target is "job" or "course"
+RowKey = Tuple[str, str]
+Sender = Callable[[str, str, dict], Awaitable[None]]
+
+
+class ProgressReporter:
+    """Debounced, per-row write coalescing for progress PATCHes"""
+
+    def __init__(self, send: Sender, interval: float = 2.0):
+        self.send = send
+        self.interval = interval
+        self._pending: Dict[RowKey, dict] = {}
+        self._last_write: Dict[RowKey, float] = {}
+        self._locks: Dict[RowKey, asyncio.Lock] = {}
+        self._scheduled: Dict[RowKey, asyncio.Task] = {}
+        self.writes = 0
+        self.coalesced = 0
+
+    def report(self, target: str, course_id: str, fields: dict) -> None:
+        """Queue fields for a row; the write happens later in the background"""
+        key = (target, course_id)
+        if key in self._pending:
+            self.coalesced += 1
+            self._pending[key].update(fields)
+        else:
+            self._pending[key] = dict(fields)
+        if key not in self._scheduled:
+            delay = max(0.0, self.interval - (time.monotonic() - self._last_write.get(key, 0.0)))
+            self._scheduled[key] = asyncio.create_task(self._flush_later(key, delay))
+
+    async def flush_course(self, course_id: str, terminal: Optional[Dict[str, dict]] = None) -> None:
+        """Write everything pending for a course now, merged with `terminal` fields per target"""
+        for target, fields in (terminal or {}).items():
+            key = (target, course_id)
+            self._pending.setdefault(key, {}).update(fields)
+        keys = [key for key in list(self._pending) if key[1] == course_id]
+        await asyncio.gather(*[self._flush(key) for key in keys])
+        # Terminal state written: forget the course so the dicts don't grow forever
+        for key in keys:
+            task = self._scheduled.pop(key, None)
+            if task and task is not asyncio.current_task():
+                task.cancel()
+            self._last_write.pop(key, None)
+            self._locks.pop(key, None)
+
+    async def flush_all(self) -> None:
+        await asyncio.gather(*[self._flush(key) for key in list(self._pending)])
+
+    async def _flush_later(self, key: RowKey, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        self._scheduled.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: RowKey) -> None:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            fields = self._pending.pop(key, None)
+            if not fields:
+                return
+            try:
+                await self.send(key[0], key[1], fields)
+                self.writes += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Progress write for {key[0]} {key[1]} failed: {e}")
+            finally:
+                self._last_write[key] = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "pending_rows": len(self._pending),
+            "interval_seconds": self.interval,
+        }
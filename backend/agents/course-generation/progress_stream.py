@@ -0,0 +1,122 @@
+"""
+Progress Stream
+===============
+Pub/sub for course generation events (progress updates, partial chapter
+checkpoints, completion). Subscribers receive events as Server-Sent Events so
+the frontend can render chapters while later ones are still being written.
+
+Events reach subscribers in the same process directly. With a relay (the
+shared job queue database) they are also logged there, and subscribers poll
+the log, so the API streams courses generated by worker.py processes too.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = {"completed", "failed", "cancelled"}
+
+
+class ProgressBus:
+    """Fan-out of per-course events to any number of subscribers, in any process sharing the relay"""
+
+    def __init__(self, max_queue_size: int = 256, relay=None, poll_interval: float = 0.5):
+        self.max_queue_size = max_queue_size
+        # Event log shared across processes: append_events / last_event_id / events_since (JobQueue)
+        self.relay = relay
+        self.poll_interval = poll_interval
+        self.origin = uuid.uuid4().hex  # events this bus logged are already delivered locally
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._pending: List[tuple] = []
+        self._relaying: Optional[asyncio.Task] = None
+
+    def publish(self, course_id: str, event: dict) -> None:
+        """Deliver an event without ever blocking the publisher"""
+        for queue in list(self._subscribers.get(course_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: drop the oldest event rather than stall generation
+                try:
+                    queue.get_nowait()
+                    queue.put_nowait(event)
+                except (asyncio.QueueEmpty, asyncio.QueueFull):
+                    pass
+        if self.relay is not None:
+            self._pending.append((course_id, event))
+            if self._relaying is None or self._relaying.done():
+                self._relaying = asyncio.get_running_loop().create_task(self._relay_pending())
+
+    async def _relay_pending(self) -> None:
+        # Events published while a batch is being written go out in the next one
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self.relay.append_events, self.origin, batch)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not relay {len(batch)} progress events: {e}")
+
+    async def flush(self) -> None:
+        """Wait until published events are in the relay (before the process exits)"""
+        if self._relaying is not None:
+            await self._relaying
+
+    async def subscribe(self, course_id: str, heartbeat: float = 15.0,
+                        finished: Optional[Callable[[], Awaitable[Optional[dict]]]] = None) -> AsyncIterator[str]:
+        """Yield SSE-formatted events until the course reaches a terminal state.
+
+        finished looks the course's state up at the source and returns its terminal event if the
+        run is already over. It is checked once subscribed and on every heartbeat, so a course that
+        finished before the client connected (or whose terminal event was missed) still ends the stream.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers[course_id].add(queue)
+        last_id = await asyncio.to_thread(self.relay.last_event_id, course_id) if self.relay is not None else 0
+        last_sent = last_poll = time.monotonic()
+        try:
+            event = await finished() if finished is not None else None
+            if event is not None:
+                yield self._format(event)
+                return
+            while True:
+                try:
+                    events = [await asyncio.wait_for(
+                        queue.get(), timeout=self.poll_interval if self.relay is not None else heartbeat
+                    )]
+                except asyncio.TimeoutError:
+                    events = []
+                if self.relay is not None and time.monotonic() - last_poll >= self.poll_interval:
+                    last_poll = time.monotonic()
+                    last_id, relayed = await asyncio.to_thread(self.relay.events_since, course_id, last_id, self.origin)
+                    events += relayed
+                if not events:
+                    if time.monotonic() - last_sent >= heartbeat:
+                        last_sent = time.monotonic()
+                        event = await finished() if finished is not None else None
+                        if event is not None:
+                            yield self._format(event)
+                            return
+                        yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    last_sent = time.monotonic()
+                    yield self._format(event)
+                    if event.get("type") in TERMINAL_EVENTS:
+                        return
+        finally:
+            self._subscribers[course_id].discard(queue)
+            if not self._subscribers[course_id]:
+                self._subscribers.pop(course_id, None)
+
+    @staticmethod
+    def _format(event: dict) -> str:
+        return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
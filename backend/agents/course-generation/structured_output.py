@@ -0,0 +1,269 @@
+"""
+Structured Output
+=================
+Turns LLM responses into validated Python objects. Responses requested in
+JSON mode usually parse directly; everything else goes through a single-pass
+scanner that finds the first JSON value (without greedy regexes) and repairs
+the usual damage on the way: code fences, single quotes, trailing commas,
+Python literals, raw newlines in strings, comments and truncated output.
+The result is validated against a pydantic schema; for lists, invalid items
+are dropped instead of failing the whole response.
+"""
+
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, get_args, get_origin
+
+from pydantic import TypeAdapter, ValidationError
+
+logger = logging.getLogger(__name__)
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_DANGLING_KEY_RE = re.compile(r',?\s*"(?:[^"\\]|\\.)*"\s*:\s*$')
+_DANGLING_STRING_RE = re.compile(r'(?<=[{,])\s*"(?:[^"\\]|\\.)*"$')
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class StructuredOutputError(Exception):
+    """The response contained no usable JSON for the requested schema"""
+
+
+def _next_significant(text: str, i: int) -> Tuple[str, bool]:
+    """Next non-whitespace char after i, and whether a newline was skipped to reach it"""
+    newline = False
+    while i < len(text) and text[i].isspace():
+        newline = newline or text[i] == "\n"
+        i += 1
+    return (text[i] if i < len(text) else ""), newline
+
+
+def _closes_string(text: str, i: int) -> bool:
+    """Whether the quote at i ends the string (vs. an unescaped quote inside it)"""
+    nxt, newline = _next_significant(text, i + 1)
+    return nxt in ("", ",", ":", "}", "]") or newline
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str, start: int = 0) -> str:
+    """Scan one JSON value beginning at text[start] and return it as valid-looking JSON"""
+    out: List[str] = []
+    stack: List[str] = []
+    quote: Optional[str] = None
+    i, n = start, len(text)
+    while i < n:
+        c = text[i]
+        if quote:
+            if c == "\\" and i + 1 < n:
+                nxt = text[i + 1]
+                # \' is not a JSON escape
+                out.append("'" if nxt == "'" else c + nxt)
+                i += 2
+                continue
+            if c == quote and _closes_string(text, i):
+                out.append('"')
+                quote = None
+            elif c == '"':
+                out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            elif c == "\r":
+                out.append("\\r")
+            elif c == "\t":
+                out.append("\\t")
+            else:
+                out.append(c)
+            i += 1
+            continue
+
+        if c in "\"'":
+            quote = c
+            out.append('"')
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+        elif c in "}]":
+            _strip_trailing_comma(out)
+            if stack and stack[-1] == c:
+                stack.pop()
+                out.append(c)
+            if not stack:
+                return "".join(out)
+        elif c == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = n if newline == -1 else newline
+            continue
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif _next_significant(text, j)[0] == ":":
+                out.append(f'"{word}"')  # unquoted key
+            else:
+                out.append(word)
+            i = j
+            continue
+        else:
+            out.append(c)
+        i += 1
+
+    # Truncated output: close whatever is still open
+    if quote:
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    repaired = _DANGLING_KEY_RE.sub("", repaired)
+    if stack and stack[-1] == "}":
+        repaired = _DANGLING_STRING_RE.sub("", repaired)  # key cut off before its colon
+    repaired = repaired.rstrip().rstrip(",")
+    return repaired + "".join(reversed(stack))
+
+
+def extract_json(text: str, prefer: str = "") -> Any:
+    """Parse the first JSON value in an LLM response, repairing it if needed.
+
+    `prefer` ("[" or "{") picks which kind of value to look for first.
+    """
+    if not text or not text.strip():
+        raise StructuredOutputError("Empty response")
+
+    # Fast path: JSON mode responses are already valid
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    fence = _FENCE_RE.search(text)
+    body = fence.group(1).strip() if fence else text.strip()
+    if fence:
+        try:
+            return json.loads(body)
+        except ValueError:
+            pass
+
+    starts = [i for i in (body.find(prefer) if prefer else -1, body.find("{"), body.find("[")) if i != -1]
+    if not starts:
+        raise StructuredOutputError(f"No JSON found in response: {body[:120]!r}")
+    start = starts[0] if prefer and body.find(prefer) != -1 else min(starts)
+    repaired = repair_json(body, start)
+    try:
+        return json.loads(repaired)
+    except ValueError as e:
+        raise StructuredOutputError(f"Unrepairable JSON ({e}): {repaired[:120]!r}") from e
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def _list_item_type(schema):
+    return get_args(schema)[0] if get_origin(schema) in (list, List) else None
+
+
+def is_list_schema(schema) -> bool:
+    return _list_item_type(schema) is not None
+
+
+def _validate_items(value: list, item_type) -> list:
+    """Validate list items one by one, keeping the valid ones"""
+    item_adapter = _adapter(item_type)
+    items = []
+    for raw in value:
+        try:
+            items.append(item_adapter.validate_python(raw))
+        except ValidationError:
+            continue
+    if len(items) < len(value):
+        logger.warning(f"⚠️ Dropped {len(value) - len(items)}/{len(value)} invalid {item_type.__name__} items")
+    return items
+
+
+def parse_structured(text: str, schema):
+    """Extract, repair and validate a response against a pydantic type (e.g. List[Model])"""
+    item_type = _list_item_type(schema)
+    value = extract_json(text, prefer="[" if item_type else "{")
+
+    # JSON-object modes wrap lists: {"items": [...]} -> [...]
+    if item_type and isinstance(value, dict):
+        lists = [v for v in value.values() if isinstance(v, list)]
+        if len(lists) == 1:
+            value = lists[0]
+
+    try:
+        return _adapter(schema).validate_python(value)
+    except ValidationError as e:
+        if not (item_type and isinstance(value, list)):
+            raise StructuredOutputError(f"Response does not match schema: {e}") from e
+
+    # Keep the valid items rather than throwing the whole list away
+    items = _validate_items(value, item_type)
+    if not items:
+        raise StructuredOutputError(f"No item in the response matches {item_type.__name__}")
+    return items
+
+
+def parse_sections(text: str, sections: Dict[str, Any]) -> Dict[str, list]:
+    """Validate an object of independent lists (e.g. a fused multi-artefact response).
+
+    Each section is validated on its own, so one bad section doesn't discard the
+    others; a missing or unusable section comes back as an empty list.
+    """
+    value = extract_json(text, prefer="{")
+    if not isinstance(value, dict):
+        raise StructuredOutputError("Expected a JSON object with one list per section")
+    result = {}
+    for name, item_type in sections.items():
+        raw = value.get(name)
+        result[name] = _validate_items(raw, item_type) if isinstance(raw, list) else []
+    if not any(result.values()):
+        raise StructuredOutputError(f"No usable section among {', '.join(sections)}")
+    return result
+
+
+# Keywords of the OpenAPI subset Gemini's responseSchema accepts
+_GEMINI_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items", "minItems", "maxItems"}
+
+
+@lru_cache(maxsize=None)
+def gemini_schema(schema) -> dict:
+    """Convert a pydantic type into a Gemini responseSchema (refs inlined, unsupported keys dropped)"""
+    root = _adapter(schema).json_schema()
+    defs = root.get("$defs", {})
+
+    def convert(node: dict) -> dict:
+        if "$ref" in node:
+            node = defs[node["$ref"].rsplit("/", 1)[-1]]
+        variants = node.get("anyOf")
+        if variants:
+            # Optional[X] -> X + nullable
+            non_null = [v for v in variants if v.get("type") != "null"]
+            result = convert(non_null[0]) if non_null else {"type": "STRING"}
+            if len(non_null) < len(variants):
+                result["nullable"] = True
+            return result
+        result = {}
+        for key, value in node.items():
+            if key not in _GEMINI_KEYS:
+                continue
+            if key == "type":
+                result[key] = value.upper()
+            elif key == "properties":
+                result[key] = {name: convert(prop) for name, prop in value.items()}
+                result["propertyOrdering"] = list(value)
+            elif key == "items":
+                result[key] = convert(value)
+            else:
+                result[key] = value
+        return result
+
+    return convert(root)
@@ -0,0 +1,189 @@
+"""
+Generation Timeline
+===================
+Records every external call made while a course is generated (LLM, TTS,
+search, database) as a span: stage, provider, operation, key id, latency,
+attempt, outcome and token/character counts. Spans are collected into a
+per-course Timeline through a ContextVar, so the call sites don't need the
+course id threaded through them, and summarised per stage, provider and key
+with an estimated API cost.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Timeline of the course being generated in this context (None outside generation)
+current_timeline: ContextVar[Optional["Timeline"]] = ContextVar("current_timeline", default=None)
+# Checkpointed stage the current code runs under
+current_stage: ContextVar[str] = ContextVar("current_stage", default="orchestrator")
+
+# USD list prices; override with API_PRICING='{"gemini": {"input_per_million": 0.075}}'
+DEFAULT_PRICING = {
+    "gemini": {"input_per_million": 0.10, "output_per_million": 0.40},
+    "groq": {"input_per_million": 0.11, "output_per_million": 0.34},
+    "elevenlabs": {"per_thousand_chars": 0.30},
+    "brave": {"per_request": 0.005},
+}
+
+
+def load_pricing() -> Dict[str, dict]:
+    pricing = {provider: dict(prices) for provider, prices in DEFAULT_PRICING.items()}
+    for provider, prices in json.loads(os.getenv("API_PRICING", "{}")).items():
+        pricing.setdefault(provider, {}).update(prices)
+    return pricing
+
+
+def key_id(api_key: Optional[str]) -> Optional[str]:
+    """Stable, non-reversible identifier for an API key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:8] if api_key else None
+
+
+class Span:
+    __slots__ = ("stage", "provider", "operation", "key_id", "start_ms", "latency_ms", "attempt", "status",
+                 "input_tokens", "output_tokens", "characters", "cost_usd")
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class StageTotals:
+    __slots__ = ("calls", "retries", "errors", "rate_limited", "cache_hits", "latency_ms", "wasted_ms",
+                 "input_tokens", "output_tokens", "characters", "cost_usd")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def add(self, span: Span) -> None:
+        if span.status == "cache_hit":
+            self.cache_hits += 1
+            return
+        self.calls += 1
+        self.retries += span.attempt > 0
+        self.errors += span.status == "error"
+        self.rate_limited += span.status == "rate_limited"
+        self.latency_ms += span.latency_ms
+        if span.status != "ok":
+            self.wasted_ms += span.latency_ms
+        self.input_tokens += span.input_tokens
+        self.output_tokens += span.output_tokens
+        self.characters += span.characters
+        self.cost_usd += span.cost_usd
+
+    def as_dict(self) -> dict:
+        result = {name: getattr(self, name) for name in self.__slots__}
+        result["latency_ms"] = round(self.latency_ms, 1)
+        result["wasted_ms"] = round(self.wasted_ms, 1)
+        result["cost_usd"] = round(self.cost_usd, 6)
+        return result
+
+
+class Timeline:
+    """Spans and stage intervals of one course generation"""
+
+    def __init__(self, course_id: str, pricing: Optional[Dict[str, dict]] = None):
+        self.course_id = course_id
+        self.pricing = pricing if pricing is not None else load_pricing()
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.stages: Dict[str, dict] = {}
+
+    def _elapsed_ms(self, at: float) -> float:
+        return round((at - self.started) * 1000, 1)
+
+    def cost(self, provider: str, status: str, input_tokens: int, output_tokens: int, characters: int) -> float:
+        if status != "ok":
+            return 0.0  # rejected and failed requests aren't billed
+        prices = self.pricing.get(provider, {})
+        return (
+            input_tokens * prices.get("input_per_million", 0.0) / 1_000_000
+            + output_tokens * prices.get("output_per_million", 0.0) / 1_000_000
+            + characters * prices.get("per_thousand_chars", 0.0) / 1000
+            + prices.get("per_request", 0.0)
+        )
+
+    def add(self, provider: str, operation: str, start: float, status: str = "ok", attempt: int = 0,
+            key: Optional[str] = None, input_tokens: int = 0, output_tokens: int = 0, characters: int = 0) -> None:
+        span = Span()
+        span.stage = current_stage.get()
+        span.provider = provider
+        span.operation = operation
+        span.key_id = key_id(key)
+        span.start_ms = self._elapsed_ms(start)
+        span.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        span.attempt = attempt
+        span.status = status
+        span.input_tokens = input_tokens or 0
+        span.output_tokens = output_tokens or 0
+        span.characters = characters
+        span.cost_usd = self.cost(provider, status, span.input_tokens, span.output_tokens, characters)
+        self.spans.append(span)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Attribute spans to `name` and record the stage's start/end"""
+        token = current_stage.set(name)
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            yield
+            status = "completed"
+        finally:
+            current_stage.reset(token)
+            self.stages[name] = {
+                "start_ms": self._elapsed_ms(start),
+                "end_ms": self._elapsed_ms(time.perf_counter()),
+                "status": status,
+            }
+
+    def summary(self, include_spans: bool = True) -> dict:
+        totals = StageTotals()
+        by_stage, by_provider, by_key = defaultdict(StageTotals), defaultdict(StageTotals), defaultdict(StageTotals)
+        for span in self.spans:
+            totals.add(span)
+            by_stage[span.stage].add(span)
+            by_provider[span.provider].add(span)
+            if span.key_id:
+                by_key[f"{span.provider}:{span.key_id}"].add(span)
+        stages = {name: {**interval, **by_stage[name].as_dict()} for name, interval in self.stages.items()}
+        stages.update({name: t.as_dict() for name, t in by_stage.items() if name not in stages})
+        summary = {
+            "elapsed_ms": self._elapsed_ms(time.perf_counter()),
+            "totals": totals.as_dict(),
+            "stages": dict(sorted(stages.items(), key=lambda item: item[1].get("start_ms", 0))),
+            "providers": {name: t.as_dict() for name, t in sorted(by_provider.items())},
+            "keys": {name: t.as_dict() for name, t in sorted(by_key.items())},
+        }
+        if include_spans:
+            summary["spans"] = [span.as_dict() for span in self.spans]
+        return summary
+
+
+def span_status(response) -> str:
+    """Span outcome for an HTTP response"""
+    if response.status_code == 429:
+        return "rate_limited"
+    return "ok" if response.status_code < 400 else "error"
+
+
+def record_span(provider: str, operation: str, start: float, **fields) -> None:
+    """Add a span to the current course's timeline; a no-op outside generation"""
+    timeline = current_timeline.get()
+    if timeline is not None:
+        timeline.add(provider, operation, start, **fields)
+
+
+@contextmanager
+def timeline_stage(name: str):
+    timeline = current_timeline.get()
+    if timeline is None:
+        yield
+        return
+    with timeline.stage(name):
+        yield
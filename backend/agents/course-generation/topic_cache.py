@@ -0,0 +1,103 @@
+"""
+Topic Cache
+===========
+Course-independent results that depend only on the topic (Brave search
+resources, continue-learning suggestions) are kept for a TTL, keyed by the
+normalised topic, so a topic generated again minutes later skips the external
+calls. Entries live in SQLite next to the other service state, so every worker
+process shares them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from llm_cache import cache_bypass
+from topic_index import normalise_topic
+
+logger = logging.getLogger(__name__)
+
+
+class TopicCache:
+    """SQLite store of per-topic results with a TTL; blocking I/O runs in a thread"""
+
+    def __init__(self, path: Path, ttl_seconds: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS topic_cache (
+                kind TEXT NOT NULL,
+                topic_key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (kind, topic_key)
+            )"""
+        )
+        self._conn.commit()
+
+    def _get(self, kind: str, topic_key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM topic_cache WHERE kind = ? AND topic_key = ?", (kind, topic_key)
+            ).fetchone()
+        if not row or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return row[0]
+
+    def _set(self, kind: str, topic_key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO topic_cache (kind, topic_key, value, created_at) VALUES (?, ?, ?, ?)",
+                (kind, topic_key, value, now),
+            )
+            self._conn.execute("DELETE FROM topic_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+
+    async def get(self, kind: str, topic: str) -> Optional[list]:
+        """Cached rows for the topic, or None (missing, expired, or the request bypasses caches)"""
+        if cache_bypass.get():
+            return None
+        try:
+            value = await asyncio.to_thread(self._get, kind, normalise_topic(topic))
+        except Exception as e:
+            logger.warning(f"⚠️ Topic cache read failed: {e}")
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, kind: str, topic: str, rows: list) -> None:
+        try:
+            await asyncio.to_thread(self._set, kind, normalise_topic(topic), json.dumps(rows))
+        except Exception as e:
+            logger.warning(f"⚠️ Topic cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = dict(self._conn.execute("SELECT kind, COUNT(*) FROM topic_cache GROUP BY kind").fetchall())
+        return {"entries": entries, "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl_seconds}
+
+
+def create_topic_cache_from_env(data_dir: Path) -> Optional[TopicCache]:
+    """TOPIC_CACHE_TTL_HOURS (default 24; 0 disables), TOPIC_CACHE_PATH"""
+    ttl_seconds = int(float(os.getenv("TOPIC_CACHE_TTL_HOURS", "24")) * 3600)
+    if ttl_seconds <= 0:
+        return None
+    path = Path(os.getenv("TOPIC_CACHE_PATH", data_dir / "topic_cache.sqlite3"))
+    logger.info(f"🗂️ Topic cache enabled (TTL {ttl_seconds}s)")
+    return TopicCache(path, ttl_seconds)
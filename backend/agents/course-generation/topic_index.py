@@ -0,0 +1,202 @@
+"""
+Topic Template Index
+====================
+Normalises course topics, fingerprints them with character shingles and keeps
+an index of previously generated course content so near-duplicate topics
+("Intro to Python", "python basics", "Python for beginners") can be cloned
+instead of regenerated.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Phrases that describe the level or format of a course rather than its subject
+_FILLER_PHRASES = [
+    "introduction to", "intro to", "getting started with", "beginner's guide to",
+    "beginners guide to", "crash course", "for beginners", "for dummies",
+    "fundamentals of", "basics of", "course", "tutorial",
+    "fundamentals", "basics", "basic", "beginner", "beginners", "introduction",
+    "intro", "101", "overview", "essentials", "primer",
+]
+_FILLER_RE = re.compile(r"\b(?:" + "|".join(re.escape(p) for p in _FILLER_PHRASES) + r")\b")
+_LEADING_VERB_RE = re.compile(r"^\s*(?:learn|learning|understanding|mastering)\s+")
+_STOPWORDS = {"a", "an", "the", "of", "to", "for", "in", "on", "with", "and", "&"}
+_NON_WORD_RE = re.compile(r"[^a-z0-9+#.\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+SHINGLE_SIZE = 3
+
+
+def normalise_topic(topic: str) -> str:
+    """Reduce a topic to its subject words (lowercase, no filler or stopwords)"""
+    text = topic.casefold().replace("’", "'")
+    text = _LEADING_VERB_RE.sub(" ", text)
+    text = _FILLER_RE.sub(" ", text)
+    text = _NON_WORD_RE.sub(" ", text)
+    words = []
+    for word in _WHITESPACE_RE.split(text):
+        word = word.strip(".")
+        if not word or word in _STOPWORDS:
+            continue
+        # Cheap plural folding ("hooks" -> "hook") without touching "css"/"js"
+        if len(word) > 3 and word.isalpha() and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    # Fall back to the raw words when the topic was nothing but filler
+    return " ".join(words) or _WHITESPACE_RE.sub(" ", topic.casefold()).strip()
+
+
+def topic_shingles(normalised: str) -> set:
+    """Character shingles over the normalised topic, word order insensitive"""
+    shingles = set()
+    for word in sorted(set(normalised.split())):
+        padded = f" {word} "
+        if len(padded) <= SHINGLE_SIZE:
+            shingles.add(padded)
+            continue
+        for i in range(len(padded) - SHINGLE_SIZE + 1):
+            shingles.add(padded[i:i + SHINGLE_SIZE])
+    return shingles
+
+
+class TopicIndex:
+    """SQLite store of course templates with an inverted shingle index"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS course_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                normalised TEXT NOT NULL UNIQUE,
+                shingle_count INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                source_course_id TEXT,
+                created_at REAL NOT NULL,
+                reuse_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS template_shingles (
+                shingle TEXT NOT NULL,
+                template_id INTEGER NOT NULL REFERENCES course_templates(id) ON DELETE CASCADE,
+                PRIMARY KEY (shingle, template_id)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _best_match(self, topic: str, threshold: float) -> Optional[dict]:
+        normalised = normalise_topic(topic)
+        shingles = topic_shingles(normalised)
+        if not shingles:
+            return None
+        placeholders = ",".join("?" * len(shingles))
+        with self._lock:
+            candidates = self._conn.execute(
+                f"""SELECT t.id, t.topic, t.normalised, t.shingle_count, COUNT(*) AS shared
+                    FROM template_shingles s JOIN course_templates t ON t.id = s.template_id
+                    WHERE s.shingle IN ({placeholders})
+                    GROUP BY t.id ORDER BY shared DESC LIMIT 10""",
+                list(shingles),
+            ).fetchall()
+        best = None
+        for template_id, template_topic, template_norm, count, shared in candidates:
+            score = 1.0 if template_norm == normalised else shared / (len(shingles) + count - shared)
+            if score >= threshold and (best is None or score > best["score"]):
+                best = {"id": template_id, "topic": template_topic, "normalised": template_norm, "score": score}
+        return best
+
+    def find(self, topic: str, threshold: float) -> Optional[dict]:
+        """Return the closest template scoring at least `threshold`, or None"""
+        best = self._best_match(topic, threshold)
+        if not best:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, source_course_id FROM course_templates WHERE id = ?", (best["id"],)
+            ).fetchone()
+            self._conn.execute(
+                "UPDATE course_templates SET reuse_count = reuse_count + 1 WHERE id = ?", (best["id"],)
+            )
+            self._conn.commit()
+        if not row:
+            return None
+        best["content"] = json.loads(row[0])
+        best["source_course_id"] = row[1]
+        return best
+
+    def template_age(self, topic: str, threshold: float) -> Optional[float]:
+        """Seconds since the template a request for `topic` would reuse was stored (None if there is none)"""
+        best = self._best_match(topic, threshold)
+        if not best:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT created_at FROM course_templates WHERE id = ?", (best["id"],)).fetchone()
+        return time.time() - row[0] if row else None
+
+    def store(self, topic: str, content: dict, source_course_id: Optional[str] = None) -> None:
+        """Insert or replace the template for this topic's normalised form"""
+        normalised = normalise_topic(topic)
+        shingles = topic_shingles(normalised)
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT id FROM course_templates WHERE normalised = ?", (normalised,)
+            ).fetchone()
+            if existing:
+                self._conn.execute("DELETE FROM template_shingles WHERE template_id = ?", (existing[0],))
+                self._conn.execute("DELETE FROM course_templates WHERE id = ?", (existing[0],))
+            cursor = self._conn.execute(
+                """INSERT INTO course_templates (topic, normalised, shingle_count, content, source_course_id, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (topic, normalised, len(shingles), json.dumps(content), source_course_id, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO template_shingles (shingle, template_id) VALUES (?, ?)",
+                [(s, cursor.lastrowid) for s in shingles],
+            )
+            self._conn.commit()
+        logger.info(f"📇 Stored course template for '{normalised}'")
+
+    def replace_rows(self, source_course_id: str, table: str, rows: list, key: Optional[str] = None) -> int:
+        """Update templates copied from a course after part of it was regenerated.
+
+        Replaces the whole table, or with `key` only the rows whose key value matches a new row.
+        Returns the number of templates updated.
+        """
+        with self._lock:
+            templates = self._conn.execute(
+                "SELECT id, content FROM course_templates WHERE source_course_id = ?", (source_course_id,)
+            ).fetchall()
+            for template_id, content in templates:
+                content = json.loads(content)
+                tables = content.setdefault("tables", {})
+                if key:
+                    replaced = {row.get(key) for row in rows}
+                    existing = [row for row in tables.get(table, []) if row.get(key) not in replaced]
+                    tables[table] = sorted(existing + rows, key=lambda row: row.get(key) or 0)
+                else:
+                    tables[table] = rows
+                self._conn.execute(
+                    "UPDATE course_templates SET content = ? WHERE id = ?", (json.dumps(content), template_id)
+                )
+            self._conn.commit()
+        return len(templates)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, reuses = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(reuse_count), 0) FROM course_templates"
+            ).fetchone()
+        return {"templates": count, "reuses": reuses}
@@ -0,0 +1,234 @@
+"""
+Chunked ElevenLabs TTS
+======================
+Long scripts are split on sentence boundaries, the chunks are synthesised
+concurrently (bounded by a semaphore) and the MP3 segments are joined into
+one track. Every chunk is cached on disk, so when one chunk fails a retry
+only re-synthesises the chunks that are still missing. Once the track is
+stored its chunks are discarded; chunks of scripts that never completed
+expire after chunk_ttl_seconds.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+from http_pool import LazyAsyncClient
+from timeline import record_span, span_status
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends: terminal punctuation (plus closing quotes/brackets) followed by whitespace
+_SENTENCE_END_RE = re.compile(r'(?:(?<=[.!?…])|(?<=[.!?…]["\')\]]))\s+')
+
+
+class TTSError(Exception):
+    """A chunk could not be synthesised; already-synthesised chunks stay cached"""
+
+
+def split_script(script: str, max_chars: int) -> List[str]:
+    """Split a script into chunks of at most max_chars, breaking between sentences.
+
+    A single sentence longer than max_chars is broken on whitespace instead.
+    """
+    sentences = [s.strip() for s in _SENTENCE_END_RE.split(script.strip()) if s.strip()]
+    chunks: List[str] = []
+    current = ""
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _strip_id3(segment: bytes) -> bytes:
+    """Drop ID3v2 (leading) and ID3v1 (trailing) tags so segments join into one MP3 stream"""
+    if segment[:3] == b"ID3" and len(segment) >= 10:
+        # Syncsafe size: 4 x 7 bits, plus the 10-byte header and an optional footer
+        size = (segment[6] << 21) | (segment[7] << 14) | (segment[8] << 7) | segment[9]
+        footer = 10 if segment[5] & 0x10 else 0
+        segment = segment[10 + size + footer:]
+    if len(segment) >= 128 and segment[-128:-125] == b"TAG":
+        segment = segment[:-128]
+    return segment
+
+
+class ElevenLabsTTS:
+    """Chunked, concurrent ElevenLabs synthesis with a per-chunk disk cache"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        cache_dir: Path,
+        base_url: str = "https://api.elevenlabs.io/v1",
+        voice_id: str = "9BWtsMINqrJLrRacOk9x",
+        model_id: str = "eleven_turbo_v2_5",
+        voice_settings: Optional[dict] = None,
+        chunk_chars: int = 2500,
+        concurrency: int = 3,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+        chunk_ttl_seconds: float = 86400.0,
+    ):
+        self.api_key = api_key
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+        self.voice_id = voice_id
+        self.model_id = model_id
+        self.voice_settings = voice_settings or {"stability": 0.5, "similarity_boost": 0.75}
+        self.chunk_chars = chunk_chars
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.chunk_ttl_seconds = chunk_ttl_seconds
+        self._next_sweep = 0.0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._http = LazyAsyncClient(
+            headers={"xi-api-key": self.api_key or "", "Content-Type": "application/json"},
+            timeout=self.timeout,
+        )
+        self.chunks_synthesised = 0
+        self.chunk_cache_hits = 0
+        self.chunk_failures = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._http.get()
+
+    async def synthesize(self, script: str) -> bytes:
+        """Return one MP3 for the whole script; raises TTSError if any chunk fails"""
+        return b"".join(await self.synthesize_segments(script))
+
+    async def synthesize_segments(self, script: str) -> List[bytes]:
+        """Tag-stripped MP3 segments in order, ready to be written back to back"""
+        payloads = self._payloads(script)
+        if not payloads:
+            raise TTSError("Script is empty")
+        if time.time() >= self._next_sweep:
+            self._next_sweep = time.time() + 3600  # at most hourly
+            await asyncio.to_thread(self._sweep)
+        results = await asyncio.gather(*[self._chunk(payload) for payload in payloads], return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            raise TTSError(
+                f"{len(failed)}/{len(payloads)} chunks failed (the rest are cached): {failed[0]}"
+            )
+        logger.info(f"🔊 Synthesised {len(payloads)} TTS chunks ({len(script)} chars)")
+        return [_strip_id3(segment) for segment in results]
+
+    def discard(self, script: str) -> None:
+        """Drop a script's cached chunks once its track is stored"""
+        for payload in self._payloads(script):
+            self._cache_path(payload).unlink(missing_ok=True)
+
+    def _sweep(self) -> None:
+        # Chunks left behind by scripts whose synthesis was never retried
+        cutoff = time.time() - self.chunk_ttl_seconds
+        for path in self.cache_dir.glob("*/*.mp3"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _payloads(self, script: str) -> List[dict]:
+        chunks = split_script(script, self.chunk_chars)
+        # Neighbouring text keeps intonation continuous across chunk boundaries
+        return [
+            {
+                "text": chunk,
+                "model_id": self.model_id,
+                "voice_settings": self.voice_settings,
+                "previous_text": chunks[i - 1] if i > 0 else None,
+                "next_text": chunks[i + 1] if i + 1 < len(chunks) else None,
+            }
+            for i, chunk in enumerate(chunks)
+        ]
+
+    def _cache_path(self, payload: dict) -> Path:
+        key = hashlib.sha256(json.dumps({**payload, "voice_id": self.voice_id}, sort_keys=True).encode("utf-8")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.mp3"
+
+    async def _chunk(self, payload: dict) -> bytes:
+        path = self._cache_path(payload)
+        if path.exists():
+            self.chunk_cache_hits += 1
+            record_span("elevenlabs", "tts_chunk", time.perf_counter(), status="cache_hit")
+            return await asyncio.to_thread(path.read_bytes)
+
+        async with self._semaphore:
+            audio = await self._request(payload)
+        await asyncio.to_thread(self._write_cache, path, audio)
+        self.chunks_synthesised += 1
+        return audio
+
+    @staticmethod
+    def _write_cache(path: Path, audio: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(audio)
+        tmp.replace(path)
+
+    async def _request(self, payload: dict) -> bytes:
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                response = await self.client.post(f"{self.base_url}/text-to-speech/{self.voice_id}", json=payload)
+            except httpx.TransportError as e:
+                record_span("elevenlabs", "tts_chunk", start, status="error", attempt=attempt, key=self.api_key)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                self.chunk_failures += 1
+                raise TTSError(f"ElevenLabs request failed: {e}") from e
+
+            record_span("elevenlabs", "tts_chunk", start, status=span_status(response), attempt=attempt,
+                        key=self.api_key, characters=len(payload["text"]))
+            if response.status_code == 200:
+                return response.content
+            if response.status_code == 429 and attempt < self.max_retries:
+                logger.warning("⏳ ElevenLabs rate limited, retrying chunk...")
+                await asyncio.sleep(2 ** attempt)
+                continue
+
+            self.chunk_failures += 1
+            if response.status_code == 401:
+                try:
+                    detail = response.json().get("detail", {})
+                    detail = detail.get("message", "") if isinstance(detail, dict) else str(detail)
+                except ValueError:
+                    detail = response.text[:200]
+                if "abuse" in detail.lower() or "free tier" in detail.lower():
+                    raise TTSError(f"ElevenLabs abuse detection triggered: {detail[:150]}")
+                raise TTSError(f"Invalid ElevenLabs API key (401): {detail[:150]}")
+            raise TTSError(f"ElevenLabs returned {response.status_code}: {response.text[:200]}")
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "chunks_synthesised": self.chunks_synthesised,
+            "chunk_cache_hits": self.chunk_cache_hits,
+            "chunk_failures": self.chunk_failures,
+            "chunk_chars": self.chunk_chars,
+        }
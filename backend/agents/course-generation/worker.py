@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Course Generation Worker
+========================
+Standalone worker process for the durable generation queue. Run as many of
+these as needed next to (or instead of) the API's embedded workers:
+
+    GENERATION_WORKERS=4 python worker.py
+"""
+
+import asyncio
+import os
+import signal
+
+from job_queue import WorkerPool
+from main import (
+    CPU_POOL, GENERATION_SHUTDOWN_GRACE_SECONDS, JOB_QUEUE, brave, logger, postgrest, progress_bus,
+    progress_reporter, run_generation_job, tts,
+)
+
+
+async def run_workers():
+    concurrency = int(os.getenv("GENERATION_WORKERS", "2"))
+    pool = WorkerPool(JOB_QUEUE, run_generation_job, concurrency=concurrency,
+                      shutdown_grace=GENERATION_SHUTDOWN_GRACE_SECONDS)
+    await CPU_POOL.start()
+    await pool.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: fall back to KeyboardInterrupt
+            pass
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("🛑 Stopping generation workers")
+        await pool.stop()
+        await progress_bus.flush()
+        await progress_reporter.flush_all()
+        await postgrest.aclose()
+        await tts.aclose()
+        await brave.aclose()
+        CPU_POOL.shutdown()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_workers())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,79 @@
+-- Transactional Course Content Commit
+-- Run this in Supabase SQL Editor
+--
+-- Writes every generated table for a course in one transaction and flips the
+-- course row to its final state, so readers never see a half-written course.
+-- Existing rows for the course are replaced, which makes the call idempotent
+-- (safe to repeat on resume/regeneration).
+
+CREATE OR REPLACE FUNCTION commit_course_content(
+    p_course_id UUID,
+    p_content JSONB,
+    p_course_fields JSONB DEFAULT '{}'::jsonb
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    allowed_tables TEXT[] := ARRAY[
+        'course_chapters',
+        'course_flashcards',
+        'course_mcqs',
+        'course_articles',
+        'course_word_games',
+        'course_audio',
+        'course_resources',
+        'course_suggestions'
+    ];
+    tbl TEXT;
+    tbl_rows JSONB;
+    cols TEXT;
+    inserted INTEGER;
+    counts JSONB := '{}'::jsonb;
+BEGIN
+    FOR tbl, tbl_rows IN SELECT key, value FROM jsonb_each(p_content) LOOP
+        IF NOT tbl = ANY(allowed_tables) THEN
+            RAISE EXCEPTION 'commit_course_content: table % is not allowed', tbl;
+        END IF;
+
+        EXECUTE format('DELETE FROM %I WHERE course_id = $1', tbl) USING p_course_id;
+
+        IF jsonb_typeof(tbl_rows) <> 'array' OR jsonb_array_length(tbl_rows) = 0 THEN
+            counts := counts || jsonb_build_object(tbl, 0);
+            CONTINUE;
+        END IF;
+
+        -- Insert only the columns the generator supplied so defaults (id, created_at) apply
+        SELECT string_agg(DISTINCT quote_ident(k), ',')
+          INTO cols
+          FROM jsonb_array_elements(tbl_rows) AS r, jsonb_object_keys(r) AS k
+         WHERE k <> 'course_id';
+
+        EXECUTE format(
+            'INSERT INTO %I (course_id, %s) SELECT $1, %s FROM jsonb_populate_recordset(NULL::%I, $2)',
+            tbl, cols, cols, tbl
+        ) USING p_course_id, tbl_rows;
+
+        GET DIAGNOSTICS inserted = ROW_COUNT;
+        counts := counts || jsonb_build_object(tbl, inserted);
+    END LOOP;
+
+    IF p_course_fields <> '{}'::jsonb THEN
+        UPDATE courses
+           SET status = COALESCE(p_course_fields->>'status', status),
+               generation_duration_seconds = COALESCE((p_course_fields->>'generation_duration_seconds')::INTEGER, generation_duration_seconds),
+               completion_time_estimate = COALESCE((p_course_fields->>'completion_time_estimate')::INTEGER, completion_time_estimate),
+               articles_generated = COALESCE((p_course_fields->>'articles_generated')::BOOLEAN, articles_generated),
+               games_generated = COALESCE((p_course_fields->>'games_generated')::BOOLEAN, games_generated),
+               audio_generated = COALESCE((p_course_fields->>'audio_generated')::BOOLEAN, audio_generated),
+               updated_at = now()
+         WHERE id = p_course_id;
+    END IF;
+
+    RETURN counts;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION commit_course_content(UUID, JSONB, JSONB) TO service_role;
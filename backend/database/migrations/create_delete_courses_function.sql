@@ -0,0 +1,50 @@
+-- Cascade Course Delete
+-- Run this in Supabase SQL Editor
+--
+-- Deletes courses and every related row in a single transaction and one
+-- round trip. Works for one course or many (account cleanup). Returns the ids
+-- that actually existed and per-table row counts.
+
+CREATE OR REPLACE FUNCTION delete_courses(p_course_ids UUID[])
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    related_tables TEXT[] := ARRAY[
+        'course_chapters',
+        'course_flashcards',
+        'course_mcqs',
+        'course_articles',
+        'course_word_games',
+        'course_audio',
+        'course_resources',
+        'course_suggestions',
+        'course_generation_jobs'
+    ];
+    tbl TEXT;
+    deleted INTEGER;
+    counts JSONB := '{}'::jsonb;
+    deleted_ids JSONB;
+BEGIN
+    FOREACH tbl IN ARRAY related_tables LOOP
+        -- Optional tables (e.g. word games) may not exist in every deployment
+        IF to_regclass(tbl) IS NULL THEN
+            CONTINUE;
+        END IF;
+        EXECUTE format('DELETE FROM %I WHERE course_id = ANY($1)', tbl) USING p_course_ids;
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+        counts := counts || jsonb_build_object(tbl, deleted);
+    END LOOP;
+
+    WITH removed AS (
+        DELETE FROM courses WHERE id = ANY(p_course_ids) RETURNING id
+    )
+    SELECT COALESCE(jsonb_agg(id), '[]'::jsonb) INTO deleted_ids FROM removed;
+
+    RETURN jsonb_build_object('deleted', deleted_ids, 'rows', counts);
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION delete_courses(UUID[]) TO service_role;